@@ -0,0 +1,277 @@
+"""Capacity-aware admission of sessions and per-stage load limits.
+
+Every live session holds a slot for as long as it runs. New sessions take a
+slot only while fewer than ``max_sessions`` are held *and* no processing
+stage is saturated; otherwise they wait in a bounded FIFO queue for up to
+``max_wait`` seconds and are then turned away with an estimate of when to
+retry. Once the queue is full, new sessions are rejected immediately.
+Sessions that already run are never throttled by admission, so under
+overload the server stops taking new users instead of slowing everyone down.
+
+Stages bound concurrent work with a :class:`StageLimiter` (transcription
+and speech synthesis) or are watched through a backlog measure (pending
+database writes). A stage is saturated once its backlog reaches its
+capacity.
+"""
+from __future__ import annotations
+
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from .metrics import REGISTRY
+
+_REJECTED = REGISTRY.counter(
+    "mindful_admission_rejections_total",
+    "Sessions and streams turned away by admission control, by reason.",
+    ("reason",),
+)
+_QUEUE_FULL = _REJECTED.labels("queue_full")
+_TIMED_OUT = _REJECTED.labels("timeout")
+_NO_CAPACITY = _REJECTED.labels("no_capacity")
+
+
+class AdmissionRejected(Exception):
+    """Raised when a session cannot be admitted; retry after ``retry_after`` seconds."""
+
+    def __init__(self, message: str, retry_after: float) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class StageLimiter:
+    """Allow at most ``capacity`` concurrent operations of one stage.
+
+    ``capacity <= 0`` means unlimited; the limiter then only counts.
+    """
+
+    def __init__(self, name: str, capacity: int = 0, on_release: Optional[Callable[[], None]] = None) -> None:
+        self.name = name
+        self.capacity = capacity
+        self.in_flight = 0
+        self.waiting = 0
+        self._on_release = on_release
+        self._semaphore = asyncio.Semaphore(capacity) if capacity > 0 else None
+
+    @property
+    def saturated(self) -> bool:
+        """Whether a full round of operations is already queued behind the running ones."""
+
+        return self.capacity > 0 and self.waiting >= self.capacity
+
+    async def __aenter__(self) -> "StageLimiter":
+        if self._semaphore is not None:
+            self.waiting += 1
+            try:
+                await self._semaphore.acquire()
+            finally:
+                self.waiting -= 1
+        self.in_flight += 1
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        self.in_flight -= 1
+        if self._semaphore is not None:
+            self._semaphore.release()
+        if self._on_release is not None:
+            self._on_release()
+
+
+class TokenBucket:
+    """Limit a byte stream to ``rate`` bytes per second with bursts of ``burst`` bytes.
+
+    :meth:`consume` sleeps until the bytes fit, so a client sending faster
+    than the limit is slowed down rather than disconnected. ``rate <= 0``
+    disables the limit.
+    """
+
+    def __init__(self, rate: float, burst: float, clock: Callable[[], float] = time.monotonic) -> None:
+        self._rate = rate
+        self._burst = max(burst, 1.0)
+        self._clock = clock
+        self._tokens = self._burst
+        self._updated = clock()
+
+    async def consume(self, amount: int) -> None:
+        if self._rate <= 0:
+            return
+        now = self._clock()
+        self._tokens = min(self._burst, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+        # A chunk larger than the burst is let through once the bucket is full
+        # and leaves it in debt, so it still averages out to ``rate``.
+        self._tokens -= amount
+        if self._tokens < 0:
+            await asyncio.sleep(-self._tokens / self._rate)
+
+
+class AdmissionController:
+    """Hand out session slots against session and stage capacities.
+
+    ``max_sessions <= 0`` admits any number of sessions; stages without a
+    configured capacity are unlimited. ``session_seconds`` seeds the running
+    average of how long sessions hold their slot, which the wait estimates
+    are based on.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = 0,
+        *,
+        queue_size: int = 0,
+        max_wait: float = 0.0,
+        stages: Optional[Mapping[str, int]] = None,
+        session_seconds: float = 600.0,
+        poll_interval: float = 0.25,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._max_sessions = max_sessions
+        self._queue_size = queue_size
+        self._max_wait = max_wait
+        self._stage_capacities = dict(stages or {})
+        self._stages: Dict[str, StageLimiter] = {}
+        self._probes: Dict[str, Tuple[Callable[[], float], float]] = {}
+        self._average_hold = session_seconds
+        self._poll_interval = poll_interval
+        self._clock = clock
+        # session id -> (time the slot was taken, taken by a stream rather than /session/start)
+        self._held: Dict[int, Tuple[float, bool]] = {}
+        self._reserved = 0
+        self._queue: Deque[object] = deque()
+        self._changed = asyncio.Event()
+
+    @property
+    def sessions(self) -> int:
+        return len(self._held) + self._reserved
+
+    @property
+    def queued(self) -> int:
+        return len(self._queue)
+
+    def stage(self, name: str) -> StageLimiter:
+        limiter = self._stages.get(name)
+        if limiter is None:
+            limiter = self._stages[name] = StageLimiter(name, self._stage_capacities.get(name, 0), self._notify)
+        return limiter
+
+    def watch(self, name: str, backlog: Callable[[], float], capacity: float) -> None:
+        """Treat stage ``name`` as saturated while ``backlog()`` is at least ``capacity``."""
+
+        if capacity > 0:
+            self._probes[name] = (backlog, capacity)
+
+    def saturated_stages(self) -> List[str]:
+        saturated = [name for name, limiter in self._stages.items() if limiter.saturated]
+        saturated.extend(name for name, (backlog, capacity) in self._probes.items() if backlog() >= capacity)
+        return saturated
+
+    def estimated_wait(self, position: int) -> float:
+        """Seconds until the session at queue ``position`` (1 = next) is likely admitted."""
+
+        if self._max_sessions <= 0:
+            return self._poll_interval * position
+        return position * self._average_hold / self._max_sessions
+
+    async def reserve(self) -> None:
+        """Wait for a slot for a new session; raise :class:`AdmissionRejected` if none comes."""
+
+        if not self._queue and self._can_admit():
+            self._reserved += 1
+            return
+        if len(self._queue) >= self._queue_size:
+            _QUEUE_FULL.inc()
+            raise AdmissionRejected("Server is at capacity", self.estimated_wait(len(self._queue) + 1))
+        ticket = object()
+        self._queue.append(ticket)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self._max_wait
+        try:
+            while not (self._queue[0] is ticket and self._can_admit()):
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    _TIMED_OUT.inc()
+                    position = self._queue.index(ticket) + 1
+                    raise AdmissionRejected("Timed out waiting for capacity", self.estimated_wait(position))
+                changed = self._changed
+                try:
+                    # Saturation of watched stages changes without an event, so poll too.
+                    await asyncio.wait_for(changed.wait(), min(remaining, self._poll_interval))
+                except asyncio.TimeoutError:
+                    pass
+            self._reserved += 1
+        finally:
+            self._queue.remove(ticket)
+            self._notify()
+
+    def assign(self, session_id: int) -> None:
+        """Bind a slot taken with :meth:`reserve` to the created session."""
+
+        self._reserved = max(0, self._reserved - 1)
+        self._held[session_id] = (self._clock(), False)
+
+    def abandon(self) -> None:
+        """Give back a slot taken with :meth:`reserve` when the session was not created."""
+
+        self._reserved = max(0, self._reserved - 1)
+        self._notify()
+
+    def adopt(self, session_ids: Iterable[int]) -> None:
+        """Hold slots for sessions that were already running, e.g. after a restart."""
+
+        now = self._clock()
+        for session_id in session_ids:
+            self._held.setdefault(session_id, (now, False))
+
+    def claim(self, session_id: int) -> bool:
+        """Take a slot for a stream of a session started elsewhere, without queueing.
+
+        Returns ``True`` when the session already holds a slot. Running
+        sessions go ahead of queued new ones, but never past the capacities.
+        """
+
+        if session_id in self._held:
+            return True
+        if not self._can_admit():
+            _NO_CAPACITY.inc()
+            return False
+        self._held[session_id] = (self._clock(), True)
+        return True
+
+    def release_claim(self, session_id: int) -> None:
+        """Release a slot taken by :meth:`claim` once its stream has finished."""
+
+        held = self._held.get(session_id)
+        if held is not None and held[1]:
+            self.release(session_id)
+
+    def release(self, session_id: int) -> None:
+        held = self._held.pop(session_id, None)
+        if held is None:
+            return
+        # Exponential moving average of slot hold times, for wait estimates.
+        self._average_hold += 0.1 * ((self._clock() - held[0]) - self._average_hold)
+        self._notify()
+
+    def _can_admit(self) -> bool:
+        if self._max_sessions > 0 and self.sessions >= self._max_sessions:
+            return False
+        return not self.saturated_stages()
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+
+def retry_after_header(seconds: float) -> str:
+    return str(max(1, math.ceil(seconds)))
+
+
+__all__ = [
+    "AdmissionController",
+    "AdmissionRejected",
+    "StageLimiter",
+    "TokenBucket",
+    "retry_after_header",
+]
@@ -0,0 +1,602 @@
+"""Append-only on-disk spool of the raw audio received for each session."""
+from __future__ import annotations
+
+import asyncio
+import logging
+import mmap
+import os
+import shutil
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import AsyncIterator, Callable, Dict, List, Optional, Sequence, Set, Tuple, Union
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .models import AudioChunk, Session
+
+logger = logging.getLogger(__name__)
+
+# Buffers passed to a single writev call; stays below the usual IOV_MAX.
+_MAX_IOVECS = 512
+# Sessions checked per query when looking for orphaned segment files.
+_ORPHAN_BATCH = 500
+
+
+@dataclass
+class _SessionBuffer:
+    chunks: List[Tuple[int, bytes]] = field(default_factory=list)
+    size: int = 0
+
+
+@dataclass
+class _Segment:
+    name: str
+    size: int = 0
+
+
+@dataclass(frozen=True)
+class AudioExtent:
+    """A contiguous run of spooled audio inside one segment file."""
+
+    segment: str
+    offset: int
+    length: int
+
+
+def _writev_all(fd: int, buffers: Sequence[Union[bytes, memoryview]]) -> None:
+    pending = [memoryview(buffer) for buffer in buffers if len(buffer)]
+    while pending:
+        written = os.writev(fd, pending[:_MAX_IOVECS])
+        while written:
+            head = pending[0]
+            if written >= len(head):
+                written -= len(head)
+                pending.pop(0)
+            else:
+                pending[0] = head[written:]
+                written = 0
+
+
+def parse_byte_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single-range ``Range`` header into ``(start, end)``, ``end`` exclusive.
+
+    Returns ``None`` for headers that should be ignored (malformed, multiple
+    ranges or another unit) and raises ``ValueError`` when the range cannot
+    be satisfied for a resource of ``size`` bytes.
+    """
+
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, dash, last = spec.strip().partition("-")
+    if not dash or not (first or last) or any(part and not part.isdigit() for part in (first, last)):
+        return None
+    if not first:
+        suffix = int(last)
+        if suffix == 0:
+            raise ValueError("Unsatisfiable range")
+        return max(size - suffix, 0), size
+    start = int(first)
+    end = int(last) + 1 if last else size
+    if start >= size or end <= start:
+        raise ValueError("Unsatisfiable range")
+    return start, min(end, size)
+
+
+class _MappedSegments:
+    """Read-only ``mmap`` views of segment files, closed together."""
+
+    def __init__(self, directory: Path) -> None:
+        self._directory = directory
+        self._maps: Dict[str, mmap.mmap] = {}
+
+    def view(self, extent: AudioExtent) -> memoryview:
+        mapped = self._maps.get(extent.segment)
+        if mapped is None:
+            with open(self._directory / extent.segment, "rb") as handle:
+                mapped = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[extent.segment] = mapped
+        return memoryview(mapped)[extent.offset : extent.offset + extent.length]
+
+    def close(self) -> None:
+        for mapped in self._maps.values():
+            try:
+                mapped.close()
+            except BufferError:
+                # A consumer still holds a view; the map closes when it is released.
+                pass
+        self._maps.clear()
+
+
+class AudioSpool:
+    """Keep every received audio chunk in append-only per-session segment files.
+
+    :meth:`append` only buffers the chunk. A background task writes each
+    session's buffered chunks to the end of its current segment under
+    ``directory/<session_id>/`` with one ``writev`` once ``flush_bytes`` are
+    waiting or ``flush_interval`` seconds have passed, then records where
+    each chunk landed in the ``audio_chunks`` index. Chunks are only visible
+    to readers once indexed, so a crash can leave unindexed bytes at the end
+    of a segment but never an index entry pointing at missing audio. Every
+    process starts new segments instead of appending to existing ones, and a
+    segment is rolled once it exceeds ``segment_bytes``.
+
+    Only sessions that exist are spooled; :meth:`append` raises
+    ``LookupError`` for any other id. If the index rows of one session cannot
+    be written, the other sessions' rows of the same flush are still indexed,
+    and rows that failed for a transient reason are retried with the next
+    flush.
+
+    Reads map segment files with ``mmap`` and hand out ``memoryview`` slices.
+    :meth:`maintain` rewrites the segments of ended sessions into one file
+    holding only indexed audio and deletes the audio of sessions that ended
+    more than ``retention`` ago. Segments replaced by a compaction are only
+    deleted by a later maintenance pass, once no reader of the session is
+    left, so a reader that looked up extents just before never finds its
+    files gone. The same pass deletes any other file of an ended session
+    that no index row refers to and that is older than one maintenance
+    interval, such as segments retired just before a restart.
+
+    :meth:`end` lets go of what the spool remembers about sessions that
+    ended, once their buffered audio is written.
+    """
+
+    def __init__(
+        self,
+        directory: Union[str, Path],
+        session_factory: Callable[[], AsyncSession],
+        read_session_factory: Optional[Callable[[], AsyncSession]] = None,
+        *,
+        segment_bytes: int = 64 * 1024 * 1024,
+        flush_bytes: int = 256 * 1024,
+        flush_interval: float = 0.5,
+        retention: Optional[timedelta] = None,
+        maintenance_interval: float = 300.0,
+    ) -> None:
+        self._directory = Path(directory)
+        self._directory.mkdir(parents=True, exist_ok=True)
+        self._session_factory = session_factory
+        self._read_session_factory = read_session_factory or session_factory
+        self._segment_bytes = segment_bytes
+        self._flush_bytes = flush_bytes
+        self._flush_interval = flush_interval
+        self._retention = retention
+        self._maintenance_interval = maintenance_interval
+        self._buffers: Dict[int, _SessionBuffer] = {}
+        self._buffered_bytes = 0
+        self._segments: Dict[int, _Segment] = {}
+        self._next_sequence: Dict[int, int] = {}
+        # Index rows whose insert failed for a reason other than the rows themselves.
+        self._unindexed: List[Dict[str, object]] = []
+        # Active readers per session and the compacted-away segments they may use.
+        self._readers: Dict[int, int] = {}
+        self._retired: Dict[int, Set[str]] = {}
+        # Ended sessions whose buffered audio has not been written yet.
+        self._ending: Set[int] = set()
+        self._lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._drained = asyncio.Event()
+        self._drained.set()
+        self._tasks: List[asyncio.Task[None]] = []
+
+    @property
+    def buffered_bytes(self) -> int:
+        return self._buffered_bytes
+
+    async def start(self) -> None:
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._run()), asyncio.create_task(self._maintain_periodically())]
+
+    async def close(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self.flush()
+        self._unlink_retired()
+
+    async def append(self, session_id: int, data: bytes) -> int:
+        """Buffer ``data`` as the session's next chunk and return its sequence number.
+
+        Waits while far more than ``flush_bytes`` are buffered, so a slow disk
+        pushes back on the socket readers instead of growing memory. Raises
+        ``LookupError`` when the session does not exist.
+        """
+
+        while self._buffered_bytes >= 4 * self._flush_bytes:
+            self._wakeup.set()
+            self._drained.clear()
+            await self._drained.wait()
+        sequence = self._next_sequence.get(session_id)
+        if sequence is None:
+            sequence = await self._load_next_sequence(session_id)
+        sequence = max(sequence, self._next_sequence.get(session_id, 0))
+        self._next_sequence[session_id] = sequence + 1
+        buffer = self._buffers.setdefault(session_id, _SessionBuffer())
+        buffer.chunks.append((sequence, data))
+        buffer.size += len(data)
+        self._buffered_bytes += len(data)
+        if self._buffered_bytes >= self._flush_bytes:
+            self._wakeup.set()
+        return sequence
+
+    def end(self, session_ids: Sequence[int]) -> None:
+        """Forget the segments and sequence numbers of sessions that ended."""
+
+        for session_id in session_ids:
+            if session_id in self._buffers:
+                self._ending.add(session_id)
+            else:
+                self._forget(session_id)
+
+    async def flush(self) -> None:
+        """Write and index everything buffered so far."""
+
+        async with self._lock:
+            buffers, self._buffers = self._buffers, {}
+            self._buffered_bytes = 0
+            try:
+                if buffers or self._unindexed:
+                    await self._write(buffers)
+            finally:
+                self._drained.set()
+                for session_id in [session_id for session_id in self._ending if session_id not in self._buffers]:
+                    self._ending.discard(session_id)
+                    self._forget(session_id)
+
+    async def extents(self, session_id: int) -> List[AudioExtent]:
+        """Return the session's indexed audio as contiguous extents, in order."""
+
+        stmt = (
+            select(AudioChunk.segment, AudioChunk.byte_offset, AudioChunk.length)
+            .where(AudioChunk.session_id == session_id)
+            .order_by(AudioChunk.sequence)
+        )
+        async with self._read_session_factory() as session:
+            rows = (await session.execute(stmt)).all()
+        extents: List[AudioExtent] = []
+        for segment, offset, length in rows:
+            last = extents[-1] if extents else None
+            if last is not None and last.segment == segment and last.offset + last.length == offset:
+                extents[-1] = AudioExtent(segment, last.offset, last.length + length)
+            else:
+                extents.append(AudioExtent(segment, offset, length))
+        return extents
+
+    async def iter_range(
+        self,
+        session_id: int,
+        extents: Sequence[AudioExtent],
+        start: int,
+        end: int,
+        frame_size: int = 64 * 1024,
+    ) -> AsyncIterator[memoryview]:
+        """Yield zero-copy slices of bytes ``start`` to ``end`` (exclusive) of the session's audio."""
+
+        segments = _MappedSegments(self._directory / str(session_id))
+        self._readers[session_id] = self._readers.get(session_id, 0) + 1
+        try:
+            position = 0
+            for extent in extents:
+                extent_end = position + extent.length
+                if extent_end > start and position < end:
+                    view = segments.view(extent)
+                    low = max(start - position, 0)
+                    high = min(end - position, extent.length)
+                    for offset in range(low, high, frame_size):
+                        yield view[offset : min(offset + frame_size, high)]
+                position = extent_end
+                if position >= end:
+                    break
+        finally:
+            segments.close()
+            self._release_reader(session_id)
+
+    async def chunks(self, session_id: int) -> AsyncIterator[Tuple[int, memoryview]]:
+        """Yield ``(sequence, audio)`` for every indexed chunk, e.g. to re-transcribe."""
+
+        self._readers[session_id] = self._readers.get(session_id, 0) + 1
+        segments = _MappedSegments(self._directory / str(session_id))
+        try:
+            rows = await self._indexed_chunks(session_id, self._read_session_factory)
+            for sequence, segment, offset, length in rows:
+                yield sequence, segments.view(AudioExtent(segment, offset, length))
+        finally:
+            segments.close()
+            self._release_reader(session_id)
+
+    async def maintain(self, now: Optional[datetime] = None) -> None:
+        """Apply retention, then compact the segments of ended sessions."""
+
+        now = now or datetime.utcnow()
+        self._unlink_retired()
+        if self._retention is not None:
+            await self._apply_retention(now - self._retention)
+        await self._compact_ended_sessions()
+        await self._remove_orphans(time.time() - self._maintenance_interval)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self._flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:  # pragma: no cover - depends on the disk and database
+                logger.exception("Failed to spool buffered audio")
+
+    async def _maintain_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self._maintenance_interval)
+            try:
+                await self.maintain()
+            except Exception:  # pragma: no cover - depends on the disk and database
+                logger.exception("Audio spool maintenance failed")
+
+    async def _load_next_sequence(self, session_id: int) -> int:
+        last_sequence = (
+            select(func.max(AudioChunk.sequence)).where(AudioChunk.session_id == session_id).scalar_subquery()
+        )
+        stmt = select(Session.id, last_sequence).where(Session.id == session_id)
+        async with self._session_factory() as session:
+            row = (await session.execute(stmt)).one_or_none()
+        if row is None:
+            raise LookupError("Session not found")
+        return (row[1] or 0) + 1
+
+    def _segment_for(self, session_id: int) -> _Segment:
+        segment = self._segments.get(session_id)
+        if segment is None or segment.size >= self._segment_bytes:
+            name = f"{time.time_ns():020d}-{uuid.uuid4().hex[:8]}.seg"
+            segment = self._segments[session_id] = _Segment(name)
+        return segment
+
+    def _append_to_segments(self, buffers: Dict[int, _SessionBuffer]) -> List[Dict[str, object]]:
+        rows: List[Dict[str, object]] = []
+        created_at = datetime.utcnow()
+        for session_id, buffer in buffers.items():
+            directory = self._directory / str(session_id)
+            directory.mkdir(exist_ok=True)
+            segment = self._segment_for(session_id)
+            fd = os.open(directory / segment.name, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                _writev_all(fd, [data for _, data in buffer.chunks])
+            finally:
+                os.close(fd)
+            for sequence, data in buffer.chunks:
+                rows.append(
+                    {
+                        "session_id": session_id,
+                        "sequence": sequence,
+                        "segment": segment.name,
+                        "byte_offset": segment.size,
+                        "length": len(data),
+                        "created_at": created_at,
+                    }
+                )
+                segment.size += len(data)
+        return rows
+
+    async def _write(self, buffers: Dict[int, _SessionBuffer]) -> None:
+        loop = asyncio.get_running_loop()
+        rows, self._unindexed = self._unindexed, []
+        if buffers:
+            rows += await loop.run_in_executor(None, self._append_to_segments, buffers)
+        try:
+            await self._insert_rows(rows)
+        except IntegrityError:
+            # Some session's rows are invalid (e.g. it was deleted); index the
+            # others one session at a time instead of losing them all.
+            grouped: Dict[int, List[Dict[str, object]]] = {}
+            for row in rows:
+                grouped.setdefault(row["session_id"], []).append(row)  # type: ignore[arg-type]
+            while grouped:
+                session_id, session_rows = next(iter(grouped.items()))
+                try:
+                    await self._insert_rows(session_rows)
+                except IntegrityError:
+                    logger.warning("Dropping %d audio index rows of session %s", len(session_rows), session_id)
+                    self._forget(session_id)
+                except Exception:
+                    for pending in grouped.values():
+                        self._unindexed.extend(pending)
+                    raise
+                del grouped[session_id]
+        except Exception:
+            # The bytes are on disk already; index them with the next flush.
+            self._unindexed = rows + self._unindexed
+            raise
+
+    async def _insert_rows(self, rows: List[Dict[str, object]]) -> None:
+        async with self._session_factory() as session:
+            try:
+                await session.execute(insert(AudioChunk), rows)
+                await session.commit()
+            except Exception:
+                await session.rollback()
+                raise
+
+    async def _apply_retention(self, cutoff: datetime) -> None:
+        stmt = (
+            select(AudioChunk.session_id)
+            .join(Session, Session.id == AudioChunk.session_id)
+            .where(Session.ended_at.is_not(None), Session.ended_at < cutoff)
+            .distinct()
+        )
+        async with self._session_factory() as session:
+            expired = list((await session.execute(stmt)).scalars())
+        if expired:
+            await self.remove(expired)
+
+    async def remove(self, session_ids: Sequence[int]) -> None:
+        """Delete the sessions' indexed audio and their segment files."""
+
+        async with self._session_factory() as session:
+            await session.execute(delete(AudioChunk).where(AudioChunk.session_id.in_(session_ids)))
+            await session.commit()
+        for session_id in session_ids:
+            self._forget(session_id)
+            self._retired.pop(session_id, None)
+            shutil.rmtree(self._directory / str(session_id), ignore_errors=True)
+
+    async def _compact_ended_sessions(self) -> None:
+        stmt = (
+            select(AudioChunk.session_id)
+            .join(Session, Session.id == AudioChunk.session_id)
+            .where(Session.ended_at.is_not(None))
+            .group_by(AudioChunk.session_id)
+            .having(func.count(func.distinct(AudioChunk.segment)) > 1)
+        )
+        async with self._session_factory() as session:
+            candidates = list((await session.execute(stmt)).scalars())
+        for session_id in candidates:
+            async with self._lock:
+                if session_id in self._buffers:
+                    continue
+                # Later chunks go to a fresh segment, so the ones read here are final.
+                self._segments.pop(session_id, None)
+                rows = await self._indexed_chunks(session_id)
+            if rows:
+                await self._compact(session_id, rows)
+
+    async def _indexed_chunks(
+        self, session_id: int, session_factory: Optional[Callable[[], AsyncSession]] = None
+    ) -> List[Tuple[int, str, int, int]]:
+        stmt = (
+            select(AudioChunk.sequence, AudioChunk.segment, AudioChunk.byte_offset, AudioChunk.length)
+            .where(AudioChunk.session_id == session_id)
+            .order_by(AudioChunk.sequence)
+        )
+        async with (session_factory or self._session_factory)() as session:
+            return [tuple(row) for row in (await session.execute(stmt)).all()]
+
+    async def _compact(self, session_id: int, rows: Sequence[Tuple[int, str, int, int]]) -> None:
+        directory = self._directory / str(session_id)
+        name = f"{time.time_ns():020d}-{uuid.uuid4().hex[:8]}.seg"
+        extents = [AudioExtent(segment, offset, length) for _, segment, offset, length in rows]
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._copy_extents, directory, name, extents)
+
+        updates = []
+        position = 0
+        for sequence, _, _, length in rows:
+            updates.append(
+                {"session_id": session_id, "sequence": sequence, "segment": name, "byte_offset": position}
+            )
+            position += length
+        async with self._session_factory() as session:
+            await session.execute(update(AudioChunk), updates)
+            await session.commit()
+        # Readers may hold extents of the old segments; delete them later.
+        self._retired.setdefault(session_id, set()).update(extent.segment for extent in extents)
+
+    async def _remove_orphans(self, cutoff: float) -> None:
+        """Delete files of ended sessions that no index row refers to.
+
+        Segments this process retired are left to :meth:`_unlink_retired`,
+        which waits for their readers.
+        """
+
+        loop = asyncio.get_running_loop()
+        listed = await loop.run_in_executor(None, self._list_files, cutoff)
+        busy = {*self._buffers, *self._segments, *self._readers, *(row["session_id"] for row in self._unindexed)}
+        candidates = [session_id for session_id in listed if session_id not in busy]
+        for start in range(0, len(candidates), _ORPHAN_BATCH):
+            batch = candidates[start : start + _ORPHAN_BATCH]
+            async with self._session_factory() as session:
+                stmt = select(Session.id, Session.ended_at).where(Session.id.in_(batch))
+                ended = {session_id: ended_at for session_id, ended_at in await session.execute(stmt)}
+                indexed: Dict[int, Set[str]] = {}
+                rows = await session.execute(
+                    select(AudioChunk.session_id, AudioChunk.segment)
+                    .where(AudioChunk.session_id.in_(batch))
+                    .distinct()
+                )
+                for session_id, segment in rows.tuples():
+                    indexed.setdefault(session_id, set()).add(segment)
+            orphans = {}
+            for session_id in batch:
+                if session_id in ended and ended[session_id] is None:
+                    continue
+                keep = indexed.get(session_id, set()) | self._retired.get(session_id, set())
+                orphans[session_id] = [name for name in listed[session_id] if name not in keep]
+            # Deleted sessions take no more audio, so their directories can go too.
+            gone = [session_id for session_id in orphans if session_id not in ended]
+            await loop.run_in_executor(None, self._unlink_orphans, orphans, gone)
+
+    def _list_files(self, cutoff: float) -> Dict[int, List[str]]:
+        """Names of the files last modified before ``cutoff``, by session."""
+
+        listed: Dict[int, List[str]] = {}
+        with os.scandir(self._directory) as sessions:
+            for entry in sessions:
+                if not entry.name.isdigit() or not entry.is_dir():
+                    continue
+                with os.scandir(entry.path) as files:
+                    names = [file.name for file in files if file.stat().st_mtime < cutoff]
+                if names:
+                    listed[int(entry.name)] = names
+        return listed
+
+    def _unlink_orphans(self, orphans: Dict[int, List[str]], gone: Sequence[int]) -> None:
+        for session_id, names in orphans.items():
+            directory = self._directory / str(session_id)
+            for name in names:
+                try:
+                    os.unlink(directory / name)
+                except FileNotFoundError:
+                    pass
+        for session_id in gone:
+            try:
+                (self._directory / str(session_id)).rmdir()
+            except OSError:
+                pass
+
+    def _copy_extents(self, directory: Path, name: str, extents: Sequence[AudioExtent]) -> None:
+        temporary = directory / f"{name}.tmp"
+        segments = _MappedSegments(directory)
+        try:
+            fd = os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+            try:
+                views = [segments.view(extent) for extent in extents]
+                _writev_all(fd, views)
+                for view in views:
+                    view.release()
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            os.replace(temporary, directory / name)
+        finally:
+            segments.close()
+
+    def _release_reader(self, session_id: int) -> None:
+        remaining = self._readers[session_id] - 1
+        if remaining:
+            self._readers[session_id] = remaining
+        else:
+            del self._readers[session_id]
+
+    def _unlink_retired(self) -> None:
+        """Delete segments retired by earlier compactions of sessions nobody is reading."""
+
+        for session_id in [session_id for session_id in self._retired if session_id not in self._readers]:
+            directory = self._directory / str(session_id)
+            for name in self._retired.pop(session_id):
+                try:
+                    os.unlink(directory / name)
+                except FileNotFoundError:
+                    pass
+
+    def _forget(self, session_id: int) -> None:
+        self._segments.pop(session_id, None)
+        self._next_sequence.pop(session_id, None)
+
+
+__all__ = ["AudioSpool", "AudioExtent", "parse_byte_range"]
@@ -0,0 +1,5 @@
+"""Benchmarks for the mindfulness coaching backend.
+
+Each module is runnable with ``python -m backend.benchmarks.<name>`` and
+writes a JSON report that later runs can be compared against.
+"""
@@ -0,0 +1,168 @@
+"""Indexing and query latency of the journal insight index.
+
+``--sessions`` synthetic journals spread over ``--users`` users are indexed
+one by one, as the engine does when it catches up; each user writes about a
+few themes of their own on top of common background words. Queries then ask
+for the insights of random users, by stored session and by the text of a
+new session as the summariser does, and once for one user with a long
+history of ``--history`` sessions. Saving and restoring the index are timed too::
+
+    python -m backend.benchmarks.insights --sessions 30000 --output run.json
+    python -m backend.benchmarks.insights --baseline run.json --threshold 0.2
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from .report import LatencyRecorder, compare_reports, format_summary, load_report, write_report
+
+INDEX = "index (per session)"
+USER = "insights (one user)"
+TEXT = "insights (one user, new session text)"
+LONG = "insights (long history)"
+SAVE = "save"
+RESTORE = "restore"
+LONG_USER = "long-history"
+
+
+def _vocabulary(rng: random.Random, size: int) -> List[str]:
+    consonants, vowels = "bcdfghklmnprstvw", "aeiou"
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(consonants) + rng.choice(vowels) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def _journal(rng: random.Random, background: List[str], weights: List[float], themes: List[str], words: int) -> str:
+    text = rng.choices(background, weights=weights, k=words - words // 5)
+    text.extend(rng.choices(themes, k=words // 5))
+    rng.shuffle(text)
+    return " ".join(text)
+
+
+def run_benchmark(args: argparse.Namespace, workdir: str) -> Dict[str, Any]:
+    from ..insights import InsightDocument, InsightIndex, read_arrays, write_arrays
+
+    rng = random.Random(args.seed)
+    background = _vocabulary(rng, args.vocabulary)
+    weights = [1 / (rank + 1) for rank in range(len(background))]
+    themes = {f"user-{user}": rng.sample(background, 12) for user in range(args.users)}
+    now = datetime(2026, 1, 1)
+    recorder = LatencyRecorder()
+    index = InsightIndex()
+    started = time.perf_counter()
+
+    documents = [
+        InsightDocument(
+            number + 1,
+            f"user-{number % args.users}",
+            now - timedelta(hours=args.sessions - number),
+            _journal(rng, background, weights, themes[f"user-{number % args.users}"], args.words),
+        )
+        for number in range(args.sessions)
+    ]
+    for document in documents:
+        began = time.perf_counter()
+        index.add(document)
+        recorder.record(INDEX, time.perf_counter() - began)
+
+    for _ in range(args.queries):
+        document = rng.choice(documents)
+        began = time.perf_counter()
+        index.insights(document.user_id, session_id=document.session_id, now=now)
+        recorder.record(USER, time.perf_counter() - began)
+        text = _journal(rng, background, weights, themes[document.user_id], args.words)
+        began = time.perf_counter()
+        index.insights(document.user_id, text=text, now=now)
+        recorder.record(TEXT, time.perf_counter() - began)
+
+    for number in range(args.history):
+        index.add(
+            InsightDocument(
+                args.sessions + number + 1,
+                LONG_USER,
+                now - timedelta(hours=args.history - number),
+                _journal(rng, background, weights, themes["user-0"], args.words),
+            )
+        )
+    for _ in range(max(1, args.queries // 10)):
+        began = time.perf_counter()
+        index.insights(LONG_USER, now=now)
+        recorder.record(LONG, time.perf_counter() - began)
+
+    path = os.path.join(workdir, "insights.npz")
+    began = time.perf_counter()
+    write_arrays(path, index.snapshot())
+    recorder.record(SAVE, time.perf_counter() - began)
+    began = time.perf_counter()
+    InsightIndex.restore(read_arrays(path))
+    recorder.record(RESTORE, time.perf_counter() - began)
+    duration = time.perf_counter() - started
+
+    return {
+        "benchmark": "insights",
+        "config": {
+            "sessions": args.sessions,
+            "users": args.users,
+            "history": args.history,
+            "words": args.words,
+            "vocabulary": args.vocabulary,
+            "queries": args.queries,
+            "seed": args.seed,
+        },
+        "duration_s": duration,
+        "index": {
+            "sessions": len(index),
+            "terms": index.terms,
+            "file_bytes": os.path.getsize(path),
+        },
+        "metrics": recorder.summarise(duration),
+    }
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=30000, help="journals indexed")
+    parser.add_argument("--users", type=int, default=300, help="users the journals belong to")
+    parser.add_argument("--history", type=int, default=2000, help="sessions of the one long history")
+    parser.add_argument("--words", type=int, default=200, help="words per journal")
+    parser.add_argument("--vocabulary", type=int, default=5000, help="distinct background words")
+    parser.add_argument("--queries", type=int, default=200, help="queries of each kind")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--baseline", help="compare against this JSON report")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative regression")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    with tempfile.TemporaryDirectory(prefix="mindful-bench-") as workdir:
+        report = run_benchmark(args, workdir)
+
+    print(format_summary(report["metrics"]))
+    index = report["index"]
+    print(f"{index['sessions']} sessions, {index['terms']} terms, {index['file_bytes']} bytes saved")
+    if args.output:
+        write_report(report, args.output)
+    if args.baseline:
+        regressions = compare_reports(load_report(args.baseline), report, threshold=args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+    return 0
+
+
+__all__ = ["run_benchmark", "main"]
+
+
+if __name__ == "__main__":
+    sys.exit(main())
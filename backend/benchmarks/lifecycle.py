@@ -0,0 +1,347 @@
+"""Load and latency benchmark for the full session lifecycle.
+
+Every synthetic user repeatedly starts a session, answers questions over the
+stream WebSocket, ends the session and lists journals. Latency is recorded
+per endpoint and per WebSocket turn (chunk sent until the next question
+arrives). The app runs in-process by default, under a local uvicorn with
+``--uvicorn``, or is reached at ``--url``::
+
+    python -m backend.benchmarks.lifecycle --users 20 --sessions 5 --output run.json
+    python -m backend.benchmarks.lifecycle --baseline run.json --threshold 0.1
+
+With ``--baseline`` the exit status is 1 when any latency percentile grows,
+or any throughput drops, by more than ``--threshold``.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Protocol, Tuple
+
+from .report import LatencyRecorder, compare_reports, format_summary, load_report, write_report
+
+DELAY_ENV = "BENCH_TRANSCRIBER_DELAY_MS"
+
+
+class FixedDelayTranscriber:
+    """Transcriber stand-in that takes a fixed time per chunk."""
+
+    def __init__(self, delay: float) -> None:
+        self._delay = delay
+
+    async def transcribe_chunk(self, data: bytes) -> str:
+        await asyncio.sleep(self._delay)
+        return f"[audio chunk: {len(data)} bytes]"
+
+
+def create_app() -> Any:
+    """uvicorn factory: the regular app, with the stand-in transcriber if configured."""
+
+    from ..main import app
+
+    delay_ms = float(os.environ.get(DELAY_ENV, "0"))
+    if delay_ms > 0:
+        app.state.components.set("transcriber", FixedDelayTranscriber(delay_ms / 1000))
+    return app
+
+
+class _Socket(Protocol):
+    def send_bytes(self, data: bytes) -> None: ...
+
+    def receive_event(self) -> Optional[Dict[str, Any]]: ...
+
+    def close(self) -> None: ...
+
+
+class _Client(Protocol):
+    def request(self, method: str, path: str, **params: Any) -> Tuple[int, Any]: ...
+
+    def websocket(self, path: str) -> _Socket: ...
+
+
+class _TestClientSocket:
+    def __init__(self, context: Any) -> None:
+        self._context = context
+        self._session = context.__enter__()
+
+    def send_bytes(self, data: bytes) -> None:
+        self._session.send_bytes(data)
+
+    def receive_event(self) -> Optional[Dict[str, Any]]:
+        message = self._session.receive()
+        if message.get("type") == "websocket.close":
+            return None
+        if message.get("text") is not None:
+            return json.loads(message["text"])
+        return {"type": "audio"}
+
+    def close(self) -> None:
+        self._context.__exit__(None, None, None)
+
+
+class InProcessClient:
+    """Drive the ASGI app through Starlette's TestClient, shared by all threads."""
+
+    def __init__(self, client: Any) -> None:
+        self._client = client
+
+    def request(self, method: str, path: str, **params: Any) -> Tuple[int, Any]:
+        response = self._client.request(method, path, params=params or None)
+        return response.status_code, response.json()
+
+    def websocket(self, path: str) -> _Socket:
+        return _TestClientSocket(self._client.websocket_connect(path))
+
+
+class _RemoteSocket:
+    def __init__(self, context: Any) -> None:
+        self._context = context
+        self._connection = context.__enter__()
+
+    def send_bytes(self, data: bytes) -> None:
+        self._connection.send(data)
+
+    def receive_event(self) -> Optional[Dict[str, Any]]:
+        from websockets.exceptions import ConnectionClosed
+
+        try:
+            message = self._connection.recv()
+        except ConnectionClosed:
+            return None
+        if isinstance(message, str):
+            return json.loads(message)
+        return {"type": "audio"}
+
+    def close(self) -> None:
+        self._context.__exit__(None, None, None)
+
+
+class RemoteClient:
+    """Drive a running server over HTTP and WebSocket (needs ``websockets``)."""
+
+    def __init__(self, base_url: str) -> None:
+        import httpx
+
+        self._base_url = base_url.rstrip("/")
+        self._client = httpx.Client(base_url=self._base_url, timeout=60.0)
+
+    def request(self, method: str, path: str, **params: Any) -> Tuple[int, Any]:
+        response = self._client.request(method, path, params=params or None)
+        return response.status_code, response.json()
+
+    def websocket(self, path: str) -> _Socket:
+        from websockets.sync.client import connect
+
+        url = "ws" + self._base_url[len("http") :] + path
+        return _RemoteSocket(connect(url, max_size=None))
+
+
+def _timed(
+    recorder: LatencyRecorder, metric: str, client: _Client, method: str, path: str, **params: Any
+) -> Optional[Any]:
+    """Issue a request, record its latency and return the JSON body on success."""
+
+    started = time.perf_counter()
+    try:
+        status, body = client.request(method, path, **params)
+    except Exception:
+        recorder.error(metric)
+        return None
+    if status == 503:
+        # Shed by admission control: tracked apart from failures.
+        recorder.record(f"{metric} (shed)", time.perf_counter() - started)
+        return None
+    if status >= 400:
+        recorder.error(metric)
+        return None
+    recorder.record(metric, time.perf_counter() - started)
+    return body
+
+
+def _stream(client: _Client, recorder: LatencyRecorder, session_id: int, args: argparse.Namespace) -> None:
+    payload = os.urandom(args.chunk_bytes)
+    started = time.perf_counter()
+    try:
+        socket_ = client.websocket(f"/session/{session_id}/stream")
+    except Exception:
+        recorder.error("WS connect")
+        return
+    recorder.record("WS connect", time.perf_counter() - started)
+    try:
+        for _ in range(args.turns):
+            sent_at = time.perf_counter()
+            socket_.send_bytes(payload)
+            while True:
+                event = socket_.receive_event()
+                if event is None or event.get("type") in {"question", "complete"}:
+                    break
+            if event is None:
+                recorder.error("WS turn")
+                return
+            recorder.record("WS turn", time.perf_counter() - sent_at)
+            if event["type"] == "complete":
+                return
+            if args.chunk_interval_ms > 0:
+                time.sleep(args.chunk_interval_ms / 1000)
+    except Exception:
+        recorder.error("WS turn")
+    finally:
+        try:
+            socket_.close()
+        except Exception:
+            pass
+
+
+def _user(client: _Client, recorder: LatencyRecorder, args: argparse.Namespace) -> None:
+    for _ in range(args.sessions):
+        started = _timed(recorder, "POST /session/start", client, "POST", "/session/start")
+        if started is None:
+            continue
+        session_id = started["session_id"]
+        _stream(client, recorder, session_id, args)
+        _timed(recorder, "POST /session/{id}/end", client, "POST", f"/session/{session_id}/end")
+        _timed(recorder, "GET /journals", client, "GET", "/journals", limit=20)
+
+
+def run_load(client: _Client, args: argparse.Namespace) -> Dict[str, Any]:
+    recorder = LatencyRecorder()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.users) as pool:
+        for future in [pool.submit(_user, client, recorder, args) for _ in range(args.users)]:
+            future.result()
+    duration = time.perf_counter() - started
+    return {
+        "benchmark": "lifecycle",
+        "config": {
+            "mode": args.mode,
+            "users": args.users,
+            "sessions": args.sessions,
+            "turns": args.turns,
+            "chunk_bytes": args.chunk_bytes,
+            "chunk_interval_ms": args.chunk_interval_ms,
+            "transcriber_delay_ms": args.transcriber_delay_ms,
+        },
+        "duration_s": duration,
+        "metrics": recorder.summarise(duration),
+    }
+
+
+@contextmanager
+def _in_process(args: argparse.Namespace) -> Iterator[_Client]:
+    from fastapi.testclient import TestClient
+
+    app = create_app()
+    with TestClient(app) as test_client:
+        yield InProcessClient(test_client)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def _uvicorn(args: argparse.Namespace) -> Iterator[_Client]:
+    port = _free_port()
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "backend.benchmarks.lifecycle:create_app",
+            "--factory",
+            "--port",
+            str(port),
+            "--log-level",
+            "warning",
+        ],
+        env=dict(os.environ),
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                urllib.request.urlopen(f"{base_url}/journals", timeout=1).close()
+                break
+            except OSError:
+                if process.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError("uvicorn did not start")
+                time.sleep(0.1)
+        yield RemoteClient(base_url)
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+@contextmanager
+def _remote(args: argparse.Namespace) -> Iterator[_Client]:
+    yield RemoteClient(args.url)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--uvicorn", action="store_true", help="run the app under a local uvicorn process")
+    target.add_argument("--url", help="benchmark an already running server at this base URL")
+    parser.add_argument("--users", type=int, default=10, help="concurrent synthetic users")
+    parser.add_argument("--sessions", type=int, default=5, help="sessions run by each user")
+    parser.add_argument("--turns", type=int, default=3, help="chunks sent per session")
+    parser.add_argument("--chunk-bytes", type=int, default=3200, help="size of each audio chunk")
+    parser.add_argument("--chunk-interval-ms", type=float, default=0.0, help="pause between chunks")
+    parser.add_argument(
+        "--transcriber-delay-ms",
+        type=float,
+        default=0.0,
+        help="replace MockTranscriber with one that takes this long per chunk",
+    )
+    parser.add_argument("--database", help="SQLite file to use (default: a fresh temporary file)")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--baseline", help="compare against this JSON report")
+    parser.add_argument("--threshold", type=float, default=0.1, help="allowed relative regression")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    args.mode = "url" if args.url else "uvicorn" if args.uvicorn else "in-process"
+    with tempfile.TemporaryDirectory(prefix="mindful-bench-") as workdir:
+        if not args.url:
+            # Settings are read when the app is imported, so configure them first.
+            database = args.database or os.path.join(workdir, "bench.db")
+            os.environ.setdefault("MINDFUL_DATABASE_URL", f"sqlite+aiosqlite:///{database}")
+            os.environ.setdefault("MINDFUL_CONVERSATION_STORE_PATH", os.path.join(workdir, "conversations.db"))
+            os.environ.setdefault("MINDFUL_TTS_CACHE_DIR", os.path.join(workdir, "tts_cache"))
+            os.environ[DELAY_ENV] = str(args.transcriber_delay_ms)
+        target = _remote if args.url else _uvicorn if args.uvicorn else _in_process
+        with target(args) as client:
+            report = run_load(client, args)
+
+    print(format_summary(report["metrics"]))
+    if args.output:
+        write_report(report, args.output)
+    if args.baseline:
+        regressions = compare_reports(load_report(args.baseline), report, threshold=args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+    return 0
+
+
+__all__ = ["FixedDelayTranscriber", "create_app", "run_load", "main"]
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,235 @@
+"""Question latency of the chat model orchestrator against a stub server.
+
+A local OpenAI-compatible stub streams completions token by token after a
+first-token delay, and stalls a fraction of requests the way a busy model
+server does. Concurrent synthetic sessions answer every question; between
+recording an answer and asking for the next question they spend
+``--turn-work-ms`` on the rest of the turn (storing and sending the
+transcript). The latency recorded is how long the turn then waits for its
+question, for the orchestrator without hedging or prefetch, with hedging,
+with hedging and prefetch, and for a replay of the same conversations
+served from the prefix cache::
+
+    python -m backend.benchmarks.llm --sessions 20 --output run.json
+    python -m backend.benchmarks.llm --baseline run.json --threshold 0.2
+
+Use ``--url`` to run against a real endpoint instead of the stub.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import socket
+import sys
+import time
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from .report import LatencyRecorder, compare_reports, format_summary, load_report, write_report
+
+PLAIN = "question (no hedging, no prefetch)"
+HEDGED = "question (hedged)"
+PREFETCHED = "question (hedged, prefetched)"
+CACHED = "question (prefix cache replay)"
+
+ANSWERS = [
+    "It was long but I managed to finish the report I was dreading.",
+    "My sister called and we laughed about something silly from when we were kids.",
+    "A meeting ran over and I skipped lunch, which made me snappy.",
+    "I went for a short walk after dinner and left my phone at home.",
+    "I want to start the morning without checking email first.",
+]
+
+
+def create_stub_app(args: argparse.Namespace) -> Any:
+    """A streaming ``/v1/chat/completions`` that answers with canned text."""
+
+    from starlette.applications import Starlette
+    from starlette.requests import Request
+    from starlette.responses import StreamingResponse
+    from starlette.routing import Route
+
+    rng = random.Random(args.seed)
+    served = {"requests": 0}
+
+    async def completions(request: Request) -> StreamingResponse:
+        payload = await request.json()
+        served["requests"] += 1
+        topic = payload["messages"][-1]["content"]
+        words = f"Thank you for sharing that. {topic.split(':', 1)[-1].strip()}".split()
+        words = (words * (args.tokens // max(1, len(words)) + 1))[: args.tokens]
+        stall = args.stall_ms / 1000 if rng.random() < args.stall_rate else 0.0
+
+        async def body() -> AsyncIterator[str]:
+            await asyncio.sleep(args.first_token_ms / 1000 + stall)
+            for index, word in enumerate(words):
+                if index:
+                    await asyncio.sleep(args.token_ms / 1000)
+                chunk = {"choices": [{"delta": {"content": word + " "}}]}
+                yield f"data: {json.dumps(chunk)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(body(), media_type="text/event-stream")
+
+    app = Starlette(routes=[Route("/v1/chat/completions", completions, methods=["POST"])])
+    app.state.served = served
+    return app
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _session(orchestrator: Any, session_id: int, recorder: LatencyRecorder, metric: str, work: float) -> None:
+    from ..records import MessageRecord
+
+    orchestrator.start_session(session_id)
+    for answer in ANSWERS:
+        # Distinct per session, so only a replay of the same session shares prompts.
+        answer = f"{answer} ({session_id})"
+        orchestrator.record_message(session_id, MessageRecord("user", answer, datetime.utcnow()))
+        await asyncio.sleep(work)
+        began = time.perf_counter()
+        question = await orchestrator.ask_next_question(session_id)
+        recorder.record(metric, time.perf_counter() - began)
+        if question is None:
+            break
+        orchestrator.record_message(session_id, MessageRecord("assistant", question, datetime.utcnow()))
+    orchestrator.end_session(session_id)
+
+
+async def _scenario(
+    args: argparse.Namespace,
+    base_url: str,
+    recorder: LatencyRecorder,
+    *,
+    hedge: bool,
+    prefetch: bool,
+    replay: Optional[str] = None,
+) -> None:
+    from ..llm import OpenAIChatClient
+    from ..orchestrator import ChatOrchestrator
+
+    client = OpenAIChatClient(
+        base_url,
+        args.model,
+        timeout=args.timeout,
+        hedge_after=args.hedge_after_ms / 1000 if hedge else 0,
+        max_connections=args.sessions * 2,
+        max_keepalive_connections=args.sessions * 2,
+    )
+    orchestrator = ChatOrchestrator(client, prefetch=prefetch)
+    metric = PREFETCHED if prefetch else HEDGED if hedge else PLAIN
+    work = args.turn_work_ms / 1000
+    try:
+        await asyncio.gather(
+            *(_session(orchestrator, number, recorder, metric, work) for number in range(args.sessions))
+        )
+        if replay is not None:
+            # The same conversations again: every prompt is already cached.
+            await asyncio.gather(
+                *(_session(orchestrator, number, recorder, replay, work) for number in range(args.sessions))
+            )
+    finally:
+        await orchestrator.close()
+
+
+async def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    served: Dict[str, int] = {}
+    server = task = None
+    base_url = args.url
+    if base_url is None:
+        import uvicorn
+
+        app = create_stub_app(args)
+        served = app.state.served
+        port = _free_port()
+        server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="off"))
+        task = asyncio.create_task(server.serve())
+        while not server.started:
+            await asyncio.sleep(0.01)
+        base_url = f"http://127.0.0.1:{port}/v1"
+
+    recorder = LatencyRecorder()
+    requests: List[Tuple[str, int]] = []
+    started = time.perf_counter()
+    try:
+        for metric, hedge, prefetch, replay in (
+            (PLAIN, False, False, None),
+            (HEDGED, True, False, None),
+            (PREFETCHED, True, True, CACHED),
+        ):
+            before = served.get("requests", 0)
+            await _scenario(args, base_url, recorder, hedge=hedge, prefetch=prefetch, replay=replay)
+            requests.append((metric, served.get("requests", 0) - before))
+    finally:
+        if server is not None and task is not None:
+            server.should_exit = True
+            await task
+    duration = time.perf_counter() - started
+    return {
+        "benchmark": "llm",
+        "config": {
+            "sessions": args.sessions,
+            "turn_work_ms": args.turn_work_ms,
+            "first_token_ms": args.first_token_ms,
+            "token_ms": args.token_ms,
+            "tokens": args.tokens,
+            "stall_rate": args.stall_rate,
+            "stall_ms": args.stall_ms,
+            "hedge_after_ms": args.hedge_after_ms,
+            "url": args.url,
+        },
+        "duration_s": duration,
+        "requests": dict(requests),
+        "metrics": recorder.summarise(duration),
+    }
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=20, help="concurrent synthetic sessions")
+    parser.add_argument("--turn-work-ms", type=float, default=150, help="rest of the turn between answer and question")
+    parser.add_argument("--first-token-ms", type=float, default=120, help="stub delay before the first token")
+    parser.add_argument("--token-ms", type=float, default=8, help="stub delay between tokens")
+    parser.add_argument("--tokens", type=int, default=24, help="tokens per stub completion")
+    parser.add_argument("--stall-rate", type=float, default=0.05, help="share of stub requests that stall")
+    parser.add_argument("--stall-ms", type=float, default=2000, help="extra first-token delay of a stalled request")
+    parser.add_argument("--hedge-after-ms", type=float, default=400)
+    parser.add_argument("--timeout", type=float, default=20.0, help="deadline of one completion")
+    parser.add_argument("--model", default="stub")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--url", help="OpenAI-compatible base URL to use instead of the stub, e.g. http://host/v1")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--baseline", help="compare against this JSON report")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative regression")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    report = asyncio.run(run_benchmark(args))
+
+    print(format_summary(report["metrics"]))
+    for metric, count in report["requests"].items():
+        print(f"{metric}: {count} requests sent to the model server")
+    if args.output:
+        write_report(report, args.output)
+    if args.baseline:
+        regressions = compare_reports(load_report(args.baseline), report, threshold=args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+    return 0
+
+
+__all__ = ["create_stub_app", "run_benchmark", "main"]
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+"""Latency recording, JSON reports and baseline comparison for benchmarks."""
+from __future__ import annotations
+
+import json
+import math
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Linearly interpolated percentile of already sorted values."""
+
+    if not sorted_values:
+        return 0.0
+    rank = (len(sorted_values) - 1) * pct / 100
+    low = math.floor(rank)
+    high = math.ceil(rank)
+    if low == high:
+        return sorted_values[low]
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (rank - low)
+
+
+class LatencyRecorder:
+    """Thread-safe collection of latency samples and errors per metric."""
+
+    def __init__(self) -> None:
+        self._samples: Dict[str, List[float]] = {}
+        self._errors: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def record(self, metric: str, seconds: float) -> None:
+        with self._lock:
+            self._samples.setdefault(metric, []).append(seconds)
+
+    def error(self, metric: str) -> None:
+        with self._lock:
+            self._errors[metric] = self._errors.get(metric, 0) + 1
+            self._samples.setdefault(metric, [])
+
+    def summarise(self, duration: float) -> Dict[str, Dict[str, float]]:
+        """Return throughput and latency statistics in milliseconds per metric."""
+
+        with self._lock:
+            samples = {metric: sorted(values) for metric, values in self._samples.items()}
+            errors = dict(self._errors)
+        summary: Dict[str, Dict[str, float]] = {}
+        for metric, values in sorted(samples.items()):
+            stats: Dict[str, float] = {
+                "count": len(values),
+                "errors": errors.get(metric, 0),
+                "throughput_per_s": len(values) / duration if duration > 0 else 0.0,
+                "mean_ms": sum(values) / len(values) * 1000 if values else 0.0,
+                "max_ms": values[-1] * 1000 if values else 0.0,
+            }
+            for pct in PERCENTILES:
+                stats[f"p{pct}_ms"] = percentile(values, pct) * 1000
+            summary[metric] = stats
+        return summary
+
+
+def write_report(report: Dict[str, Any], path: Union[str, Path]) -> None:
+    Path(path).write_text(json.dumps(report, indent=2, sort_keys=True) + "\n")
+
+
+def load_report(path: Union[str, Path]) -> Dict[str, Any]:
+    return json.loads(Path(path).read_text())
+
+
+def compare_reports(
+    baseline: Dict[str, Any],
+    current: Dict[str, Any],
+    *,
+    threshold: float,
+    statistics: Optional[List[str]] = None,
+) -> List[str]:
+    """Return a description of every regression beyond ``threshold``.
+
+    Latency statistics regress when they grow by more than ``threshold``
+    (``0.1`` is 10%), throughput when it shrinks by more than that. Metrics
+    missing from either report are skipped.
+    """
+
+    statistics = statistics or [f"p{pct}_ms" for pct in PERCENTILES]
+    regressions = []
+    for metric, before in baseline.get("metrics", {}).items():
+        after = current.get("metrics", {}).get(metric)
+        if after is None:
+            continue
+        for name in statistics:
+            old, new = before.get(name), after.get(name)
+            if not old or new is None:
+                continue
+            if new > old * (1 + threshold):
+                regressions.append(f"{metric} {name}: {old:.2f} -> {new:.2f} (+{(new / old - 1) * 100:.1f}%)")
+        old, new = before.get("throughput_per_s"), after.get("throughput_per_s")
+        if old and new is not None and new < old * (1 - threshold):
+            regressions.append(
+                f"{metric} throughput_per_s: {old:.2f} -> {new:.2f} ({(new / old - 1) * 100:.1f}%)"
+            )
+        if after.get("errors", 0) > before.get("errors", 0):
+            regressions.append(f"{metric} errors: {before.get('errors', 0)} -> {after['errors']}")
+    return regressions
+
+
+def format_summary(metrics: Dict[str, Dict[str, float]]) -> str:
+    header = f"{'metric':<28}{'count':>8}{'err':>6}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    lines = [header, "-" * len(header)]
+    for metric, stats in metrics.items():
+        lines.append(
+            f"{metric:<28}{stats['count']:>8.0f}{stats['errors']:>6.0f}{stats['throughput_per_s']:>10.1f}"
+            f"{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}"
+        )
+    return "\n".join(lines)
+
+
+__all__ = [
+    "LatencyRecorder",
+    "percentile",
+    "write_report",
+    "load_report",
+    "compare_reports",
+    "format_summary",
+]
@@ -0,0 +1,156 @@
+"""Simulated months of sessions with and without the retention job.
+
+Each simulated day inserts ``--sessions-per-day`` finished sessions of
+``--messages`` messages in the message writer's batch shape, then (in the
+compacted run) lets :class:`~backend.retention.SessionCompactor` archive,
+expire and vacuum as its daily pass would. Both runs use fresh temporary
+databases; the report compares insert latency over the last simulated week
+and the final database size::
+
+    python -m backend.benchmarks.retention --days 120 --output run.json
+    python -m backend.benchmarks.retention --baseline run.json --threshold 0.2
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from .report import LatencyRecorder, compare_reports, format_summary, load_report, write_report
+
+UNBOUNDED = "insert batch (no retention)"
+COMPACTED = "insert batch (retention)"
+
+
+async def _simulate(args: argparse.Namespace, database: str, recorder: LatencyRecorder, metric: str, compact: bool) -> int:
+    from sqlalchemy import insert
+    from sqlalchemy.ext.asyncio import AsyncSession
+    from sqlalchemy.orm import sessionmaker
+
+    from ..config import Settings
+    from ..database import ensure_schema
+    from ..models import Message, Session, SessionSummary
+    from ..retention import SessionCompactor
+    from ..storage import create_write_engine
+
+    engine = create_write_engine(Settings(database_url=f"sqlite+aiosqlite:///{database}"))
+    session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    compactor = SessionCompactor(
+        session_factory,
+        archive_after=timedelta(days=args.archive_after_days),
+        retention=timedelta(days=args.retention_days),
+        batch_size=args.batch_size,
+        vacuum_pages=1_000_000,
+    )
+    text = "I noticed my breathing and let the thought pass. " * 4
+    started = datetime(2024, 1, 1, 9, 0, 0)
+    try:
+        async with engine.begin() as connection:
+            await connection.run_sync(ensure_schema)
+        for day in range(args.days):
+            today = started + timedelta(days=day)
+            for number in range(args.sessions_per_day):
+                begin = today + timedelta(minutes=number * 30)
+                async with session_factory() as db_session:
+                    instance = Session(
+                        started_at=begin,
+                        ended_at=begin + timedelta(minutes=20),
+                        status="completed",
+                        summary_status="ready",
+                    )
+                    db_session.add(instance)
+                    await db_session.flush()
+                    db_session.add(
+                        SessionSummary(session_id=instance.id, journal_entry=text, recommendations=text, preview=text)
+                    )
+                    await db_session.commit()
+                rows = [
+                    {
+                        "session_id": instance.id,
+                        "role": "user" if index % 2 else "assistant",
+                        "content": f"{index}: {text}",
+                        "created_at": begin + timedelta(seconds=index),
+                    }
+                    for index in range(args.messages)
+                ]
+                for offset in range(0, len(rows), args.insert_batch):
+                    began = time.perf_counter()
+                    async with session_factory() as db_session:
+                        await db_session.execute(insert(Message), rows[offset : offset + args.insert_batch])
+                        await db_session.commit()
+                    if day >= args.days - 7:
+                        recorder.record(metric, time.perf_counter() - began)
+            if compact:
+                await compactor.maintain(now=today + timedelta(days=1))
+    finally:
+        await engine.dispose()
+    return os.path.getsize(database)
+
+
+async def run_benchmark(args: argparse.Namespace, workdir: str) -> Dict[str, Any]:
+    recorder = LatencyRecorder()
+    started = time.perf_counter()
+    sizes = {
+        UNBOUNDED: await _simulate(args, os.path.join(workdir, "unbounded.db"), recorder, UNBOUNDED, False),
+        COMPACTED: await _simulate(args, os.path.join(workdir, "compacted.db"), recorder, COMPACTED, True),
+    }
+    duration = time.perf_counter() - started
+    return {
+        "benchmark": "retention",
+        "config": {
+            "days": args.days,
+            "sessions_per_day": args.sessions_per_day,
+            "messages": args.messages,
+            "archive_after_days": args.archive_after_days,
+            "retention_days": args.retention_days,
+        },
+        "duration_s": duration,
+        "database_bytes": sizes,
+        "metrics": recorder.summarise(duration),
+    }
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=int, default=120, help="simulated days of traffic")
+    parser.add_argument("--sessions-per-day", type=int, default=20)
+    parser.add_argument("--messages", type=int, default=40, help="messages per session")
+    parser.add_argument("--insert-batch", type=int, default=8, help="messages per insert, as the writer batches them")
+    parser.add_argument("--archive-after-days", type=int, default=7)
+    parser.add_argument("--retention-days", type=int, default=30)
+    parser.add_argument("--batch-size", type=int, default=50, help="sessions per retention transaction")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--baseline", help="compare against this JSON report")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative regression")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    with tempfile.TemporaryDirectory(prefix="mindful-bench-") as workdir:
+        report = asyncio.run(run_benchmark(args, workdir))
+
+    print(format_summary(report["metrics"]))
+    for name, size in report["database_bytes"].items():
+        print(f"{name}: database {size / 1024 / 1024:.1f} MiB")
+    if args.output:
+        write_report(report, args.output)
+    if args.baseline:
+        regressions = compare_reports(load_report(args.baseline), report, threshold=args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+    return 0
+
+
+__all__ = ["run_benchmark", "main"]
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,193 @@
+"""Journal detail serialisation benchmark on long transcripts.
+
+Builds one finished session with ``--messages`` messages in a temporary
+SQLite database and repeatedly produces the ``GET /journals/{id}`` body two
+ways: the model path (ORM entities, a ``MessageSchema`` per row, the
+response model and FastAPI's ``jsonable_encoder``) and the row path used by
+the endpoint (Core column tuples, ``MessageRecord`` and
+:class:`~backend.responses.FastJSONResponse`)::
+
+    python -m backend.benchmarks.serialization --messages 1000 --output run.json
+    python -m backend.benchmarks.serialization --baseline run.json --threshold 0.1
+
+Both bodies are checked to decode to the same JSON before timing starts.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from .report import LatencyRecorder, compare_reports, format_summary, load_report, write_report
+
+MODEL_PATH = "model path"
+ROW_PATH = "row path"
+
+
+async def _seed(session_factory: Callable[[], Any], messages: int, content_bytes: int) -> int:
+    from ..models import Message, Session, SessionSummary
+
+    started = datetime(2024, 1, 1, 9, 0, 0)
+    async with session_factory() as db_session:
+        instance = Session(started_at=started, ended_at=started + timedelta(hours=1), status="completed")
+        db_session.add(instance)
+        await db_session.flush()
+        text = ("I noticed my breathing and let the thought pass. " * (content_bytes // 48 + 1))[:content_bytes]
+        db_session.add_all(
+            Message(
+                session_id=instance.id,
+                role="user" if index % 2 else "assistant",
+                content=f"{index}: {text}",
+                created_at=started + timedelta(seconds=index, microseconds=index),
+            )
+            for index in range(messages)
+        )
+        db_session.add(
+            SessionSummary(
+                session_id=instance.id,
+                journal_entry="A calm day with a few challenges.",
+                recommendations="Keep a short breathing practice.",
+                preview="A calm day with a few challenges.",
+            )
+        )
+        await db_session.commit()
+        return instance.id
+
+
+async def _model_path(db_session: Any, session_id: int) -> bytes:
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+    from sqlalchemy import select
+
+    from ..models import Message, SessionSummary
+    from ..schemas import JournalDetailResponse, MessageSchema
+
+    summary = (
+        await db_session.execute(select(SessionSummary).where(SessionSummary.session_id == session_id))
+    ).scalar_one()
+    result = await db_session.execute(
+        select(Message).where(Message.session_id == session_id).order_by(Message.created_at.asc())
+    )
+    messages = [
+        MessageSchema(role=record.role, content=record.content, created_at=record.created_at)
+        for record in result.scalars()
+    ]
+    response = JournalDetailResponse(
+        session=session_id,
+        journal_entry=summary.journal_entry,
+        recommendations=summary.recommendations,
+        messages=messages,
+    )
+    # What FastAPI does with a returned model: validate against the response
+    # model, encode to primitives, then render.
+    validated = JournalDetailResponse.validate(response)
+    return JSONResponse(jsonable_encoder(validated)).body
+
+
+async def _row_path(db_session: Any, session_id: int) -> bytes:
+    from ..orchestrator import LLMOrchestrator
+    from ..responses import FastJSONResponse
+    from ..services import SessionService
+
+    service = SessionService(db_session, LLMOrchestrator())
+    summary = await service.fetch_summary(session_id)
+    messages = await service.fetch_messages(session_id)
+    return FastJSONResponse(
+        {
+            "session": session_id,
+            "journal_entry": summary.journal_entry,
+            "recommendations": summary.recommendations,
+            "messages": [message.as_dict() for message in messages],
+        }
+    ).body
+
+
+async def run_benchmark(args: argparse.Namespace, database: str) -> Dict[str, Any]:
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+    from sqlalchemy.orm import sessionmaker
+
+    from ..models import Base
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{database}")
+    session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        session_id = await _seed(session_factory, args.messages, args.content_bytes)
+
+        paths = {MODEL_PATH: _model_path, ROW_PATH: _row_path}
+        bodies = {}
+        for name, path in paths.items():
+            async with session_factory() as db_session:
+                bodies[name] = await path(db_session, session_id)
+        if json.loads(bodies[MODEL_PATH]) != json.loads(bodies[ROW_PATH]):
+            raise RuntimeError("The two paths produced different responses")
+
+        recorder = LatencyRecorder()
+        started = time.perf_counter()
+        for _ in range(args.iterations):
+            # Alternate the paths so drift in the machine affects both alike.
+            for name, path in paths.items():
+                async with session_factory() as db_session:
+                    began = time.perf_counter()
+                    await path(db_session, session_id)
+                    recorder.record(name, time.perf_counter() - began)
+        duration = time.perf_counter() - started
+    finally:
+        await engine.dispose()
+
+    metrics = recorder.summarise(duration)
+    return {
+        "benchmark": "serialization",
+        "config": {
+            "messages": args.messages,
+            "content_bytes": args.content_bytes,
+            "iterations": args.iterations,
+        },
+        "duration_s": duration,
+        "response_bytes": len(bodies[ROW_PATH]),
+        "speedup_p50": metrics[MODEL_PATH]["p50_ms"] / metrics[ROW_PATH]["p50_ms"],
+        "metrics": metrics,
+    }
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=1000, help="messages in the transcript")
+    parser.add_argument("--content-bytes", type=int, default=200, help="length of each message")
+    parser.add_argument("--iterations", type=int, default=50, help="responses built per path")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--baseline", help="compare against this JSON report")
+    parser.add_argument("--threshold", type=float, default=0.1, help="allowed relative regression")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    with tempfile.TemporaryDirectory(prefix="mindful-bench-") as workdir:
+        report = asyncio.run(run_benchmark(args, os.path.join(workdir, "bench.db")))
+
+    print(format_summary(report["metrics"]))
+    print(f"response size {report['response_bytes']} bytes, p50 speedup {report['speedup_p50']:.2f}x")
+    if args.output:
+        write_report(report, args.output)
+    if args.baseline:
+        regressions = compare_reports(load_report(args.baseline), report, threshold=args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+    return 0
+
+
+__all__ = ["run_benchmark", "main"]
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+"""Aggregate write throughput by number of database shards.
+
+``--users`` synthetic users each start a session on the shard the router
+maps them to and then commit ``--transactions`` transactions of ``--batch``
+messages, all users concurrently, as the message writer does for a busy
+server. The run is repeated on fresh temporary databases for every shard
+count in ``--shards``; each metric records commit latency, and its
+throughput is committed transactions per second across all shards::
+
+    python -m backend.benchmarks.sharding --shards 1 2 4 8 --output run.json
+    python -m backend.benchmarks.sharding --baseline run.json --threshold 0.2
+
+Commits are only as durable as ``--synchronous`` makes them; ``FULL``
+syncs every commit, which is what a single write connection serialises.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from .report import LatencyRecorder, compare_reports, format_summary, load_report, write_report
+
+
+def _metric(shards: int) -> str:
+    return f"commit ({shards} shard{'s' if shards != 1 else ''})"
+
+
+async def _user(router: Any, user: str, args: argparse.Namespace, recorder: LatencyRecorder, metric: str) -> None:
+    from sqlalchemy import insert
+
+    from ..models import Message, Session
+
+    session_factory = router.session_factory(router.shard_for_user(user))
+    async with session_factory() as db_session:
+        instance = Session(user_id=user)
+        db_session.add(instance)
+        await db_session.commit()
+    text = f"{user} noticed the breath and let the thought pass. " * 4
+    for number in range(args.transactions):
+        rows = [
+            {"session_id": instance.id, "role": "user", "content": f"{number}.{index} {text}", "created_at": datetime.utcnow()}
+            for index in range(args.batch)
+        ]
+        began = time.perf_counter()
+        try:
+            async with session_factory() as db_session:
+                await db_session.execute(insert(Message), rows)
+                await db_session.commit()
+        except Exception:
+            recorder.error(metric)
+        else:
+            recorder.record(metric, time.perf_counter() - began)
+
+
+async def _run(args: argparse.Namespace, workdir: str, shards: int) -> Dict[str, Any]:
+    from ..config import Settings
+    from ..database import ensure_shard_schemas
+    from ..sharding import ShardRouter
+
+    settings = Settings(
+        database_url=f"sqlite+aiosqlite:///{os.path.join(workdir, f'{shards}.db')}",
+        database_shards=shards,
+        sqlite_synchronous=args.synchronous,
+    )
+    router = ShardRouter(settings)
+    recorder = LatencyRecorder()
+    metric = _metric(shards)
+    try:
+        await ensure_shard_schemas(router)
+        started = time.perf_counter()
+        await asyncio.gather(*(_user(router, f"user-{number}", args, recorder, metric) for number in range(args.users)))
+        duration = time.perf_counter() - started
+    finally:
+        await router.dispose()
+    return recorder.summarise(duration)
+
+
+async def run_benchmark(args: argparse.Namespace, workdir: str) -> Dict[str, Any]:
+    metrics: Dict[str, Dict[str, float]] = {}
+    started = time.perf_counter()
+    for shards in args.shards:
+        metrics.update(await _run(args, workdir, shards))
+    duration = time.perf_counter() - started
+    baseline = metrics[_metric(args.shards[0])]["throughput_per_s"]
+    return {
+        "benchmark": "sharding",
+        "config": {
+            "shards": args.shards,
+            "users": args.users,
+            "transactions": args.transactions,
+            "batch": args.batch,
+            "synchronous": args.synchronous,
+        },
+        "duration_s": duration,
+        "speedup": {
+            str(shards): metrics[_metric(shards)]["throughput_per_s"] / baseline if baseline else 0.0
+            for shards in args.shards
+        },
+        "metrics": metrics,
+    }
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4, 8], help="shard counts to compare")
+    parser.add_argument("--users", type=int, default=64, help="concurrent users writing")
+    parser.add_argument("--transactions", type=int, default=50, help="transactions per user")
+    parser.add_argument("--batch", type=int, default=8, help="messages per transaction")
+    parser.add_argument("--synchronous", default="FULL", help="PRAGMA synchronous of the write connections")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--baseline", help="compare against this JSON report")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative regression")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    with tempfile.TemporaryDirectory(prefix="mindful-bench-") as workdir:
+        report = asyncio.run(run_benchmark(args, workdir))
+
+    print(format_summary(report["metrics"]))
+    for shards, speedup in report["speedup"].items():
+        print(f"{shards} shards: {speedup:.2f}x the throughput of {args.shards[0]}")
+    if args.output:
+        write_report(report, args.output)
+    if args.baseline:
+        regressions = compare_reports(load_report(args.baseline), report, threshold=args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+    return 0
+
+
+__all__ = ["run_benchmark", "main"]
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,138 @@
+"""Worker cold-start benchmark: import time and application startup.
+
+Each run starts fresh interpreters against a new temporary database. The
+first worker creates the schema and the second finds it already stamped as
+current, as every later worker would::
+
+    python -m backend.benchmarks.startup --runs 5 --budget-ms 1500 --output run.json
+    python -m backend.benchmarks.startup --baseline run.json --threshold 0.2
+
+The exit status is 1 when the median time from process start to a ready
+application exceeds ``--budget-ms``, or, with ``--baseline``, on a
+regression beyond ``--threshold``.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+from .report import LatencyRecorder, compare_reports, format_summary, load_report, write_report
+
+IMPORT = "import backend.main"
+STARTUP_NEW = "startup (new database)"
+STARTUP_CURRENT = "startup (current schema)"
+READY = "process ready"
+
+
+def _child() -> None:
+    """Measure one worker: print import and lifespan startup times as JSON."""
+
+    started = time.perf_counter()
+    from ..main import app
+
+    imported = time.perf_counter()
+
+    async def start() -> Dict[str, float]:
+        context = app.router.lifespan_context(app)
+        began = time.perf_counter()
+        await context.__aenter__()
+        timings = {"startup_s": time.perf_counter() - began, "ready_at": time.time()}
+        await context.__aexit__(None, None, None)
+        return timings
+
+    print(json.dumps({"import_s": imported - started, **asyncio.run(start())}))
+
+
+def _worker(env: Dict[str, str]) -> Dict[str, float]:
+    spawned_at = time.time()
+    result = subprocess.run(
+        [sys.executable, "-m", "backend.benchmarks.startup", "--child"],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    timings["ready_s"] = timings.pop("ready_at") - spawned_at
+    return timings
+
+
+def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    recorder = LatencyRecorder()
+    started = time.perf_counter()
+    for _ in range(args.runs):
+        with tempfile.TemporaryDirectory(prefix="mindful-bench-") as workdir:
+            env = dict(os.environ)
+            env.update(
+                MINDFUL_DATABASE_URL=f"sqlite+aiosqlite:///{os.path.join(workdir, 'bench.db')}",
+                MINDFUL_CONVERSATION_STORE_PATH=os.path.join(workdir, "conversations.db"),
+                MINDFUL_TTS_CACHE_DIR=os.path.join(workdir, "tts_cache"),
+                MINDFUL_AUDIO_SPOOL_DIR=os.path.join(workdir, "audio_spool"),
+            )
+            for metric in (STARTUP_NEW, STARTUP_CURRENT):
+                timings = _worker(env)
+                recorder.record(IMPORT, timings["import_s"])
+                recorder.record(metric, timings["startup_s"])
+                if metric == STARTUP_CURRENT:
+                    recorder.record(READY, timings["ready_s"])
+    duration = time.perf_counter() - started
+    return {
+        "benchmark": "startup",
+        "config": {"runs": args.runs, "budget_ms": args.budget_ms},
+        "duration_s": duration,
+        "metrics": recorder.summarise(duration),
+    }
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--runs", type=int, default=5, help="fresh databases to start workers against")
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=1500.0,
+        help="median time from process start to a started application",
+    )
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--baseline", help="compare against this JSON report")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative regression")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.child:
+        _child()
+        return 0
+    report = run_benchmark(args)
+
+    print(format_summary(report["metrics"]))
+    if args.output:
+        write_report(report, args.output)
+    status = 0
+    ready_ms = report["metrics"][READY]["p50_ms"]
+    if ready_ms > args.budget_ms:
+        print(f"OVER BUDGET {READY} p50 {ready_ms:.0f} ms > {args.budget_ms:.0f} ms")
+        status = 1
+    if args.baseline:
+        regressions = compare_reports(load_report(args.baseline), report, threshold=args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            status = 1
+    return status
+
+
+__all__ = ["run_benchmark", "main"]
+
+
+if __name__ == "__main__":
+    sys.exit(main())
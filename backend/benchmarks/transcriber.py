@@ -0,0 +1,147 @@
+"""Pooled transcription benchmark and check with a deterministic stand-in model.
+
+Runs ``--sessions`` concurrent streams of ``--chunks`` audio chunks each
+through a :class:`~backend.transcriber.PooledTranscriber` backed by
+:class:`~backend.transcriber.ChecksumSpeechModel`. Every transcript is
+compared with the same model run in-process, so a chunk answered with
+another chunk's transcript, or not answered at all, fails the run. Reports
+per-chunk latency and the pool's batch-size and queue-wait statistics::
+
+    python -m backend.benchmarks.transcriber --sessions 32 --output run.json
+    python -m backend.benchmarks.transcriber --baseline run.json --threshold 0.2
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import random
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+from .report import LatencyRecorder, compare_reports, format_summary, load_report, write_report
+
+TRANSCRIBE = "transcribe chunk"
+
+
+def _session_chunks(session: int, args: argparse.Namespace) -> List[bytes]:
+    rng = random.Random(args.seed * 100003 + session)
+    return [
+        rng.randbytes(rng.randint(args.chunk_bytes // 2, args.chunk_bytes))
+        for _ in range(args.chunks)
+    ]
+
+
+async def _run_sessions(args: argparse.Namespace, recorder: LatencyRecorder) -> Dict[str, Any]:
+    from ..transcriber import ChecksumSpeechModel, PooledTranscriber
+
+    model_kwargs = {"rounds": args.rounds}
+    reference = ChecksumSpeechModel(**model_kwargs)
+    transcriber = PooledTranscriber(
+        ChecksumSpeechModel,
+        model_kwargs,
+        workers=args.workers,
+        max_batch_size=args.max_batch_size,
+        max_wait=args.max_wait_ms / 1000,
+    )
+    mismatches = 0
+
+    async def session(index: int) -> None:
+        nonlocal mismatches
+        for chunk in _session_chunks(index, args):
+            began = time.perf_counter()
+            try:
+                transcript = await transcriber.transcribe_chunk(chunk)
+            except Exception:
+                recorder.error(TRANSCRIBE)
+                continue
+            recorder.record(TRANSCRIBE, time.perf_counter() - began)
+            if transcript != reference.transcribe_batch([memoryview(chunk)])[0]:
+                mismatches += 1
+
+    try:
+        await asyncio.gather(*(session(index) for index in range(args.sessions)))
+    finally:
+        await transcriber.close()
+    stats = transcriber.stats
+    return {
+        "mismatches": mismatches,
+        "batches": stats.batches,
+        "mean_batch_size": stats.mean_batch_size,
+        "max_batch_size": stats.max_batch_size,
+        "mean_queue_wait_ms": stats.mean_queue_wait * 1000,
+        "max_queue_wait_ms": stats.max_queue_wait * 1000,
+    }
+
+
+def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    recorder = LatencyRecorder()
+    started = time.perf_counter()
+    result = asyncio.run(_run_sessions(args, recorder))
+    duration = time.perf_counter() - started
+    return {
+        "benchmark": "transcriber",
+        "config": {
+            "sessions": args.sessions,
+            "chunks": args.chunks,
+            "chunk_bytes": args.chunk_bytes,
+            "rounds": args.rounds,
+            "workers": args.workers,
+            "max_batch_size": args.max_batch_size,
+            "max_wait_ms": args.max_wait_ms,
+            "seed": args.seed,
+        },
+        "duration_s": duration,
+        **result,
+        "metrics": recorder.summarise(duration),
+    }
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=16, help="concurrent streams")
+    parser.add_argument("--chunks", type=int, default=20, help="chunks sent by each stream")
+    parser.add_argument("--chunk-bytes", type=int, default=80000, help="largest chunk size")
+    parser.add_argument("--rounds", type=int, default=4, help="checksum rounds per chunk (model cost)")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--max-batch-size", type=int, default=16)
+    parser.add_argument("--max-wait-ms", type=float, default=20.0)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--baseline", help="compare against this JSON report")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative regression")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    report = run_benchmark(args)
+
+    print(format_summary(report["metrics"]))
+    print(
+        f"{report['batches']} batches, mean size {report['mean_batch_size']:.1f} (max {report['max_batch_size']}); "
+        f"queue wait mean {report['mean_queue_wait_ms']:.2f} ms, max {report['max_queue_wait_ms']:.2f} ms"
+    )
+    if args.output:
+        write_report(report, args.output)
+    failed = report["metrics"].get(TRANSCRIBE, {}).get("errors", 0)
+    if report["mismatches"] or failed:
+        print(
+            f"MISMATCH {report['mismatches']} transcripts differ from the in-process model, "
+            f"{failed:.0f} chunks failed"
+        )
+        return 1
+    if args.baseline:
+        regressions = compare_reports(load_report(args.baseline), report, threshold=args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+    return 0
+
+
+__all__ = ["run_benchmark", "main"]
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+"""Voice-activity detection benchmark on a synthetic reflective session.
+
+Generates ``--minutes`` of 16 kHz speech-like audio broken by the long
+pauses typical of someone thinking aloud, sends it through an
+:class:`~backend.vad.UtteranceSegmenter` as 5-second WAV chunks (the
+browser's recording interval) and reports how much audio would no longer
+reach the transcriber, how many transcriptions are needed, and the time
+spent detecting speech per chunk::
+
+    python -m backend.benchmarks.vad --minutes 10 --output run.json
+    python -m backend.benchmarks.vad --baseline run.json --threshold 0.2
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+from .report import LatencyRecorder, compare_reports, format_summary, load_report, write_report
+
+SEGMENT = "segment chunk"
+
+
+def _session_audio(minutes: float, sample_rate: int, seed: int) -> Any:
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    parts = []
+    total = 0
+    while total < minutes * 60 * sample_rate:
+        # A phrase of 1-6 s, then a pause of 0.3-8 s with a quiet noise floor.
+        length = int(rng.uniform(1, 6) * sample_rate)
+        t = np.arange(length) / sample_rate
+        pitch = rng.uniform(110, 240)
+        envelope = 0.5 + 0.5 * np.sin(2 * np.pi * rng.uniform(3, 6) * t)
+        phrase = 0.3 * envelope * np.sin(2 * np.pi * pitch * t + 3 * np.sin(2 * np.pi * 5 * t))
+        pause = rng.normal(0, 0.001, int(rng.uniform(0.3, 8) * sample_rate))
+        parts.extend((phrase, pause))
+        total += length + len(pause)
+    return (np.concatenate(parts) * 32767).astype(np.int16)
+
+
+def _wav(samples: Any, sample_rate: int) -> bytes:
+    from ..vad import PCMFormat, encode_pcm
+
+    return encode_pcm(samples, PCMFormat(sample_rate, wav=True))
+
+
+def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    from ..vad import UtteranceSegmenter
+
+    audio = _session_audio(args.minutes, args.sample_rate, args.seed)
+    chunk_samples = int(args.chunk_seconds * args.sample_rate)
+    chunks = [_wav(audio[start : start + chunk_samples], args.sample_rate) for start in range(0, len(audio), chunk_samples)]
+
+    segmenter = UtteranceSegmenter(sample_rate=args.sample_rate)
+    recorder = LatencyRecorder()
+    started = time.perf_counter()
+    for chunk in chunks:
+        began = time.perf_counter()
+        segmenter.feed(chunk)
+        recorder.record(SEGMENT, time.perf_counter() - began)
+    segmenter.flush()
+    duration = time.perf_counter() - started
+
+    stats = segmenter.stats
+    return {
+        "benchmark": "vad",
+        "config": {
+            "minutes": args.minutes,
+            "chunk_seconds": args.chunk_seconds,
+            "sample_rate": args.sample_rate,
+            "seed": args.seed,
+        },
+        "duration_s": duration,
+        "chunks": stats.chunks,
+        "silent_chunks": stats.silent_chunks,
+        "segments": stats.segments,
+        "received_seconds": stats.received_seconds,
+        "transcribed_seconds": stats.transcribed_seconds,
+        "saved_fraction": stats.saved_fraction,
+        "metrics": recorder.summarise(duration),
+    }
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--minutes", type=float, default=10.0, help="length of the synthetic session")
+    parser.add_argument("--chunk-seconds", type=float, default=5.0, help="length of each received chunk")
+    parser.add_argument("--sample-rate", type=int, default=16000)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--baseline", help="compare against this JSON report")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative regression")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    report = run_benchmark(args)
+
+    print(format_summary(report["metrics"]))
+    print(
+        f"{report['chunks']} chunks ({report['silent_chunks']} silent) -> {report['segments']} utterances; "
+        f"{report['transcribed_seconds']:.0f} of {report['received_seconds']:.0f} s transcribed, "
+        f"{report['saved_fraction']:.0%} saved"
+    )
+    if args.output:
+        write_report(report, args.output)
+    if args.baseline:
+        regressions = compare_reports(load_report(args.baseline), report, threshold=args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+    return 0
+
+
+__all__ = ["run_benchmark", "main"]
+
+
+if __name__ == "__main__":
+    sys.exit(main())
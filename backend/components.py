@@ -0,0 +1,82 @@
+"""Lazily built application components."""
+from __future__ import annotations
+
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+
+class ComponentRegistry:
+    """Build named components on first use and keep them for the process.
+
+    Factories are registered at import time and cost nothing until
+    :meth:`get` asks for the component, so heavy speech models load only in
+    the workers that use them. :meth:`preload` builds selected components
+    ahead of time instead; called in a parent process before it forks
+    workers (``gunicorn --preload``), the loaded models are shared
+    copy-on-write. Components that hold connections, threads or open files
+    once built are registered with ``fork_safe=False`` and cannot be
+    preloaded.
+    """
+
+    def __init__(self) -> None:
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._fork_safe: Dict[str, bool] = {}
+        self._instances: Dict[str, Any] = {}
+        # Re-entrant: factories fetch the components they depend on.
+        self._lock = threading.RLock()
+
+    def register(self, name: str, factory: Callable[[], Any], *, fork_safe: bool = True) -> None:
+        if name in self._factories:
+            raise ValueError(f"Component {name} is already registered")
+        self._factories[name] = factory
+        self._fork_safe[name] = fork_safe
+
+    def get(self, name: str) -> Any:
+        try:
+            return self._instances[name]
+        except KeyError:
+            pass
+        with self._lock:
+            if name not in self._instances:
+                factory = self._factories.get(name)
+                if factory is None:
+                    raise KeyError(f"Unknown component {name}")
+                self._instances[name] = factory()
+            return self._instances[name]
+
+    def peek(self, name: str) -> Optional[Any]:
+        """Return the component if it has been built, without building it."""
+
+        return self._instances.get(name)
+
+    def set(self, name: str, instance: Any) -> None:
+        """Use ``instance`` instead of building the component, e.g. in benchmarks."""
+
+        if name not in self._factories:
+            raise KeyError(f"Unknown component {name}")
+        with self._lock:
+            self._instances[name] = instance
+
+    def preload(self, names: Iterable[str]) -> List[str]:
+        """Build ``names`` now; return the components that were newly built."""
+
+        built = []
+        for name in names:
+            if name not in self._factories:
+                raise KeyError(f"Unknown component {name}")
+            if not self._fork_safe[name]:
+                raise ValueError(f"Component {name} cannot be built before forking")
+            if name not in self._instances:
+                self.get(name)
+                built.append(name)
+        return built
+
+    @property
+    def loaded(self) -> List[str]:
+        return list(self._instances)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._factories
+
+
+__all__ = ["ComponentRegistry"]
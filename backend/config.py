@@ -1,7 +1,9 @@
 """Configuration settings for the backend application."""
 from __future__ import annotations
 
+import os
 from functools import lru_cache
+from typing import List, Literal
 from pydantic import BaseSettings, Field
 
 
@@ -14,18 +16,322 @@ class Settings(BaseSettings):
         Location of the SQLite database used to store session transcripts and
         generated summaries. Defaults to a local file inside the backend
         package directory.
+    sqlite_journal_mode:
+        Journal mode set on the write connection. ``WAL`` lets readers run
+        alongside the single writer.
+    sqlite_synchronous:
+        ``PRAGMA synchronous`` level of the write connection. ``NORMAL`` is
+        durable against application crashes in WAL mode.
+    sqlite_mmap_size:
+        Bytes of the database file each connection reads through ``mmap``.
+    sqlite_cache_size:
+        Page cache per connection, as ``PRAGMA cache_size`` (negative values
+        are KiB).
+    sqlite_busy_timeout_ms:
+        How long a connection waits for a database lock before failing.
+    sqlite_read_pool_size:
+        Read-only connections serving the journal endpoints and conversation
+        restores. Defaults to the number of CPU cores.
+    sqlite_write_timeout_seconds:
+        How long a write waits for the single write connection.
+    sqlite_incremental_vacuum_pages:
+        Free pages returned to the file system per retention pass. ``0``
+        disables incremental vacuum.
+    database_shards:
+        Number of SQLite files user data is spread over. Shard 0 is
+        ``database_url`` itself; shard ``k`` is the same path with a
+        ``-shardNNN`` suffix. ``1`` keeps everything in one file.
+    database_shard_virtual_nodes:
+        Points per shard on the consistent hash ring that maps users to
+        shards. More points spread users more evenly.
+    database_max_open_shards:
+        Shards whose connections are kept open; connections of the least
+        recently used shards beyond this are closed until needed again.
     session_duration_seconds:
         Number of seconds to keep a conversation session alive before it is
         automatically terminated.
     enable_text_to_speech:
         Toggle for enabling the optional text-to-speech synthesizer. When
         disabled the backend will skip generation of spoken responses.
+    tts_voice:
+        Voice identifier passed to the synthesizer and used in cache keys.
+    tts_format:
+        Audio container produced by the synthesizer, also part of cache keys.
+    tts_cache_memory_bytes:
+        Byte budget of the in-memory synthesized audio cache.
+    tts_cache_dir:
+        Directory of the on-disk synthesized audio cache. Leave empty to keep
+        the cache in memory only.
+    tts_cache_disk_bytes:
+        Byte budget of the on-disk cache; the least recently used files are
+        deleted beyond it. ``0`` lets the cache grow without bound.
+    tts_stream_frame_bytes:
+        Size of the audio frames forwarded to the client while a spoken
+        prompt is streamed.
+    tts_speculative_synthesis:
+        Render the next expected question while the user is still answering.
+        Has no effect with the chat model orchestrator, which words each
+        question only once the answer is in.
+    audio_spool_dir:
+        Directory holding the raw audio received from every session. Empty,
+        the default, discards audio after transcription; set it to keep
+        users' recordings on disk.
+    audio_spool_segment_bytes:
+        Size after which a session's spool segment file is rolled.
+    audio_spool_flush_bytes:
+        Buffered audio that triggers an immediate write to the spool.
+    audio_spool_flush_interval_ms:
+        Maximum time received audio stays buffered before it is written.
+    audio_retention_days:
+        Days the audio of an ended session is kept. ``0`` keeps it forever.
+    audio_maintenance_interval_seconds:
+        Delay between spool retention and compaction passes.
+    message_durability:
+        How conversation messages are persisted. ``"write_behind"`` buffers
+        messages and commits them in the background, ``"group_commit"`` makes
+        callers wait until the shared batch transaction has committed.
+    message_batch_size:
+        Number of buffered messages that triggers an immediate batch write.
+    message_flush_interval_ms:
+        Maximum time a buffered message waits before its batch is written.
+    summary_persist_interval_ms:
+        Minimum delay between writes of the rolling session summaries.
+    expiry_batch_size:
+        Maximum number of due sessions ended and finalised in one transaction
+        by the expiry scheduler.
+    message_archive_after_days:
+        Days after a session ends before its messages are moved into one
+        compressed archive row. Archived messages drop out of transcript
+        search, so ``0``, the default, keeps them in the messages table.
+    session_retention_days:
+        Days an ended session is kept before it is deleted with its messages,
+        journal entry and audio. ``0`` keeps sessions forever.
+    retention_batch_size:
+        Sessions archived or deleted per transaction by the retention job.
+    retention_interval_seconds:
+        Delay between retention passes.
+    stream_chunk_queue_size:
+        Audio chunks buffered between the socket reader and transcription
+        before the reader stops receiving.
+    stream_transcription_concurrency:
+        Chunks of one stream transcribed concurrently. Replies are still sent
+        in chunk order.
+    stream_synthesis_queue_size:
+        Questions waiting for speech synthesis before the responder pauses.
+    admission_max_sessions:
+        Live sessions a worker runs at once. Further sessions queue, and
+        streams of sessions started elsewhere are refused. ``0`` removes the
+        limit.
+    admission_queue_size:
+        New sessions that may wait for a slot. Beyond this they are rejected
+        at once with ``503`` and ``Retry-After``.
+    admission_max_wait_seconds:
+        How long a queued session waits for a slot before it is rejected.
+    admission_transcription_capacity:
+        Chunks transcribed at once across all sessions. New sessions are held
+        back while as many more are waiting. ``0`` is unlimited.
+    admission_synthesis_capacity:
+        Questions synthesized at once across all sessions. New sessions are
+        held back, and speculative synthesis skipped, while as many more are
+        waiting. ``0`` is unlimited.
+    admission_db_write_capacity:
+        Buffered messages at which a shard's message writer counts as
+        saturated and new sessions are held back. ``0`` ignores the writer backlog.
+    stream_max_bytes_per_second:
+        Audio accepted per stream per second. Faster clients are slowed
+        down. ``0`` removes the limit.
+    stream_burst_bytes:
+        Audio a stream may send at once above its rate. Defaults to one
+        second's worth.
+    upload_max_chunk_bytes:
+        Largest audio chunk accepted by the HTTP upload endpoint.
+    upload_reorder_window:
+        How far ahead of a missing chunk uploads may run before the missing
+        chunk is given up on.
+    upload_reorder_timeout_ms:
+        Time an out-of-order upload waits for the chunks before it.
+    upload_idle_timeout_seconds:
+        Inactivity after which an upload session's pipeline is stopped. The
+        next upload starts it again.
+    event_subscriber_queue_size:
+        Events buffered for each Server-Sent Events subscriber.
+    event_slow_consumer_policy:
+        What happens when a subscriber's buffer is full. ``"drop_oldest"``
+        discards its oldest event, ``"disconnect"`` closes the stream so the
+        client reconnects and replays from history.
+    event_history_size:
+        Recent events kept per session for clients resuming with
+        ``Last-Event-ID``.
+    sse_heartbeat_seconds:
+        Interval of keep-alive comments on idle event streams.
+    export_batch_size:
+        Rows read per query by the bulk export. Bounds the export's memory use.
+    vad_enabled:
+        Run voice-activity detection on received audio so silence is never
+        transcribed and speech is transcribed in whole utterances. Only WAV
+        (and, with ``vad_input_format="pcm16"``, raw PCM) chunks are
+        inspected; compressed audio passes through unchanged.
+    vad_input_format:
+        ``"auto"`` inspects WAV chunks only, ``"pcm16"`` also treats other
+        chunks as raw little-endian 16-bit mono at ``vad_sample_rate``.
+    vad_sample_rate:
+        Sample rate assumed for raw PCM chunks.
+    vad_frame_ms:
+        Length of the frames speech is detected in.
+    vad_energy_threshold_db:
+        Frame energy in dBFS above which a frame may be speech.
+    vad_max_zero_crossing_rate:
+        Zero-crossing rate above which a loud frame is treated as noise.
+    vad_padding_ms:
+        Audio kept before and after detected speech.
+    vad_min_silence_ms:
+        Pause that ends an utterance. Shorter pauses stay inside it.
+    vad_min_speech_ms:
+        Shortest burst of speech frames that counts as speech.
+    vad_max_segment_ms:
+        Longest utterance sent to the transcriber in one piece.
+    vad_flush_timeout_ms:
+        Time without new audio after which an unfinished utterance is
+        transcribed anyway. Keep it above the client's chunk interval.
+    preload_components:
+        Components built when the app is imported instead of on first use,
+        e.g. ``["transcriber", "synthesizer"]``. With ``gunicorn --preload``
+        the models then load once in the parent and are shared by every
+        forked worker.
+    transcriber_backend:
+        ``"mock"`` for the placeholder transcriber or ``"pooled"`` to run the
+        speech model in a process pool with micro-batching.
+    transcriber_workers:
+        Worker processes used by the pooled transcriber.
+    transcriber_max_batch_size:
+        Chunks collected into one batch before it is sent to a worker.
+    transcriber_max_wait_ms:
+        Longest a chunk waits for its batch to fill up.
+    conversation_store:
+        Where in-progress conversation state is kept. ``"memory"`` is private
+        to each worker process, ``"sqlite"`` is shared by every worker on the
+        host through ``conversation_store_path``.
+    conversation_cache_size:
+        Maximum number of conversations held by the in-memory store.
+    conversation_idle_ttl_seconds:
+        Idle time after which a conversation is evicted. Evicted
+        conversations are rebuilt from the stored transcript on demand.
+    conversation_history_limit:
+        Number of recent messages kept in memory for each conversation.
+    llm_backend:
+        ``"template"`` asks the fixed questions and writes template journal
+        entries; ``"openai"`` words them with a model behind an
+        OpenAI-compatible chat completion endpoint.
+    llm_base_url:
+        Base URL of the chat completion API, up to and including ``/v1``.
+    llm_api_key:
+        Bearer token sent to the chat completion API, if it needs one.
+    llm_model:
+        Model name sent with every completion request.
+    llm_temperature:
+        Sampling temperature of completions.
+    llm_max_tokens:
+        Longest completion requested, in tokens.
+    llm_timeout_seconds:
+        Deadline of one completion, covering hedged and retried requests.
+        The template text is used when it passes.
+    llm_connect_timeout_seconds:
+        How long opening a connection to the model server may take.
+    llm_hedge_after_ms:
+        Time without a first token after which the same request is sent
+        again and the faster answer used. ``0`` disables hedging.
+    llm_max_attempts:
+        Requests sent for one completion, hedges and retries included.
+    llm_max_connections:
+        Connections to the model server open at once per worker.
+    llm_keepalive_connections:
+        Idle connections kept open for reuse.
+    llm_keepalive_seconds:
+        How long an idle connection is kept.
+    llm_cache_size:
+        Generations remembered by conversation prefix, finished or in flight.
+    llm_prefetch:
+        Start generating the next question as soon as the user's answer is
+        transcribed.
+    insights_enabled:
+        Maintain the TF-IDF index of journal history behind
+        ``/journals/insights`` and the personalised recommendations. Needs
+        NumPy.
+    insights_path:
+        File the insight index is saved to so restarts only index new
+        journal entries. Empty keeps it in memory and rebuilds it from the
+        database on start.
+    insights_refresh_interval_ms:
+        Longest the index lags behind newly written journal entries.
+    insights_persist_interval_seconds:
+        Interval of background refreshes and saves of the index.
+    insights_batch_size:
+        Journal entries read per query while the index catches up.
+    insights_trend_window_days:
+        Recent sessions compared with the earlier ones for trend deltas.
+    stream_resume_enabled:
+        Number stream WebSocket events and keep recent ones so a client that
+        loses its connection can reconnect with ``log_id`` and ``last_seq``
+        and receive only what it missed.
+    stream_resume_history_size:
+        Recent events kept per stream session for reconnecting clients.
+        Clients further behind reload the session instead.
+    stream_resume_max_sessions:
+        Sessions whose stream events are kept; the least recently used are
+        forgotten first.
+    stream_resume_takeover_timeout_seconds:
+        Time a reconnecting client waits for its previous connection to
+        finish the replies it started before being turned away.
     """
 
     database_url: str = Field(
         default="sqlite+aiosqlite:///backend/app.db",
         description="SQLite database used by SQLAlchemy",
     )
+    sqlite_journal_mode: str = Field(
+        default="WAL",
+        description="SQLite journal mode of the write connection.",
+    )
+    sqlite_synchronous: str = Field(
+        default="NORMAL",
+        description="SQLite synchronous level of the write connection.",
+    )
+    sqlite_mmap_size: int = Field(
+        default=256 * 1024 * 1024,
+        description="Bytes of the SQLite file read through mmap.",
+    )
+    sqlite_cache_size: int = Field(
+        default=-64 * 1024,
+        description="SQLite page cache per connection (negative is KiB).",
+    )
+    sqlite_busy_timeout_ms: int = Field(
+        default=5000,
+        description="Milliseconds to wait for a SQLite lock.",
+    )
+    sqlite_read_pool_size: int = Field(
+        default_factory=lambda: os.cpu_count() or 4,
+        description="Read-only SQLite connections.",
+    )
+    sqlite_write_timeout_seconds: float = Field(
+        default=30.0,
+        description="Seconds to wait for the single SQLite write connection.",
+    )
+    sqlite_incremental_vacuum_pages: int = Field(
+        default=2000,
+        description="Free pages released per retention pass; 0 disables.",
+    )
+    database_shards: int = Field(
+        default=1,
+        description="SQLite shard files user data is spread over.",
+    )
+    database_shard_virtual_nodes: int = Field(
+        default=64,
+        description="Hash ring points per shard.",
+    )
+    database_max_open_shards: int = Field(
+        default=64,
+        description="Shards kept connected at once.",
+    )
     session_duration_seconds: int = Field(
         default=300,
         description="Maximum duration of an active coaching session in seconds.",
@@ -34,6 +340,358 @@ class Settings(BaseSettings):
         default=False,
         description="Whether to synthesize spoken responses for prompts.",
     )
+    tts_voice: str = Field(
+        default="default",
+        description="Voice used for synthesized prompts.",
+    )
+    tts_format: str = Field(
+        default="wav",
+        description="Audio format produced by the synthesizer.",
+    )
+    tts_cache_memory_bytes: int = Field(
+        default=32 * 1024 * 1024,
+        description="Memory budget in bytes for cached synthesized audio.",
+    )
+    tts_cache_dir: str = Field(
+        default="backend/tts_cache",
+        description="Directory for cached synthesized audio; empty disables the disk tier.",
+    )
+    tts_cache_disk_bytes: int = Field(
+        default=256 * 1024 * 1024,
+        description="Disk budget in bytes for cached synthesized audio; 0 is unbounded.",
+    )
+    tts_stream_frame_bytes: int = Field(
+        default=4096,
+        description="Bytes per streamed audio frame.",
+    )
+    tts_speculative_synthesis: bool = Field(
+        default=True,
+        description="Pre-render the next expected question during the user's answer.",
+    )
+    audio_spool_dir: str = Field(
+        default="",
+        description="Directory for spooled session audio; empty disables spooling.",
+    )
+    audio_spool_segment_bytes: int = Field(
+        default=64 * 1024 * 1024,
+        description="Size at which a spool segment file is rolled.",
+    )
+    audio_spool_flush_bytes: int = Field(
+        default=256 * 1024,
+        description="Buffered audio bytes that trigger a spool write.",
+    )
+    audio_spool_flush_interval_ms: int = Field(
+        default=500,
+        description="Longest time received audio stays buffered.",
+    )
+    audio_retention_days: int = Field(
+        default=30,
+        description="Days to keep audio of ended sessions; 0 keeps it forever.",
+    )
+    audio_maintenance_interval_seconds: int = Field(
+        default=300,
+        description="Seconds between spool retention and compaction passes.",
+    )
+    message_durability: Literal["write_behind", "group_commit"] = Field(
+        default="write_behind",
+        description="Persistence mode for conversation messages.",
+    )
+    message_batch_size: int = Field(
+        default=128,
+        description="Buffered messages that trigger an immediate batch write.",
+    )
+    message_flush_interval_ms: int = Field(
+        default=50,
+        description="Maximum delay in milliseconds before buffered messages are written.",
+    )
+    summary_persist_interval_ms: int = Field(
+        default=1000,
+        description="Minimum delay in milliseconds between rolling summary writes.",
+    )
+    expiry_batch_size: int = Field(
+        default=256,
+        description="Due sessions expired per database transaction.",
+    )
+    message_archive_after_days: int = Field(
+        default=0,
+        description="Days after a session ends before its messages are archived; 0 disables.",
+    )
+    session_retention_days: int = Field(
+        default=0,
+        description="Days to keep ended sessions; 0 keeps them forever.",
+    )
+    retention_batch_size: int = Field(
+        default=50,
+        description="Sessions archived or deleted per transaction.",
+    )
+    retention_interval_seconds: int = Field(
+        default=3600,
+        description="Seconds between retention passes.",
+    )
+    stream_chunk_queue_size: int = Field(
+        default=8,
+        description="Audio chunks buffered ahead of transcription per stream.",
+    )
+    stream_transcription_concurrency: int = Field(
+        default=2,
+        description="Chunks of one stream transcribed concurrently.",
+    )
+    stream_synthesis_queue_size: int = Field(
+        default=4,
+        description="Questions queued for speech synthesis per stream.",
+    )
+    admission_max_sessions: int = Field(
+        default=200,
+        description="Live sessions per worker; 0 is unlimited.",
+    )
+    admission_queue_size: int = Field(
+        default=50,
+        description="New sessions that may queue for a slot.",
+    )
+    admission_max_wait_seconds: float = Field(
+        default=10.0,
+        description="Longest wait for a session slot before rejection.",
+    )
+    admission_transcription_capacity: int = Field(
+        default=16,
+        description="Concurrent transcriptions across sessions; 0 is unlimited.",
+    )
+    admission_synthesis_capacity: int = Field(
+        default=8,
+        description="Concurrent speech syntheses across sessions; 0 is unlimited.",
+    )
+    admission_db_write_capacity: int = Field(
+        default=2048,
+        description="Writer backlog that holds back new sessions; 0 ignores it.",
+    )
+    stream_max_bytes_per_second: int = Field(
+        default=256 * 1024,
+        description="Inbound audio bytes per second per stream; 0 is unlimited.",
+    )
+    stream_burst_bytes: int = Field(
+        default=0,
+        description="Inbound burst allowance per stream; 0 means one second's worth.",
+    )
+    upload_max_chunk_bytes: int = Field(
+        default=1024 * 1024,
+        description="Largest accepted uploaded audio chunk.",
+    )
+    upload_reorder_window: int = Field(
+        default=32,
+        description="Uploads allowed ahead of a missing chunk.",
+    )
+    upload_reorder_timeout_ms: int = Field(
+        default=2000,
+        description="Time an out-of-order upload waits for missing chunks.",
+    )
+    upload_idle_timeout_seconds: int = Field(
+        default=60,
+        description="Inactivity after which an upload pipeline stops.",
+    )
+    event_subscriber_queue_size: int = Field(
+        default=64,
+        description="Events buffered per Server-Sent Events subscriber.",
+    )
+    event_slow_consumer_policy: Literal["drop_oldest", "disconnect"] = Field(
+        default="drop_oldest",
+        description="Handling of subscribers whose buffer is full.",
+    )
+    event_history_size: int = Field(
+        default=64,
+        description="Recent events kept per session for resuming clients.",
+    )
+    sse_heartbeat_seconds: float = Field(
+        default=15,
+        description="Interval of keep-alive comments on idle event streams.",
+    )
+    export_batch_size: int = Field(
+        default=1000,
+        description="Rows read per query by the bulk export.",
+    )
+    vad_enabled: bool = Field(
+        default=True,
+        description="Detect speech before transcription and skip silence.",
+    )
+    vad_input_format: Literal["auto", "pcm16"] = Field(
+        default="auto",
+        description="Audio inspected by voice-activity detection.",
+    )
+    vad_sample_rate: int = Field(
+        default=16000,
+        description="Sample rate assumed for raw PCM chunks.",
+    )
+    vad_frame_ms: int = Field(
+        default=30,
+        description="Frame length used for speech detection.",
+    )
+    vad_energy_threshold_db: float = Field(
+        default=-45.0,
+        description="Frame energy (dBFS) above which a frame may be speech.",
+    )
+    vad_max_zero_crossing_rate: float = Field(
+        default=0.5,
+        description="Zero-crossing rate above which a frame is noise.",
+    )
+    vad_padding_ms: int = Field(
+        default=200,
+        description="Audio kept around detected speech.",
+    )
+    vad_min_silence_ms: int = Field(
+        default=600,
+        description="Pause that ends an utterance.",
+    )
+    vad_min_speech_ms: int = Field(
+        default=150,
+        description="Shortest burst counted as speech.",
+    )
+    vad_max_segment_ms: int = Field(
+        default=15000,
+        description="Longest utterance transcribed in one piece.",
+    )
+    vad_flush_timeout_ms: int = Field(
+        default=8000,
+        description="Quiet time after which an unfinished utterance is transcribed.",
+    )
+    preload_components: List[str] = Field(
+        default_factory=list,
+        description="Components built at import time rather than on first use.",
+    )
+    transcriber_backend: Literal["mock", "pooled"] = Field(
+        default="mock",
+        description="Speech-to-text implementation used by the backend.",
+    )
+    transcriber_workers: int = Field(
+        default=2,
+        description="Worker processes for the pooled transcriber.",
+    )
+    transcriber_max_batch_size: int = Field(
+        default=16,
+        description="Chunks per micro-batch sent to a transcription worker.",
+    )
+    transcriber_max_wait_ms: int = Field(
+        default=20,
+        description="Maximum delay in milliseconds before a partial batch is sent.",
+    )
+    conversation_store: Literal["memory", "sqlite"] = Field(
+        default="memory",
+        description="Backend used to hold in-progress conversation state.",
+    )
+    conversation_store_path: str = Field(
+        default="backend/conversations.db",
+        description="SQLite file shared by workers when conversation_store is 'sqlite'.",
+    )
+    conversation_cache_size: int = Field(
+        default=10_000,
+        description="Maximum number of conversations kept by the in-memory store.",
+    )
+    conversation_idle_ttl_seconds: int = Field(
+        default=900,
+        description="Seconds of inactivity before a conversation is evicted.",
+    )
+    conversation_history_limit: int = Field(
+        default=20,
+        description="Recent messages kept in memory for each conversation.",
+    )
+    llm_backend: Literal["template", "openai"] = Field(
+        default="template",
+        description="How questions and journal entries are generated.",
+    )
+    llm_base_url: str = Field(
+        default="http://localhost:8080/v1",
+        description="Base URL of the OpenAI-compatible chat completion API.",
+    )
+    llm_api_key: str = Field(
+        default="",
+        description="Bearer token for the chat completion API.",
+    )
+    llm_model: str = Field(
+        default="gpt-4o-mini",
+        description="Model name sent with completion requests.",
+    )
+    llm_temperature: float = Field(
+        default=0.7,
+        description="Sampling temperature of completions.",
+    )
+    llm_max_tokens: int = Field(
+        default=256,
+        description="Longest completion requested, in tokens.",
+    )
+    llm_timeout_seconds: float = Field(
+        default=20.0,
+        description="Deadline of one completion including hedges and retries.",
+    )
+    llm_connect_timeout_seconds: float = Field(
+        default=2.0,
+        description="Seconds allowed for connecting to the model server.",
+    )
+    llm_hedge_after_ms: int = Field(
+        default=1500,
+        description="Wait for a first token before sending a hedged request; 0 disables.",
+    )
+    llm_max_attempts: int = Field(
+        default=3,
+        description="Requests per completion, hedges and retries included.",
+    )
+    llm_max_connections: int = Field(
+        default=32,
+        description="Open connections to the model server per worker.",
+    )
+    llm_keepalive_connections: int = Field(
+        default=16,
+        description="Idle connections to the model server kept for reuse.",
+    )
+    llm_keepalive_seconds: float = Field(
+        default=30.0,
+        description="Seconds an idle model server connection is kept.",
+    )
+    llm_cache_size: int = Field(
+        default=1024,
+        description="Generations remembered by conversation prefix.",
+    )
+    llm_prefetch: bool = Field(
+        default=True,
+        description="Generate the next question as soon as an answer is transcribed.",
+    )
+    insights_enabled: bool = Field(
+        default=True,
+        description="Index journal history for insights and personalised recommendations.",
+    )
+    insights_path: str = Field(
+        default="",
+        description="File the insight index is saved to; empty keeps it in memory.",
+    )
+    insights_refresh_interval_ms: int = Field(
+        default=1000,
+        description="Longest the insight index lags behind new journal entries.",
+    )
+    insights_persist_interval_seconds: float = Field(
+        default=300.0,
+        description="Interval of background refreshes and saves of the insight index.",
+    )
+    insights_batch_size: int = Field(
+        default=500,
+        description="Journal entries read per query while the insight index catches up.",
+    )
+    insights_trend_window_days: int = Field(
+        default=14,
+        description="Days of recent sessions compared with earlier ones for trends.",
+    )
+    stream_resume_enabled: bool = Field(
+        default=True,
+        description="Keep recent stream events so reconnecting clients can resume.",
+    )
+    stream_resume_history_size: int = Field(
+        default=64,
+        description="Recent events kept per stream session for reconnecting clients.",
+    )
+    stream_resume_max_sessions: int = Field(
+        default=10000,
+        description="Sessions whose recent stream events are kept.",
+    )
+    stream_resume_takeover_timeout_seconds: float = Field(
+        default=30.0,
+        description="Time a reconnecting stream waits for its previous connection to finish.",
+    )
 
     class Config:
         env_prefix = "MINDFUL_"
@@ -1,30 +1,81 @@
 """Database utilities for the mindfulness coaching backend."""
 from __future__ import annotations
 
+import threading
+import zlib
 from contextlib import asynccontextmanager
+from typing import Any, Optional
 
-from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import inspect, text
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from sqlalchemy.schema import CreateIndex, CreateTable
 
 from .config import get_settings
+from .models import PREVIEW_LENGTH, Base
+from .search import install_search_index, search_index_ddl
+from .sharding import ShardRouter
 
-_SETTINGS = get_settings()
+# Engines are created on first use rather than at import, so importing the app
+# (or forking workers from a process that imported it) opens nothing.
+_ROUTER: Optional[ShardRouter] = None
+_ROUTER_LOCK = threading.Lock()
 
 
-def _create_engine() -> AsyncEngine:
-    return create_async_engine(
-        _SETTINGS.database_url,
-        echo=False,
-        future=True,
-    )
+def get_router() -> ShardRouter:
+    """Return the shard router, creating it on first use."""
+
+    global _ROUTER
+    if _ROUTER is None:
+        with _ROUTER_LOCK:
+            if _ROUTER is None:
+                _ROUTER = ShardRouter(get_settings())
+    return _ROUTER
+
+
+def get_engine() -> AsyncEngine:
+    """Return the write engine of shard 0, the ``database_url`` file."""
+
+    return get_router().write_engine(0)
+
+
+def get_read_engine() -> AsyncEngine:
+    """Return the read-only engine of shard 0."""
+
+    return get_router().read_engine(0)
+
+
+async def dispose_engines() -> None:
+    """Close every pooled connection; the engines reconnect on next use."""
 
+    if _ROUTER is not None:
+        await _ROUTER.dispose()
 
-engine: AsyncEngine = _create_engine()
-AsyncSessionLocal = sessionmaker(
-    engine,
-    expire_on_commit=False,
-    class_=AsyncSession,
-)
+
+class _LazySessionFactory:
+    """``sessionmaker`` stand-in for shard 0 that resolves the shard on each call."""
+
+    def __init__(self, read_only: bool) -> None:
+        self._read_only = read_only
+
+    def __call__(self, **kwargs: Any) -> AsyncSession:
+        router = get_router()
+        factory = router.read_session_factory(0) if self._read_only else router.session_factory(0)
+        return factory(**kwargs)
+
+
+AsyncSessionLocal = _LazySessionFactory(read_only=False)
+ReadSessionLocal = _LazySessionFactory(read_only=True)
+
+
+def __getattr__(name: str) -> Any:
+    # ``engine`` and ``read_engine`` used to be module globals.
+    if name == "engine":
+        return get_engine()
+    if name == "read_engine":
+        return get_read_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 @asynccontextmanager
@@ -35,4 +86,127 @@ async def get_session() -> AsyncSession:
         yield session
 
 
-__all__ = ["engine", "AsyncSessionLocal", "get_session"]
+@asynccontextmanager
+async def get_read_session() -> AsyncSession:
+    """Provide a session bound to the read-only connection pool."""
+
+    async with ReadSessionLocal() as session:
+        yield session
+
+
+# Columns added after the first release, with the DDL used to add them and an
+# optional statement that backfills existing rows.
+_ADDED_COLUMNS = {
+    "session_summaries": [
+        (
+            "preview",
+            f"VARCHAR({PREVIEW_LENGTH}) NOT NULL DEFAULT ''",
+            f"UPDATE session_summaries SET preview = substr(journal_entry, 1, {PREVIEW_LENGTH})",
+        ),
+    ],
+    "sessions": [
+        ("partial_summary", "TEXT", None),
+        ("user_id", "VARCHAR(64)", None),
+        ("summary_watermark", "DATETIME", None),
+        ("summary_watermark_id", "INTEGER", None),
+        (
+            "summary_status",
+            "VARCHAR(16) NOT NULL DEFAULT 'none'",
+            "UPDATE sessions SET summary_status = 'ready'"
+            " WHERE id IN (SELECT session_id FROM session_summaries)",
+        ),
+    ],
+}
+
+# Indexes replaced by later ones.
+_DROPPED_INDEXES = ("ix_session_summaries_created_at_id",)
+
+
+def upgrade_schema(connection: Connection) -> None:
+    """Apply additive schema changes that ``create_all`` skips on existing tables."""
+
+    inspector = inspect(connection)
+    for table, additions in _ADDED_COLUMNS.items():
+        columns = {column["name"] for column in inspector.get_columns(table)}
+        for name, ddl, backfill in additions:
+            if name in columns:
+                continue
+            connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+            if backfill is not None:
+                connection.execute(text(backfill))
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+    for name in _DROPPED_INDEXES:
+        connection.execute(text(f"DROP INDEX IF EXISTS {name}"))
+    install_search_index(connection)
+
+
+def schema_version() -> int:
+    """Fingerprint of the schema this code expects, as a positive 31-bit integer.
+
+    Any change to the models, the additive upgrades or the search index DDL
+    changes the value.
+    """
+
+    dialect = sqlite.dialect()
+    parts = [str(CreateTable(table).compile(dialect=dialect)) for table in Base.metadata.sorted_tables]
+    parts.extend(
+        str(CreateIndex(index).compile(dialect=dialect))
+        for table in Base.metadata.sorted_tables
+        for index in sorted(table.indexes, key=lambda index: index.name or "")
+    )
+    parts.append(repr(sorted(_ADDED_COLUMNS.items())))
+    parts.append(repr(_DROPPED_INDEXES))
+    parts.extend(search_index_ddl())
+    return zlib.crc32("\n".join(parts).encode("utf-8")) & 0x7FFFFFFF or 1
+
+
+def ensure_schema(connection: Connection) -> bool:
+    """Create and upgrade the schema unless the database is stamped as current.
+
+    SQLite databases record :func:`schema_version` in ``PRAGMA user_version``,
+    so a worker starting against an up-to-date file runs one pragma instead of
+    reflecting every table. Other backends always take the full path. Returns
+    ``True`` when the schema was (re)applied.
+    """
+
+    is_sqlite = connection.dialect.name == "sqlite"
+    version = schema_version()
+    if is_sqlite and connection.exec_driver_sql("PRAGMA user_version").scalar() == version:
+        return False
+    Base.metadata.create_all(connection)
+    upgrade_schema(connection)
+    if is_sqlite:
+        connection.exec_driver_sql(f"PRAGMA user_version = {version}")
+    return True
+
+
+async def ensure_shard_schemas(router: Optional[ShardRouter] = None) -> int:
+    """Run :func:`ensure_schema` on every shard; returns how many were (re)applied."""
+
+    router = router or get_router()
+    applied = 0
+    for shard in router.shards:
+        # Through a session, so the shard counts towards the open shard limit.
+        async with router.session_factory(shard)() as session:
+            connection = await session.connection()
+            applied += await connection.run_sync(ensure_schema)
+            await session.commit()
+    return applied
+
+
+__all__ = [
+    "get_router",
+    "get_engine",
+    "get_read_engine",
+    "dispose_engines",
+    "AsyncSessionLocal",
+    "ReadSessionLocal",
+    "get_session",
+    "get_read_session",
+    "upgrade_schema",
+    "schema_version",
+    "ensure_schema",
+    "ensure_shard_schemas",
+]
@@ -0,0 +1,204 @@
+"""In-process per-session event bus with bounded subscriber queues."""
+from __future__ import annotations
+
+import asyncio
+import json
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Deque, Dict, Literal, Optional, Set
+
+from .metrics import REGISTRY
+
+DROP_OLDEST = "drop_oldest"
+DISCONNECT = "disconnect"
+SlowConsumerPolicy = Literal["drop_oldest", "disconnect"]
+
+_DROPPED_EVENTS = REGISTRY.counter(
+    "mindful_events_dropped_total",
+    "Session events discarded because a subscriber fell behind.",
+).labels()
+_SLOW_DISCONNECTS = REGISTRY.counter(
+    "mindful_event_subscribers_disconnected_total",
+    "Subscribers closed because they fell behind.",
+).labels()
+
+
+@dataclass(frozen=True)
+class SessionEvent:
+    session_id: int
+    event_id: int
+    payload: Dict[str, Any]
+    created_at: datetime
+
+
+class Subscription:
+    """One consumer's view of a session's events.
+
+    Events are kept in a bounded deque. When it is full, ``drop_oldest``
+    discards the oldest undelivered event and ``disconnect`` closes the
+    subscription, so a slow consumer never holds back the publisher or the
+    other subscribers.
+    """
+
+    def __init__(self, bus: "EventBus", session_id: int, max_queue: int, policy: SlowConsumerPolicy) -> None:
+        self._bus = bus
+        self.session_id = session_id
+        self._events: Deque[SessionEvent] = deque()
+        self._max_queue = max(1, max_queue)
+        self._policy = policy
+        self._ready = asyncio.Event()
+        self.closed = False
+        self.dropped = 0
+
+    def push(self, event: SessionEvent) -> None:
+        if self.closed:
+            return
+        if len(self._events) >= self._max_queue:
+            if self._policy == DISCONNECT:
+                _SLOW_DISCONNECTS.inc()
+                self.close()
+                return
+            self._events.popleft()
+            self.dropped += 1
+            _DROPPED_EVENTS.inc()
+        self._events.append(event)
+        self._ready.set()
+
+    async def next(self, timeout: Optional[float] = None) -> Optional[SessionEvent]:
+        """Return the next event, or ``None`` after ``timeout`` seconds or once closed."""
+
+        if not self._events and not self.closed:
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                return None
+        if self._events:
+            return self._events.popleft()
+        return None
+
+    def close(self) -> None:
+        if not self.closed:
+            self.closed = True
+            self._ready.set()
+            self._bus._unsubscribe(self)
+
+
+class EventBus:
+    """Fan out events published for a session to every current subscriber.
+
+    The last ``history_size`` events of up to ``max_sessions`` sessions are
+    kept so a reconnecting subscriber can resume after the last event it saw.
+    """
+
+    def __init__(
+        self,
+        *,
+        queue_size: int = 64,
+        policy: SlowConsumerPolicy = DROP_OLDEST,
+        history_size: int = 64,
+        max_sessions: int = 10000,
+    ) -> None:
+        self._queue_size = queue_size
+        self._policy = policy
+        self._history_size = history_size
+        self._max_sessions = max_sessions
+        self._subscribers: Dict[int, Set[Subscription]] = {}
+        self._history: "OrderedDict[int, Deque[SessionEvent]]" = OrderedDict()
+        self._next_id: Dict[int, int] = {}
+
+    @property
+    def subscriber_count(self) -> int:
+        return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def publish(self, session_id: int, payload: Dict[str, Any]) -> SessionEvent:
+        event_id = self._next_id.get(session_id, 0) + 1
+        self._next_id[session_id] = event_id
+        event = SessionEvent(session_id, event_id, payload, datetime.utcnow())
+        history = self._history.get(session_id)
+        if history is None:
+            history = self._history[session_id] = deque(maxlen=self._history_size)
+            while len(self._history) > self._max_sessions:
+                evicted, _ = self._history.popitem(last=False)
+                self._next_id.pop(evicted, None)
+        else:
+            self._history.move_to_end(session_id)
+        history.append(event)
+        for subscriber in list(self._subscribers.get(session_id, ())):
+            subscriber.push(event)
+        return event
+
+    def subscribe(self, session_id: int, last_event_id: Optional[int] = None) -> Subscription:
+        """Subscribe to ``session_id``, first replaying retained events after ``last_event_id``."""
+
+        subscription = Subscription(self, session_id, self._queue_size, self._policy)
+        if last_event_id is not None:
+            for event in self._history.get(session_id, ()):
+                if event.event_id > last_event_id:
+                    subscription.push(event)
+        self._subscribers.setdefault(session_id, set()).add(subscription)
+        return subscription
+
+    def discard(self, session_id: int) -> None:
+        """Close every subscriber of ``session_id`` and forget its history."""
+
+        for subscriber in list(self._subscribers.get(session_id, ())):
+            subscriber.close()
+        self._history.pop(session_id, None)
+        self._next_id.pop(session_id, None)
+
+    def _unsubscribe(self, subscription: Subscription) -> None:
+        subscribers = self._subscribers.get(subscription.session_id)
+        if subscribers is None:
+            return
+        subscribers.discard(subscription)
+        if not subscribers:
+            del self._subscribers[subscription.session_id]
+
+
+_PROMPT_TYPES = {"question": "prompt", "transcript": "response"}
+
+
+def format_sse(event: SessionEvent) -> str:
+    """Render an event as a Server-Sent Events message.
+
+    Questions and transcripts become unnamed ``message`` events shaped like
+    the frontend's ``PromptEvent``; anything else is sent as a named event
+    carrying its payload.
+    """
+
+    payload = event.payload
+    kind = payload.get("type", "message")
+    if kind in _PROMPT_TYPES:
+        name = None
+        data: Dict[str, Any] = {
+            "id": f"{event.session_id}-{event.event_id}",
+            "type": _PROMPT_TYPES[kind],
+            "content": payload.get("text", ""),
+            "createdAt": event.created_at.isoformat() + "Z",
+        }
+    else:
+        name = kind
+        data = payload
+    lines = [f"id: {event.event_id}"]
+    if name is not None:
+        lines.append(f"event: {name}")
+    lines.extend(f"data: {line}" for line in json.dumps(data).splitlines() or [""])
+    return "\n".join(lines) + "\n\n"
+
+
+def format_sse_comment(text: str) -> str:
+    return "".join(f": {line}\n" for line in text.splitlines() or [""]) + "\n"
+
+
+__all__ = [
+    "EventBus",
+    "Subscription",
+    "SessionEvent",
+    "SlowConsumerPolicy",
+    "DROP_OLDEST",
+    "DISCONNECT",
+    "format_sse",
+    "format_sse_comment",
+]
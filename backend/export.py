@@ -0,0 +1,376 @@
+"""Streaming bulk export of finished sessions, their journals and messages.
+
+Exports walk one ordered sequence of records keyed by
+``(session_id, message_id)``: each session record (key ``message_id = 0``)
+carries the session and its journal entry and is followed by the session's
+messages. The sequence is read in keyset batches of fixed size, each in a
+short read transaction, so memory stays bounded by one batch and a long
+export never pins an old WAL snapshot. After every batch a ``checkpoint``
+record holds an opaque cursor that resumes the export right after it.
+
+Only ended sessions are exported and ``since``/``until`` select them by end
+time, so consecutive windows export every finished session exactly once.
+Sessions whose messages have been compacted into an archive are exported
+the same way, their messages following the session record::
+
+    python -m backend.export --since 2024-01-01 --until 2024-02-01 --output january.ndjson
+    python -m backend.export --format csv --gzip --cursor <cursor> --output rest.csv.gz
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import csv
+import io
+import sys
+import zlib
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, Dict, List, Literal, Optional, Tuple
+
+from sqlalchemy import DateTime, Integer, LargeBinary, String, Text, literal, null, select, tuple_, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import CompoundSelect
+
+from .models import Message, MessageArchive, Session, SessionSummary
+from .pagination import decode_export_cursor, encode_export_cursor
+from .responses import dumps
+from .retention import unpack_messages
+from .sharding import ShardRouter
+
+ExportFormat = Literal["ndjson", "csv"]
+
+CSV_COLUMNS = (
+    "type",
+    "session_id",
+    "message_id",
+    "started_at",
+    "ended_at",
+    "status",
+    "summary_status",
+    "journal_entry",
+    "recommendations",
+    "summary_created_at",
+    "role",
+    "content",
+    "created_at",
+    "cursor",
+)
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def _in_window(since: datetime | None, until: datetime | None) -> List[Any]:
+    clauses = [Session.ended_at.is_not(None)]
+    if since is not None:
+        clauses.append(Session.ended_at >= since)
+    if until is not None:
+        clauses.append(Session.ended_at < until)
+    return clauses
+
+
+def export_statement(
+    since: datetime | None = None,
+    until: datetime | None = None,
+    after: Tuple[int, int] | None = None,
+    limit: int = 1000,
+) -> CompoundSelect:
+    """Select the next ``limit`` export rows after the ``(session_id, message_id)`` key ``after``.
+
+    Both halves of the union come out of an index in key order (the sessions
+    primary key and ``messages(session_id, id)``), so SQLite merges them
+    without sorting and stops after ``limit`` rows.
+    """
+
+    sessions = (
+        select(
+            Session.id.label("session_id"),
+            literal(0, Integer).label("message_id"),
+            Session.started_at,
+            Session.ended_at,
+            Session.status,
+            Session.summary_status,
+            SessionSummary.journal_entry,
+            SessionSummary.recommendations,
+            SessionSummary.created_at.label("summary_created_at"),
+            null().cast(String).label("role"),
+            null().cast(Text).label("content"),
+            null().cast(DateTime).label("created_at"),
+            MessageArchive.payload.label("archive"),
+        )
+        .outerjoin(SessionSummary, SessionSummary.session_id == Session.id)
+        .outerjoin(MessageArchive, MessageArchive.session_id == Session.id)
+        .where(*_in_window(since, until))
+    )
+    messages = (
+        select(
+            Message.session_id,
+            Message.id,
+            null().cast(DateTime),
+            null().cast(DateTime),
+            null().cast(String),
+            null().cast(String),
+            null().cast(Text),
+            null().cast(Text),
+            null().cast(DateTime),
+            Message.role,
+            Message.content,
+            Message.created_at,
+            null().cast(LargeBinary),
+        )
+        .join(Session, Session.id == Message.session_id)
+        .where(*_in_window(since, until))
+    )
+    if after is not None:
+        session_id, message_id = after
+        # A session's own record has key (session_id, 0), so it is past the
+        # cursor only when the cursor is in an earlier session.
+        sessions = sessions.where(Session.id > session_id)
+        messages = messages.where(tuple_(Message.session_id, Message.id) > tuple_(session_id, message_id))
+    # Ordering the compound itself, not a subquery over it, lets SQLite merge
+    # the two ordered halves instead of sorting everything past the cursor.
+    return union_all(sessions, messages).order_by("session_id", "message_id").limit(limit)
+
+
+def _archived(session_id: int, payload: bytes, after: int = 0) -> List[Dict[str, Any]]:
+    return [
+        {
+            "type": "message",
+            "session_id": session_id,
+            "message_id": message_id,
+            "role": role,
+            "content": content,
+            "created_at": created_at,
+        }
+        for message_id, role, content, created_at in unpack_messages(payload)
+        if message_id > after
+    ]
+
+
+async def _resume_archive(
+    session_factory: Callable[[], AsyncSession], after: Tuple[int, int]
+) -> List[Dict[str, Any]]:
+    """Return the rest of a session whose messages were archived after ``after`` was issued."""
+
+    session_id, message_id = after
+    async with session_factory() as db_session:
+        payload = (
+            await db_session.execute(select(MessageArchive.payload).where(MessageArchive.session_id == session_id))
+        ).scalar_one_or_none()
+    return _archived(session_id, payload, message_id) if payload is not None else []
+
+
+def _record(row: Any) -> Dict[str, Any]:
+    if row.message_id == 0:
+        return {
+            "type": "session",
+            "session_id": row.session_id,
+            "started_at": row.started_at,
+            "ended_at": row.ended_at,
+            "status": row.status,
+            "summary_status": row.summary_status,
+            "journal_entry": row.journal_entry,
+            "recommendations": row.recommendations,
+            "summary_created_at": row.summary_created_at,
+        }
+    return {
+        "type": "message",
+        "session_id": row.session_id,
+        "message_id": row.message_id,
+        "role": row.role,
+        "content": row.content,
+        "created_at": row.created_at,
+    }
+
+
+async def iter_export_batches(
+    session_factory: Callable[[], AsyncSession],
+    *,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    after: Tuple[int, int] | None = None,
+    batch_size: int = 1000,
+    limit: int | None = None,
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """Yield export records one batch at a time, each ending with a checkpoint.
+
+    Stops once ``limit`` session and message records have been produced; a
+    compacted session's archived messages always come out together, so the
+    last batch can run past ``limit``. Resume from the last checkpoint's
+    cursor to continue.
+    """
+
+    remaining = limit
+    if after is not None and after[1]:
+        # The cursor points into a session; it may have been compacted since.
+        records = await _resume_archive(session_factory, after)
+        if records:
+            after = (after[0], records[-1]["message_id"])
+            if remaining is not None:
+                remaining -= len(records)
+            records.append({"type": "checkpoint", "cursor": encode_export_cursor(*after)})
+            yield records
+    while remaining is None or remaining > 0:
+        size = batch_size if remaining is None else min(batch_size, remaining)
+        async with session_factory() as db_session:
+            rows = (await db_session.execute(export_statement(since, until, after, size))).all()
+        if not rows:
+            return
+        records = []
+        for row in rows:
+            records.append(_record(row))
+            if row.archive is not None:
+                records.extend(_archived(row.session_id, row.archive))
+        after = (records[-1]["session_id"], records[-1].get("message_id", 0))
+        records.append({"type": "checkpoint", "cursor": encode_export_cursor(*after)})
+        yield records
+        if len(rows) < size:
+            return
+        if remaining is not None:
+            remaining -= len(records) - 1
+
+
+async def iter_sharded_export_batches(
+    router: ShardRouter,
+    *,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    after: Tuple[int, int] | None = None,
+    batch_size: int = 1000,
+    limit: int | None = None,
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """Export every shard in turn with :func:`iter_export_batches`.
+
+    Shards allocate ascending ranges of session ids, so one cursor orders
+    the records of all of them. Raises ``LookupError`` for a cursor no shard
+    could have issued.
+    """
+
+    first = router.shard_for_session(after[0]) if after is not None else 0
+    remaining = limit
+    for shard in router.shards[first:]:
+        batches = iter_export_batches(
+            router.read_session_factory(shard),
+            since=since,
+            until=until,
+            after=after if shard == first else None,
+            batch_size=batch_size,
+            limit=remaining,
+        )
+        async for records in batches:
+            if remaining is not None:
+                remaining -= len(records) - 1
+            yield records
+        if remaining is not None and remaining <= 0:
+            return
+
+
+async def _ndjson(batches: AsyncIterator[List[Dict[str, Any]]]) -> AsyncIterator[bytes]:
+    async for records in batches:
+        yield b"".join(dumps(record) + b"\n" for record in records)
+
+
+def _csv_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+async def _csv(batches: AsyncIterator[List[Dict[str, Any]]]) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    async for records in batches:
+        writer.writerows([_csv_value(record.get(column)) for column in CSV_COLUMNS] for record in records)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+
+
+async def _gzip(chunks: AsyncIterator[bytes], level: int = 6) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def encode_export(
+    batches: AsyncIterator[List[Dict[str, Any]]], export_format: ExportFormat = "ndjson", compress: bool = False
+) -> AsyncIterator[bytes]:
+    """Serialise export batches as NDJSON or CSV, optionally gzip-compressed."""
+
+    chunks = _csv(batches) if export_format == "csv" else _ndjson(batches)
+    return _gzip(chunks) if compress else chunks
+
+
+def export_filename(export_format: ExportFormat, compress: bool) -> str:
+    return f"export.{export_format}" + (".gz" if compress else "")
+
+
+async def _export(args: argparse.Namespace) -> Optional[str]:
+    from .config import get_settings
+    from .database import dispose_engines, get_router
+
+    last_cursor: Optional[str] = None
+
+    async def tracked() -> AsyncIterator[List[Dict[str, Any]]]:
+        nonlocal last_cursor
+        async for records in iter_sharded_export_batches(
+            get_router(),
+            since=args.since,
+            until=args.until,
+            after=decode_export_cursor(args.cursor) if args.cursor else None,
+            batch_size=args.batch_size or get_settings().export_batch_size,
+            limit=args.limit,
+        ):
+            last_cursor = records[-1]["cursor"]
+            yield records
+
+    output = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        async for chunk in encode_export(tracked(), args.format, args.gzip):
+            output.write(chunk)
+    finally:
+        if args.output:
+            output.close()
+        await dispose_engines()
+    return last_cursor or args.cursor
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Export finished sessions, journals and messages.")
+    parser.add_argument("--format", choices=sorted(MEDIA_TYPES), default="ndjson")
+    parser.add_argument("--gzip", action="store_true", help="gzip-compress the output")
+    parser.add_argument("--since", type=datetime.fromisoformat, help="only sessions ended at or after this time")
+    parser.add_argument("--until", type=datetime.fromisoformat, help="only sessions ended before this time")
+    parser.add_argument("--cursor", help="resume after the checkpoint with this cursor")
+    parser.add_argument("--limit", type=int, help="stop after this many session and message records")
+    parser.add_argument("--batch-size", type=int, help="rows read per query")
+    parser.add_argument("--output", help="write to this file instead of standard output")
+    args = parser.parse_args(argv)
+    if args.cursor:
+        try:
+            decode_export_cursor(args.cursor)
+        except ValueError as exc:
+            parser.error(str(exc))
+    cursor = asyncio.run(_export(args))
+    if cursor:
+        print(f"resume with --cursor {cursor}", file=sys.stderr)
+
+
+__all__ = [
+    "CSV_COLUMNS",
+    "MEDIA_TYPES",
+    "ExportFormat",
+    "export_statement",
+    "iter_export_batches",
+    "iter_sharded_export_batches",
+    "encode_export",
+    "export_filename",
+    "main",
+]
+
+
+if __name__ == "__main__":
+    main()
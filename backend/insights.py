@@ -0,0 +1,727 @@
+"""Cross-session insights from the TF-IDF weights of journal history.
+
+Every session with a journal entry is one document: the entry and the
+user's own messages. Documents are kept as a compressed sparse row matrix
+of term counts in NumPy arrays that only grow by appending, so indexing a
+session costs its own terms and nothing is recomputed for the others.
+Ended documents are tombstoned and the matrix is compacted once most of it
+is dead. TF-IDF weights are derived from the counts and the current
+document frequencies at query time, with vectorised operations over the
+rows of one user:
+
+* recurring themes, the terms with the highest summed weight among those
+  used in at least two sessions;
+* the past sessions nearest to a session, by cosine similarity;
+* trend deltas, how much each term's mean weight per session in the recent
+  window differs from the sessions before it.
+
+:class:`InsightEngine` keeps the index in step with the database by reading
+the journal entries written since its watermark on each shard, and saves it
+to ``path`` so a restart only reads what is new. Every worker process keeps
+its own index; they read the same rows, so whichever saves last leaves a
+consistent file.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import os
+import re
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta
+from functools import partial
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .metrics import REGISTRY
+from .models import Message, MessageArchive, Session, SessionSummary
+from .retention import archived_records
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .sharding import ShardRouter
+
+try:  # pragma: no cover - optional dependency
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None  # type: ignore[assignment]
+
+logger = logging.getLogger(__name__)
+
+# Bumped whenever the saved arrays change meaning; older files are rebuilt.
+FORMAT_VERSION = 1
+
+_EPOCH = datetime(1970, 1, 1)
+_WORD = re.compile(r"[a-z][a-z']+")
+# Function words and the transcript's own labels carry no theme.
+STOP_WORDS = frozenset(
+    """
+    about above after again against all also and any are aren't because been before being below between
+    both but can can't cannot could couldn't did didn't does doesn't doing don't down during each even
+    ever every few for from further get got had hadn't has hasn't have haven't having her here hers
+    herself him himself his how i'm i've into isn't it's its itself just let's like made make many may
+    might more most much must my myself not now off once one only other our ours ourselves out over own
+    really same she should shouldn't some still such than that that's the their theirs them themselves
+    then there there's these they they're this those through too under until very was wasn't were
+    weren't what what's when where which while who whom why will with won't would wouldn't yet you
+    you're your yours yourself yourselves today day assistant user
+    """.split()
+)
+
+_INDEXED = REGISTRY.counter(
+    "mindful_insight_documents_indexed_total", "Sessions added to the insight index."
+).labels()
+
+
+def insights_available() -> bool:
+    return np is not None
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-case words of at least three letters that are not stop words."""
+
+    words = (word.strip("'") for word in _WORD.findall(text.lower()))
+    return [word for word in words if len(word) >= 3 and word not in STOP_WORDS]
+
+
+def _micros(moment: datetime) -> int:
+    return (moment - _EPOCH) // timedelta(microseconds=1)
+
+
+def _from_micros(value: int) -> datetime:
+    return _EPOCH + timedelta(microseconds=int(value))
+
+
+@dataclass(frozen=True)
+class Theme:
+    term: str
+    sessions: int
+    score: float
+
+
+@dataclass(frozen=True)
+class SimilarSession:
+    session_id: int
+    score: float
+    created_at: datetime
+
+
+@dataclass(frozen=True)
+class TermTrend:
+    term: str
+    delta: float
+
+
+@dataclass
+class Insights:
+    """What a user's journal history says, as computed by :meth:`InsightIndex.insights`."""
+
+    sessions: int = 0
+    themes: List[Theme] = field(default_factory=list)
+    similar: List[SimilarSession] = field(default_factory=list)
+    rising: List[TermTrend] = field(default_factory=list)
+    falling: List[TermTrend] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(self.themes or self.similar or self.rising or self.falling)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "sessions": self.sessions,
+            "themes": [asdict(theme) for theme in self.themes],
+            "similar_sessions": [asdict(session) for session in self.similar],
+            "trends": {
+                "rising": [asdict(trend) for trend in self.rising],
+                "falling": [asdict(trend) for trend in self.falling],
+            },
+        }
+
+
+@dataclass(frozen=True)
+class InsightDocument:
+    session_id: int
+    user_id: Optional[str]
+    created_at: datetime
+    text: str
+
+
+def _grow(array: "np.ndarray", needed: int) -> "np.ndarray":
+    if needed <= len(array):
+        return array
+    grown = np.zeros(max(needed, 2 * len(array)), dtype=array.dtype)
+    grown[: len(array)] = array
+    return grown
+
+
+class InsightIndex:
+    """Append-only sparse term counts of sessions and the queries over them.
+
+    Not safe for concurrent use; :class:`InsightEngine` serialises access.
+    """
+
+    def __init__(self) -> None:
+        self._terms: List[str] = []
+        self._vocabulary: Dict[str, int] = {}
+        self._users: List[str] = []
+        self._user_codes: Dict[str, int] = {}
+        # session id -> row of its live document
+        self._rows: Dict[int, int] = {}
+        self._size = 0
+        self._nnz = 0
+        self._indptr = np.zeros(1025, dtype=np.int64)
+        # Per stored entry: term, 1 + log(count) and row, so queries over
+        # every row need no index arithmetic.
+        self._indices = np.zeros(16384, dtype=np.int32)
+        self._tf = np.zeros(16384, dtype=np.float32)
+        self._entry_rows = np.zeros(16384, dtype=np.int32)
+        self._session_ids = np.zeros(1024, dtype=np.int64)
+        # User code of each row, -1 for anonymous sessions.
+        self._owners = np.zeros(1024, dtype=np.int32)
+        self._times = np.zeros(1024, dtype=np.int64)
+        self._alive = np.zeros(1024, dtype=bool)
+        self._doc_freq = np.zeros(1024, dtype=np.int32)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    @property
+    def terms(self) -> int:
+        return len(self._terms)
+
+    def add(self, document: InsightDocument) -> None:
+        """Index ``document``, replacing an earlier version of the same session."""
+
+        previous = self._rows.get(document.session_id)
+        if previous is not None:
+            self._drop(np.array([previous]))
+        vocabulary = self._vocabulary
+        ids = []
+        for word in tokenize(document.text):
+            term = vocabulary.get(word)
+            if term is None:
+                term = vocabulary[word] = len(self._terms)
+                self._terms.append(word)
+            ids.append(term)
+        terms, counts = np.unique(np.array(ids, dtype=np.int32), return_counts=True)
+
+        row, start, end = self._size, self._nnz, self._nnz + len(terms)
+        self._indptr = _grow(self._indptr, row + 2)
+        self._indices = _grow(self._indices, end)
+        self._tf = _grow(self._tf, end)
+        self._entry_rows = _grow(self._entry_rows, end)
+        self._session_ids = _grow(self._session_ids, row + 1)
+        self._owners = _grow(self._owners, row + 1)
+        self._times = _grow(self._times, row + 1)
+        self._alive = _grow(self._alive, row + 1)
+        self._doc_freq = _grow(self._doc_freq, len(self._terms))
+
+        self._indices[start:end] = terms
+        self._tf[start:end] = 1.0 + np.log(counts)
+        self._entry_rows[start:end] = row
+        self._indptr[row + 1] = end
+        self._session_ids[row] = document.session_id
+        self._owners[row] = self._user_code(document.user_id)
+        self._times[row] = _micros(document.created_at)
+        self._alive[row] = True
+        self._doc_freq[terms] += 1
+        self._rows[document.session_id] = row
+        self._size, self._nnz = row + 1, end
+
+    def add_many(self, documents: Iterable[InsightDocument]) -> int:
+        added = 0
+        for document in documents:
+            self.add(document)
+            added += 1
+        _INDEXED.inc(added)
+        return added
+
+    def remove_before(self, cutoff: datetime) -> int:
+        """Drop the sessions indexed with a time before ``cutoff``."""
+
+        size = self._size
+        rows = np.flatnonzero(self._alive[:size] & (self._times[:size] < _micros(cutoff)))
+        self._drop(rows)
+        return len(rows)
+
+    def insights(
+        self,
+        user_id: Optional[str] = None,
+        *,
+        session_id: Optional[int] = None,
+        text: Optional[str] = None,
+        now: Optional[datetime] = None,
+        window: timedelta = timedelta(days=14),
+        limit: int = 10,
+    ) -> Insights:
+        """Themes, nearest sessions and trends of ``user_id``'s sessions.
+
+        Anonymous sessions (``user_id=None``) belong to no one history: they
+        are never selected, so a user without an id gets empty insights.
+
+        Nearest sessions are those most like ``text`` when given, else like
+        ``session_id``, else like the latest session. Raises ``LookupError``
+        when ``session_id`` is not one of the selected sessions.
+        """
+
+        rows = self._select(user_id)
+        exclude = -1
+        if session_id is not None:
+            row = self._rows.get(session_id, -1)
+            exclude = int(np.searchsorted(rows, row))
+            if exclude == len(rows) or rows[exclude] != row:
+                raise LookupError("Journal entry not found")
+        result = Insights(sessions=len(rows))
+        if not len(rows):
+            return result
+        indices, weights, owner, starts = self._weights(rows)
+        vocabulary_size = len(self._terms)
+
+        score = np.bincount(indices, weights, minlength=vocabulary_size)
+        if len(rows) == self._size:
+            sessions = self._doc_freq[:vocabulary_size]
+        else:
+            sessions = np.bincount(indices, minlength=vocabulary_size)
+        result.themes = [
+            Theme(self._terms[term], int(sessions[term]), round(float(score[term]), 4))
+            for term in _top(score, sessions >= 2, limit)
+        ]
+
+        query = np.zeros(vocabulary_size, dtype=np.float32)
+        if text is not None:
+            terms, values = self._vector(text)
+            query[terms] = values
+        else:
+            if exclude < 0:
+                exclude = int(np.argmax(self._times[rows]))
+            own = slice(starts[exclude], starts[exclude + 1] if exclude + 1 < len(rows) else len(indices))
+            query[indices[own]] = weights[own]
+        similarity = _row_sums(weights * query[indices], starts)
+        candidates = np.ones(len(rows), dtype=bool)
+        if exclude >= 0:
+            candidates[exclude] = False
+        result.similar = [
+            SimilarSession(
+                int(self._session_ids[rows[position]]),
+                round(float(similarity[position]), 4),
+                _from_micros(self._times[rows[position]]),
+            )
+            for position in _top(similarity, candidates, limit)
+        ]
+
+        recent_rows = self._times[rows] >= _micros((now or datetime.utcnow()) - window)
+        recent_count = int(recent_rows.sum())
+        if 0 < recent_count < len(rows):
+            recent = recent_rows[owner]
+            recent_score = np.bincount(indices[recent], weights[recent], minlength=vocabulary_size)
+            delta = recent_score / recent_count - (score - recent_score) / (len(rows) - recent_count)
+            everything = np.ones(vocabulary_size, dtype=bool)
+            result.rising = [
+                TermTrend(self._terms[term], round(float(delta[term]), 4)) for term in _top(delta, everything, limit)
+            ]
+            result.falling = [
+                TermTrend(self._terms[term], round(float(delta[term]), 4)) for term in _top(-delta, everything, limit)
+            ]
+        return result
+
+    def snapshot(self) -> Dict[str, "np.ndarray"]:
+        """Arrays describing the index, safe to save while it keeps growing.
+
+        Appends only write past the current size or into new arrays, so the
+        append-only parts are views; the parts updated in place are copied.
+        """
+
+        size, nnz = self._size, self._nnz
+        return {
+            "version": np.array(FORMAT_VERSION),
+            "terms": np.array(self._terms, dtype=np.str_),
+            "users": np.array(self._users, dtype=np.str_),
+            "indptr": self._indptr[: size + 1],
+            "indices": self._indices[:nnz],
+            "tf": self._tf[:nnz],
+            "entry_rows": self._entry_rows[:nnz],
+            "session_ids": self._session_ids[:size],
+            "owners": self._owners[:size],
+            "times": self._times[:size],
+            "alive": self._alive[:size].copy(),
+            "doc_freq": self._doc_freq[: len(self._terms)].copy(),
+        }
+
+    @classmethod
+    def restore(cls, arrays: Dict[str, "np.ndarray"]) -> "InsightIndex":
+        """Rebuild an index from :meth:`snapshot`; raises ``ValueError`` for another format."""
+
+        if int(arrays["version"]) != FORMAT_VERSION:
+            raise ValueError("Insight index was saved in another format")
+        index = cls()
+        index._terms = [str(term) for term in arrays["terms"]]
+        index._vocabulary = {term: position for position, term in enumerate(index._terms)}
+        index._users = [str(user) for user in arrays["users"]]
+        index._user_codes = {user: code for code, user in enumerate(index._users)}
+        index._indptr = np.array(arrays["indptr"], dtype=np.int64)
+        index._indices = np.array(arrays["indices"], dtype=np.int32)
+        index._tf = np.array(arrays["tf"], dtype=np.float32)
+        index._entry_rows = np.array(arrays["entry_rows"], dtype=np.int32)
+        index._session_ids = np.array(arrays["session_ids"], dtype=np.int64)
+        index._owners = np.array(arrays["owners"], dtype=np.int32)
+        index._times = np.array(arrays["times"], dtype=np.int64)
+        index._alive = np.array(arrays["alive"], dtype=bool)
+        index._doc_freq = np.array(arrays["doc_freq"], dtype=np.int32)
+        index._size, index._nnz = len(index._session_ids), len(index._indices)
+        index._rows = {
+            int(index._session_ids[row]): int(row) for row in np.flatnonzero(index._alive)
+        }
+        return index
+
+    def _user_code(self, user_id: Optional[str]) -> int:
+        if user_id is None:
+            return -1
+        code = self._user_codes.get(user_id)
+        if code is None:
+            code = self._user_codes[user_id] = len(self._users)
+            self._users.append(user_id)
+        return code
+
+    def _select(self, user_id: Optional[str]) -> "np.ndarray":
+        """Live rows of ``user_id`` ascending; none for anonymous sessions."""
+
+        size = self._size
+        code = None if user_id is None else self._user_codes.get(user_id)
+        if code is None:
+            return np.zeros(0, dtype=np.int64)
+        return np.flatnonzero(self._alive[:size] & (self._owners[:size] == code))
+
+    def _entries(self, rows: "np.ndarray") -> Tuple[Any, "np.ndarray", "np.ndarray"]:
+        """Where the entries of ``rows`` are stored, in row order.
+
+        Returns their positions, the position in ``rows`` each belongs to and
+        where each row's entries start among them.
+        """
+
+        if len(rows) == self._size:
+            # Every row is selected: all entries, as stored.
+            return slice(0, self._nnz), self._entry_rows[: self._nnz], self._indptr[: self._size]
+        starts = self._indptr[rows]
+        lengths = self._indptr[rows + 1] - starts
+        total = int(lengths.sum())
+        owner = np.repeat(np.arange(len(rows)), lengths)
+        offsets = np.cumsum(lengths) - lengths
+        positions = np.arange(total) + np.repeat(starts - offsets, lengths)
+        return positions, owner, offsets
+
+    def _idf(self) -> "np.ndarray":
+        # Terms in every document weigh nothing; the template text of the
+        # journal entries drops out this way.
+        documents = len(self._rows)
+        return np.log((1.0 + documents) / (1.0 + self._doc_freq[: len(self._terms)]), dtype=np.float32)
+
+    def _weights(self, rows: "np.ndarray") -> Tuple["np.ndarray", "np.ndarray", "np.ndarray", "np.ndarray"]:
+        """Term ids and L2-normalised TF-IDF weights of the entries of ``rows``, as :meth:`_entries`."""
+
+        positions, owner, starts = self._entries(rows)
+        indices = self._indices[positions]
+        weights = self._tf[positions] * self._idf()[indices]
+        norms = np.sqrt(_row_sums(weights * weights, starts)).astype(np.float32)
+        norms[norms == 0] = 1.0
+        weights /= norms[owner]
+        return indices, weights, owner, starts
+
+    def _vector(self, text: str) -> Tuple["np.ndarray", "np.ndarray"]:
+        ids = [self._vocabulary[word] for word in tokenize(text) if word in self._vocabulary]
+        terms, counts = np.unique(np.array(ids, dtype=np.int32), return_counts=True)
+        weights = (1.0 + np.log(counts)) * self._idf()[terms]
+        norm = float(np.sqrt(np.dot(weights, weights)))
+        return terms, weights / norm if norm else weights
+
+    def _drop(self, rows: "np.ndarray") -> None:
+        if not len(rows):
+            return
+        positions, _, _ = self._entries(rows)
+        dropped = np.bincount(self._indices[positions], minlength=len(self._terms))
+        self._doc_freq[: len(self._terms)] -= dropped.astype(np.int32)
+        self._alive[rows] = False
+        for session_id in self._session_ids[rows]:
+            self._rows.pop(int(session_id), None)
+        if len(self._rows) < self._size // 2:
+            self._compact()
+
+    def _compact(self) -> None:
+        """Rewrite the arrays without the dropped rows."""
+
+        rows = np.flatnonzero(self._alive[: self._size])
+        positions, _, _ = self._entries(rows)
+        lengths = self._indptr[rows + 1] - self._indptr[rows]
+        self._indptr = np.concatenate(([0], np.cumsum(lengths))).astype(np.int64)
+        self._indices = self._indices[positions]
+        self._tf = self._tf[positions]
+        self._entry_rows = np.repeat(np.arange(len(rows), dtype=np.int32), lengths)
+        self._session_ids = self._session_ids[rows]
+        self._owners = self._owners[rows]
+        self._times = self._times[rows]
+        self._alive = np.ones(len(rows), dtype=bool)
+        self._size, self._nnz = len(rows), len(positions)
+        self._rows = {int(session_id): row for row, session_id in enumerate(self._session_ids)}
+
+
+def _row_sums(values: "np.ndarray", starts: "np.ndarray") -> "np.ndarray":
+    """Sums of ``values`` between consecutive ``starts``; entries are stored row by row."""
+
+    if not len(values):
+        return np.zeros(len(starts))
+    sums = np.add.reduceat(values, np.minimum(starts, len(values) - 1), dtype=np.float64)
+    # reduceat yields the element at the start for empty rows.
+    sums[np.diff(starts, append=len(values)) == 0] = 0.0
+    return sums
+
+
+def _top(values: "np.ndarray", mask: "np.ndarray", limit: int) -> List[int]:
+    """Positions of the ``limit`` largest positive ``values`` where ``mask`` holds, largest first."""
+
+    candidates = np.flatnonzero(mask & (values > 0))
+    if len(candidates) > limit:
+        candidates = candidates[np.argpartition(-values[candidates], limit - 1)[:limit]]
+    return [int(position) for position in candidates[np.argsort(-values[candidates], kind="stable")]]
+
+
+async def fetch_documents(
+    session: AsyncSession, after: Optional[Tuple[datetime, int]], limit: int
+) -> List[InsightDocument]:
+    """Journal entries written after the ``(created_at, session_id)`` key ``after``, oldest first."""
+
+    stmt = (
+        select(SessionSummary.session_id, SessionSummary.created_at, SessionSummary.journal_entry, Session.user_id)
+        .join(Session, Session.id == SessionSummary.session_id)
+        .order_by(SessionSummary.created_at, SessionSummary.session_id)
+        .limit(limit)
+    )
+    if after is not None:
+        stmt = stmt.where(tuple_(SessionSummary.created_at, SessionSummary.session_id) > tuple_(*after))
+    rows = (await session.execute(stmt)).all()
+    if not rows:
+        return []
+    session_ids = [row.session_id for row in rows]
+    said: Dict[int, List[str]] = {}
+    messages = await session.execute(
+        select(Message.session_id, Message.content).where(
+            Message.session_id.in_(session_ids), Message.role == "user"
+        )
+    )
+    for session_id, content in messages.tuples():
+        said.setdefault(session_id, []).append(content)
+    archives = await session.execute(
+        select(MessageArchive.session_id, MessageArchive.payload).where(MessageArchive.session_id.in_(session_ids))
+    )
+    for session_id, payload in archives.tuples():
+        said.setdefault(session_id, []).extend(
+            record.content for record in archived_records(payload) if record.role == "user"
+        )
+    return [
+        InsightDocument(
+            row.session_id,
+            row.user_id,
+            row.created_at,
+            "\n".join([row.journal_entry, *said.get(row.session_id, ())]),
+        )
+        for row in rows
+    ]
+
+
+class InsightEngine:
+    """Keep an :class:`InsightIndex` current with every shard and answer queries from it.
+
+    :meth:`refresh` reads at most once per ``refresh_interval`` seconds the
+    entries written since the last refresh; queries call it first, so the
+    index is never more than that behind. Sessions older than ``retention``
+    leave the index as they leave the database. The index is saved to
+    ``path``, if given, every ``persist_interval`` seconds when it changed
+    and on :meth:`close`.
+    """
+
+    def __init__(
+        self,
+        router: "ShardRouter",
+        *,
+        path: Optional[str] = None,
+        retention: Optional[timedelta] = None,
+        trend_window: timedelta = timedelta(days=14),
+        refresh_interval: float = 1.0,
+        persist_interval: float = 300.0,
+        batch_size: int = 500,
+        clock: Callable[[], datetime] = datetime.utcnow,
+    ) -> None:
+        self._router = router
+        self._path = path
+        self._retention = retention
+        self._trend_window = trend_window
+        self._refresh_interval = refresh_interval
+        self._persist_interval = persist_interval
+        self._batch_size = max(1, batch_size)
+        self._clock = clock
+        self._index = InsightIndex()
+        # shard -> (created_at, session_id) of the newest entry indexed
+        self._watermarks: Dict[int, Tuple[datetime, int]] = {}
+        self._loaded = path is None
+        self._changed = False
+        self._refreshed = -math.inf
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task[None]] = None
+
+    @property
+    def documents(self) -> int:
+        return len(self._index)
+
+    async def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.save()
+
+    async def refresh(self, *, force: bool = False) -> int:
+        """Index the entries written since the last refresh; return how many."""
+
+        loop = asyncio.get_running_loop()
+        if not force and loop.time() - self._refreshed < self._refresh_interval:
+            return 0
+        async with self._lock:
+            if not force and loop.time() - self._refreshed < self._refresh_interval:
+                return 0
+            if not self._loaded:
+                await self._load()
+            added = 0
+            for shard in self._router.shards:
+                added += await self._catch_up(shard)
+            if self._retention is not None and self._index.remove_before(self._clock() - self._retention):
+                self._changed = True
+            self._refreshed = loop.time()
+            return added
+
+    async def insights(
+        self,
+        user_id: Optional[str] = None,
+        *,
+        session_id: Optional[int] = None,
+        text: Optional[str] = None,
+        limit: int = 10,
+    ) -> Insights:
+        """See :meth:`InsightIndex.insights`; computed in an executor.
+
+        The cost grows with the size of the user's own history, not with the
+        number of sessions indexed.
+        """
+
+        await self.refresh()
+        async with self._lock:
+            query = partial(
+                self._index.insights,
+                user_id,
+                session_id=session_id,
+                text=text,
+                now=self._clock(),
+                window=self._trend_window,
+                limit=limit,
+            )
+            return await asyncio.get_running_loop().run_in_executor(None, query)
+
+    async def save(self) -> None:
+        if self._path is None or not self._changed:
+            return
+        async with self._lock:
+            arrays = self._index.snapshot()
+            shards = sorted(self._watermarks)
+            arrays["watermark_shards"] = np.array(shards, dtype=np.int64)
+            arrays["watermark_times"] = np.array(
+                [_micros(self._watermarks[shard][0]) for shard in shards], dtype=np.int64
+            )
+            arrays["watermark_ids"] = np.array([self._watermarks[shard][1] for shard in shards], dtype=np.int64)
+            self._changed = False
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, write_arrays, self._path, arrays)
+        except OSError:
+            self._changed = True
+            logger.exception("Saving the insight index failed")
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.refresh(force=True)
+                await self.save()
+            except Exception:  # pragma: no cover - depends on the database
+                logger.exception("Updating the insight index failed")
+            await asyncio.sleep(self._persist_interval)
+
+    async def _load(self) -> None:
+        self._loaded = True
+        assert self._path is not None
+        if not os.path.exists(self._path):
+            return
+        loop = asyncio.get_running_loop()
+        try:
+            arrays = await loop.run_in_executor(None, read_arrays, self._path)
+            self._index = InsightIndex.restore(arrays)
+        except (OSError, KeyError, ValueError) as exc:
+            logger.warning("Rebuilding the insight index from the database: %s", exc)
+            return
+        self._watermarks = {
+            int(shard): (_from_micros(moment), int(session_id))
+            for shard, moment, session_id in zip(
+                arrays["watermark_shards"], arrays["watermark_times"], arrays["watermark_ids"]
+            )
+        }
+
+    async def _catch_up(self, shard: int) -> int:
+        loop = asyncio.get_running_loop()
+        added = 0
+        while True:
+            async with self._router.read_session_factory(shard)() as session:
+                documents = await fetch_documents(session, self._watermarks.get(shard), self._batch_size)
+            if not documents:
+                return added
+            # Tokenising a large backlog would stall the event loop.
+            added += await loop.run_in_executor(None, self._index.add_many, documents)
+            self._watermarks[shard] = (documents[-1].created_at, documents[-1].session_id)
+            self._changed = True
+            if len(documents) < self._batch_size:
+                return added
+
+
+def write_arrays(path: str, arrays: Dict[str, "np.ndarray"]) -> None:
+    """Save ``arrays`` to ``path`` atomically."""
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temporary = f"{path}.tmp"
+    with open(temporary, "wb") as handle:
+        np.savez(handle, **arrays)
+    os.replace(temporary, path)
+
+
+def read_arrays(path: str) -> Dict[str, "np.ndarray"]:
+    with np.load(path, allow_pickle=False) as data:
+        return {name: data[name] for name in data.files}
+
+
+__all__ = [
+    "InsightDocument",
+    "InsightEngine",
+    "InsightIndex",
+    "Insights",
+    "SimilarSession",
+    "TermTrend",
+    "Theme",
+    "fetch_documents",
+    "insights_available",
+    "read_arrays",
+    "tokenize",
+    "write_arrays",
+]
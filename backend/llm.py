@@ -0,0 +1,398 @@
+"""Asynchronous client for OpenAI-compatible chat completion endpoints.
+
+Requests go through one pooled ``httpx.AsyncClient`` so connections to the
+model server are kept alive between turns. Completions are streamed: a
+request counts as answered once its first token arrives. If that takes longer
+than ``hedge_after`` a second, identical request is sent, and whichever
+answers first is used while the other is cancelled. Failed attempts are
+retried, all within one deadline of ``timeout`` seconds per completion.
+
+Generations are shared through a :class:`GenerationCache` keyed by a hash of
+the prompt, so the same conversation prefix is only ever sent once: a
+generation started ahead of time is picked up, finished or still streaming,
+by whoever asks for the same prompt later.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, AsyncGenerator, AsyncIterator, Callable, Dict, List, Optional, Protocol, Sequence, Set, Tuple
+
+from .metrics import REGISTRY, STAGE_SECONDS
+
+try:  # pragma: no cover - optional dependency
+    import httpx
+except ImportError:  # pragma: no cover
+    httpx = None  # type: ignore[assignment]
+
+logger = logging.getLogger(__name__)
+
+ChatMessage = Dict[str, str]
+
+_ATTEMPTS = REGISTRY.counter(
+    "mindful_llm_attempts_total",
+    "Chat completion requests sent, by why they were sent.",
+    ("kind",),
+)
+_FIRST_ATTEMPTS = _ATTEMPTS.labels("first")
+_HEDGED_ATTEMPTS = _ATTEMPTS.labels("hedge")
+_RETRIED_ATTEMPTS = _ATTEMPTS.labels("retry")
+_FAILURES = REGISTRY.counter(
+    "mindful_llm_failures_total", "Chat completions that failed after every attempt."
+).labels()
+_GENERATIONS = REGISTRY.counter(
+    "mindful_llm_generations_total",
+    "Generations requested from the cache, by whether one was already there.",
+    ("outcome",),
+)
+_CACHE_HITS = _GENERATIONS.labels("hit")
+_CACHE_MISSES = _GENERATIONS.labels("miss")
+_FIRST_TOKEN_SECONDS = STAGE_SECONDS.labels("llm_first_token")
+_COMPLETION_SECONDS = STAGE_SECONDS.labels("llm_completion")
+
+
+def llm_available() -> bool:
+    return httpx is not None
+
+
+class ChatModel(Protocol):
+    """Protocol describing a streaming chat completion model."""
+
+    def stream(self, messages: Sequence[ChatMessage]) -> AsyncIterator[str]:
+        """Yield the completion of ``messages`` piece by piece."""
+
+
+class ChatError(RuntimeError):
+    """A chat completion failed; ``retryable`` errors may succeed when sent again."""
+
+    def __init__(self, message: str, retryable: bool = True) -> None:
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class _OpenStream:
+    """A response whose first piece of text has already been read."""
+
+    def __init__(self, response: Any, pieces: AsyncGenerator[str, None], first: Optional[str]) -> None:
+        self.response = response
+        self.pieces = pieces
+        self.first = first
+
+    async def close(self) -> None:
+        await self.pieces.aclose()
+        await self.response.aclose()
+
+
+class OpenAIChatClient:
+    """Stream chat completions from an OpenAI-compatible ``/chat/completions``.
+
+    ``hedge_after <= 0`` disables hedging; ``max_attempts`` bounds hedged and
+    retried requests together. Servers that ignore ``"stream": true`` and
+    answer with a single JSON body are handled too.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        model: str,
+        *,
+        api_key: str = "",
+        temperature: float = 0.7,
+        max_tokens: int = 256,
+        timeout: float = 20.0,
+        connect_timeout: float = 2.0,
+        hedge_after: float = 1.5,
+        max_attempts: int = 3,
+        max_connections: int = 32,
+        max_keepalive_connections: int = 16,
+        keepalive_expiry: float = 30.0,
+        transport: Any = None,
+    ) -> None:
+        if httpx is None:
+            raise RuntimeError("httpx is required for the chat completion client")
+        self._base_url = base_url.rstrip("/")
+        self._model = model
+        self._api_key = api_key
+        self._temperature = temperature
+        self._max_tokens = max_tokens
+        self._timeout = timeout
+        self._connect_timeout = connect_timeout
+        self._hedge_after = hedge_after
+        self._max_attempts = max(1, max_attempts)
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._transport = transport
+        # Created on first use, so the client is bound to the serving loop
+        # and never inherited across a fork.
+        self._client: Optional["httpx.AsyncClient"] = None
+
+    @property
+    def model(self) -> str:
+        return self._model
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def complete(self, messages: Sequence[ChatMessage]) -> str:
+        return "".join([piece async for piece in self.stream(messages)])
+
+    async def stream(self, messages: Sequence[ChatMessage]) -> AsyncIterator[str]:
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        deadline = started + self._timeout
+        opened = await self._open_hedged(list(messages), deadline)
+        _FIRST_TOKEN_SECONDS.observe(loop.time() - started)
+        try:
+            if opened.first:
+                yield opened.first
+            while True:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    raise ChatError("Chat completion timed out while streaming")
+                try:
+                    piece = await asyncio.wait_for(opened.pieces.__anext__(), remaining)
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    raise ChatError("Chat completion timed out while streaming") from None
+                if piece:
+                    yield piece
+        finally:
+            await opened.close()
+            _COMPLETION_SECONDS.observe(loop.time() - started)
+
+    def _get_client(self) -> "httpx.AsyncClient":
+        if self._client is None:
+            headers = {"Authorization": f"Bearer {self._api_key}"} if self._api_key else {}
+            self._client = httpx.AsyncClient(
+                base_url=self._base_url,
+                headers=headers,
+                limits=self._limits,
+                timeout=httpx.Timeout(self._timeout, connect=self._connect_timeout),
+                transport=self._transport,
+            )
+        return self._client
+
+    async def _open_hedged(self, messages: List[ChatMessage], deadline: float) -> _OpenStream:
+        """Race attempts until one yields its first piece of text or the deadline passes."""
+
+        loop = asyncio.get_running_loop()
+        attempts: Set["asyncio.Task[_OpenStream]"] = set()
+        sent = 0
+        failures = 0
+        last_error: Optional[BaseException] = None
+
+        def send(counter: Any) -> None:
+            nonlocal sent
+            sent += 1
+            counter.inc()
+            attempts.add(asyncio.create_task(self._open(messages)))
+
+        send(_FIRST_ATTEMPTS)
+        try:
+            while attempts:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                can_hedge = self._hedge_after > 0 and sent < self._max_attempts
+                wait = min(remaining, self._hedge_after) if can_hedge else remaining
+                done, _ = await asyncio.wait(attempts, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    if can_hedge:
+                        send(_HEDGED_ATTEMPTS)
+                    continue
+                opened: Optional[_OpenStream] = None
+                for task in done:
+                    attempts.discard(task)
+                    if task.exception() is None:
+                        if opened is None:
+                            opened = task.result()
+                        else:
+                            await task.result().close()
+                        continue
+                    error = task.exception()
+                    if isinstance(error, ChatError) and not error.retryable:
+                        _FAILURES.inc()
+                        raise error
+                    last_error = error
+                    failures += 1
+                if opened is not None:
+                    return opened
+                if not attempts and sent < self._max_attempts:
+                    # Back off briefly before sending the same request again.
+                    await asyncio.sleep(min(0.1 * 2 ** (failures - 1), max(0.0, deadline - loop.time())))
+                    send(_RETRIED_ATTEMPTS)
+            _FAILURES.inc()
+            if last_error is None:
+                raise ChatError("Chat completion timed out")
+            raise ChatError(f"Chat completion failed: {last_error}") from last_error
+        finally:
+            for task in attempts:
+                task.cancel()
+            for result in await asyncio.gather(*attempts, return_exceptions=True):
+                if isinstance(result, _OpenStream):
+                    await result.close()
+
+    async def _open(self, messages: List[ChatMessage]) -> _OpenStream:
+        client = self._get_client()
+        payload = {
+            "model": self._model,
+            "messages": messages,
+            "temperature": self._temperature,
+            "max_tokens": self._max_tokens,
+            "stream": True,
+        }
+        try:
+            response = await client.send(client.build_request("POST", "/chat/completions", json=payload), stream=True)
+        except httpx.HTTPError as exc:
+            raise ChatError(f"{type(exc).__name__}: {exc}") from exc
+        try:
+            if response.status_code >= 400:
+                await response.aread()
+                retryable = response.status_code in (408, 409, 429) or response.status_code >= 500
+                raise ChatError(f"HTTP {response.status_code}: {response.text[:200]}", retryable)
+            pieces = _iter_pieces(response)
+            try:
+                first = await pieces.__anext__()
+            except StopAsyncIteration:
+                first = None
+            return _OpenStream(response, pieces, first)
+        except httpx.HTTPError as exc:
+            await response.aclose()
+            raise ChatError(f"{type(exc).__name__}: {exc}") from exc
+        except BaseException:
+            await response.aclose()
+            raise
+
+
+async def _iter_pieces(response: Any) -> AsyncGenerator[str, None]:
+    """Yield the text of a streamed (``text/event-stream``) or plain JSON completion."""
+
+    if not response.headers.get("content-type", "").startswith("text/event-stream"):
+        body = json.loads(await response.aread())
+        yield body["choices"][0]["message"]["content"] or ""
+        return
+    async for line in response.aiter_lines():
+        if not line.startswith("data:"):
+            continue
+        data = line[5:].strip()
+        if data == "[DONE]":
+            return
+        choices = json.loads(data).get("choices") or [{}]
+        piece = (choices[0].get("delta") or {}).get("content")
+        if piece:
+            yield piece
+
+
+def prompt_key(model: str, messages: Sequence[ChatMessage]) -> str:
+    """Hash a prompt so equal conversation prefixes share one generation."""
+
+    digest = hashlib.sha256(model.encode("utf-8"))
+    for message in messages:
+        digest.update(b"\0" + message["role"].encode("utf-8") + b"\0" + message["content"].encode("utf-8"))
+    return digest.hexdigest()
+
+
+class Generation:
+    """A completion being streamed in the background.
+
+    ``text`` holds what has arrived so far; :meth:`result` waits for the rest.
+    """
+
+    def __init__(self, pieces: AsyncIterator[str]) -> None:
+        self._pieces: List[str] = []
+        self.started_at = time.monotonic()
+        self._task = asyncio.create_task(self._consume(pieces))
+        self._task.add_done_callback(_log_failure)
+
+    @property
+    def text(self) -> str:
+        return "".join(self._pieces)
+
+    @property
+    def done(self) -> bool:
+        return self._task.done()
+
+    @property
+    def failed(self) -> bool:
+        return self._task.done() and (self._task.cancelled() or self._task.exception() is not None)
+
+    async def result(self) -> str:
+        await asyncio.shield(self._task)
+        return self.text
+
+    def cancel(self) -> None:
+        self._task.cancel()
+
+    async def _consume(self, pieces: AsyncIterator[str]) -> None:
+        async for piece in pieces:
+            self._pieces.append(piece)
+
+
+def _log_failure(task: "asyncio.Task[None]") -> None:
+    if not task.cancelled() and task.exception() is not None:
+        logger.debug("Generation failed: %s", task.exception())
+
+
+class GenerationCache:
+    """LRU of generations keyed by :func:`prompt_key`, finished or in flight.
+
+    Failed generations are dropped so the prompt is sent again next time.
+    """
+
+    def __init__(self, max_entries: int = 1024) -> None:
+        self._max_entries = max(1, max_entries)
+        self._entries: "OrderedDict[str, Generation]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[Generation]:
+        generation = self._entries.get(key)
+        if generation is None or generation.failed:
+            self._entries.pop(key, None)
+            return None
+        self._entries.move_to_end(key)
+        return generation
+
+    def get_or_start(self, key: str, start: Callable[[], AsyncIterator[str]]) -> Tuple[Generation, bool]:
+        """Return the generation for ``key`` and whether it already existed."""
+
+        generation = self.get(key)
+        if generation is not None:
+            _CACHE_HITS.inc()
+            return generation, True
+        _CACHE_MISSES.inc()
+        generation = self._entries[key] = Generation(start())
+        while len(self._entries) > self._max_entries:
+            _, evicted = self._entries.popitem(last=False)
+            if not evicted.done:
+                evicted.cancel()
+        return generation, False
+
+    def clear(self) -> None:
+        for generation in self._entries.values():
+            if not generation.done:
+                generation.cancel()
+        self._entries.clear()
+
+
+__all__ = [
+    "ChatError",
+    "ChatMessage",
+    "ChatModel",
+    "Generation",
+    "GenerationCache",
+    "OpenAIChatClient",
+    "llm_available",
+    "prompt_key",
+]
@@ -3,39 +3,121 @@ from __future__ import annotations
 
 import asyncio
 from contextlib import asynccontextmanager
-from datetime import datetime
-from typing import AsyncGenerator
+from datetime import datetime, timedelta
+from functools import partial
+from typing import Any, AsyncGenerator, Callable, List, Literal
 
-from fastapi import BackgroundTasks, Depends, FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from .admission import AdmissionController, AdmissionRejected, retry_after_header
+from .audio_spool import AudioSpool, parse_byte_range
 from .config import get_settings
-from .database import engine, get_session
-from .models import Base
-from .orchestrator import LLMOrchestrator
+from .components import ComponentRegistry
+from .database import dispose_engines, ensure_shard_schemas, get_router
+from .events import EventBus, format_sse, format_sse_comment
+from .export import MEDIA_TYPES, encode_export, export_filename, iter_sharded_export_batches
+from .insights import InsightEngine, insights_available
+from .metrics import REGISTRY
+from .llm import OpenAIChatClient, llm_available
+from .orchestrator import DEFAULT_QUESTIONS, ChatOrchestrator, LLMOrchestrator
+from .pagination import decode_export_cursor
+from .pipeline import StreamPipeline
+from .responses import FastJSONResponse
+from .resume import ResumeCache
+from .retention import SessionCompactor
+from .scheduler import ExpiryFailed, SessionExpiryScheduler
 from .schemas import (
     JournalDetailResponse,
+    JournalInsightsResponse,
     JournalListResponse,
-    MessageSchema,
+    JournalSearchResponse,
     SessionEndResponse,
     SessionStartResponse,
-    SummarySchema,
 )
-from .services import SessionService
-from .transcriber import MockTranscriber, Transcriber
-from .tts import SilentSynthesizer, Synthesizer
+from .services import SessionService, search_key, search_page, summary_key, summary_page
+from .sharding import PerShard, merge_sorted
+from .state_store import SQLiteConversationStore, build_conversation_store
+from .summaries import SummaryWorker
+from .transcriber import ChecksumSpeechModel, MockTranscriber, PooledTranscriber, Transcriber
+from .tts import CachingSynthesizer, SilentSynthesizer, Synthesizer
+from .uploads import UploadManager, UploadTooLarge, read_chunk_upload
+from .vad import UtteranceSegmenter, vad_available
+from .writer import MessageWriter
 
 
 SETTINGS = get_settings()
+SESSION_DURATION = timedelta(seconds=SETTINGS.session_duration_seconds)
 
 
 @asynccontextmanager
 async def lifespan(_: FastAPI) -> AsyncGenerator[None, None]:
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-    yield
+    router = get_router()
+    await ensure_shard_schemas(router)
+    writers = get_message_writers().all()
+    for writer in writers:
+        await writer.start()
+    summaries = get_summary_workers()
+    for worker in summaries.all():
+        await worker.start()
+    audio_spools = get_audio_spools()
+    spools = audio_spools.all() if audio_spools is not None else []
+    for spool in spools:
+        await spool.start()
+    compactors = get_session_compactors().all()
+    for compactor in compactors:
+        await compactor.start()
+    insights = get_insights()
+    if insights is not None:
+        await insights.start()
+    scheduler = get_expiry_scheduler()
+    orchestrator = get_orchestrator()
+
+    async def recover(session: AsyncSession) -> tuple[List[tuple[int, datetime]], List[int]]:
+        service = SessionService(session, orchestrator)
+        return await service.fetch_active_sessions(), await service.fetch_pending_summaries()
+
+    recovered = await router.fan_out(recover)
+    active = [item for shard_active, _ in recovered for item in shard_active]
+    for _, unfinished in recovered:
+        for session_id in unfinished:
+            summaries.for_session(session_id).finalise(session_id)
+    get_admission().adopt(session_id for session_id, _ in active)
+    scheduler.schedule_many((session_id, started_at + SESSION_DURATION) for session_id, started_at in active)
+    await scheduler.start()
+    synthesizer = get_synthesizer()
+    if isinstance(synthesizer, CachingSynthesizer):
+        await synthesizer.prewarm(DEFAULT_QUESTIONS)
+    try:
+        yield
+    finally:
+        await scheduler.stop()
+        uploads = COMPONENTS.peek("upload_manager")
+        if uploads is not None:
+            for manager in uploads.built():
+                await manager.close()
+        for compactor in compactors:
+            await compactor.close()
+        if insights is not None:
+            await insights.close()
+        for spool in spools:
+            await spool.close()
+        for worker in summaries.built():
+            await worker.close()
+        for writer in writers:
+            await writer.close()
+        orchestrator = COMPONENTS.peek("orchestrator")
+        if orchestrator is not None:
+            await orchestrator.close()
+            if isinstance(orchestrator.store, SQLiteConversationStore):
+                await asyncio.get_running_loop().run_in_executor(None, orchestrator.store.close)
+        transcriber = COMPONENTS.peek("transcriber")
+        if isinstance(transcriber, PooledTranscriber):
+            await transcriber.close()
+        await dispose_engines()
 
 
 app = FastAPI(lifespan=lifespan)
@@ -47,58 +129,487 @@ app.add_middleware(
     allow_credentials=True,
 )
 
-app.state.orchestrator = LLMOrchestrator()
-app.state.transcriber = MockTranscriber()  # Replace with Whisper/OpenAI implementation.
-app.state.synthesizer = SilentSynthesizer()
+def _build_orchestrator() -> LLMOrchestrator:
+    if SETTINGS.llm_backend == "openai" and llm_available():
+        client = OpenAIChatClient(
+            SETTINGS.llm_base_url,
+            SETTINGS.llm_model,
+            api_key=SETTINGS.llm_api_key,
+            temperature=SETTINGS.llm_temperature,
+            max_tokens=SETTINGS.llm_max_tokens,
+            timeout=SETTINGS.llm_timeout_seconds,
+            connect_timeout=SETTINGS.llm_connect_timeout_seconds,
+            hedge_after=SETTINGS.llm_hedge_after_ms / 1000,
+            max_attempts=SETTINGS.llm_max_attempts,
+            max_connections=SETTINGS.llm_max_connections,
+            max_keepalive_connections=SETTINGS.llm_keepalive_connections,
+            keepalive_expiry=SETTINGS.llm_keepalive_seconds,
+        )
+        return ChatOrchestrator(
+            client,
+            store=build_conversation_store(SETTINGS),
+            history_limit=SETTINGS.conversation_history_limit,
+            cache_size=SETTINGS.llm_cache_size,
+            prefetch=SETTINGS.llm_prefetch,
+        )
+    return LLMOrchestrator(
+        store=build_conversation_store(SETTINGS),
+        history_limit=SETTINGS.conversation_history_limit,
+    )
+
+
+def _build_transcriber() -> Transcriber:
+    if SETTINGS.transcriber_backend == "pooled":
+        # Swap ChecksumSpeechModel for a local Whisper-style model factory.
+        return PooledTranscriber(
+            ChecksumSpeechModel,
+            workers=SETTINGS.transcriber_workers,
+            max_batch_size=SETTINGS.transcriber_max_batch_size,
+            max_wait=SETTINGS.transcriber_max_wait_ms / 1000,
+        )
+    return MockTranscriber()  # Replace with Whisper/OpenAI implementation.
+
+
+def _build_segmenter_factory() -> Callable[[], UtteranceSegmenter] | None:
+    if not SETTINGS.vad_enabled or not vad_available():
+        return None
+    return partial(
+        UtteranceSegmenter,
+        input_format=SETTINGS.vad_input_format,
+        sample_rate=SETTINGS.vad_sample_rate,
+        frame_ms=SETTINGS.vad_frame_ms,
+        energy_threshold_db=SETTINGS.vad_energy_threshold_db,
+        max_zero_crossing_rate=SETTINGS.vad_max_zero_crossing_rate,
+        padding_ms=SETTINGS.vad_padding_ms,
+        min_silence_ms=SETTINGS.vad_min_silence_ms,
+        min_speech_ms=SETTINGS.vad_min_speech_ms,
+        max_segment_ms=SETTINGS.vad_max_segment_ms,
+    )
+
+
+def _build_synthesizer() -> Synthesizer | None:
+    if not SETTINGS.enable_text_to_speech:
+        return None
+    return CachingSynthesizer(
+        SilentSynthesizer(),
+        voice=SETTINGS.tts_voice,
+        audio_format=SETTINGS.tts_format,
+        memory_budget=SETTINGS.tts_cache_memory_bytes,
+        cache_dir=SETTINGS.tts_cache_dir or None,
+        disk_budget=SETTINGS.tts_cache_disk_bytes,
+        frame_size=SETTINGS.tts_stream_frame_bytes,
+    )
+
+
+def _build_message_writers() -> PerShard[MessageWriter]:
+    router = get_router()
+    return PerShard(
+        router,
+        lambda shard: MessageWriter(
+            router.session_factory(shard),
+            batch_size=SETTINGS.message_batch_size,
+            flush_interval=SETTINGS.message_flush_interval_ms / 1000,
+            durability=SETTINGS.message_durability,
+        ),
+    )
+
+
+def _build_summary_workers() -> PerShard[SummaryWorker]:
+    router = get_router()
+    orchestrator = get_orchestrator()
+    writers = get_message_writers()
+    insights = get_insights()
+    workers = PerShard(
+        router,
+        lambda shard: SummaryWorker(
+            router.session_factory(shard),
+            orchestrator,
+            writers.for_shard(shard),
+            insights=insights,
+            persist_interval=SETTINGS.summary_persist_interval_ms / 1000,
+        ),
+    )
+    orchestrator.subscribe(lambda session_id, message: workers.for_session(session_id).observe(session_id, message))
+    return workers
+
+
+def _build_audio_spools() -> PerShard[AudioSpool] | None:
+    if not SETTINGS.audio_spool_dir:
+        return None
+    router = get_router()
+    # Session ids are unique across shards, so the spools share one directory.
+    return PerShard(
+        router,
+        lambda shard: AudioSpool(
+            SETTINGS.audio_spool_dir,
+            router.session_factory(shard),
+            router.read_session_factory(shard),
+            segment_bytes=SETTINGS.audio_spool_segment_bytes,
+            flush_bytes=SETTINGS.audio_spool_flush_bytes,
+            flush_interval=SETTINGS.audio_spool_flush_interval_ms / 1000,
+            retention=timedelta(days=SETTINGS.audio_retention_days) if SETTINGS.audio_retention_days else None,
+            maintenance_interval=SETTINGS.audio_maintenance_interval_seconds,
+        ),
+    )
+
+
+def _build_session_compactors() -> PerShard[SessionCompactor]:
+    router = get_router()
+    audio_spools = get_audio_spools()
+    return PerShard(
+        router,
+        lambda shard: SessionCompactor(
+            router.session_factory(shard),
+            audio_spools.for_shard(shard) if audio_spools is not None else None,
+            archive_after=timedelta(days=SETTINGS.message_archive_after_days)
+            if SETTINGS.message_archive_after_days
+            else None,
+            retention=timedelta(days=SETTINGS.session_retention_days) if SETTINGS.session_retention_days else None,
+            batch_size=SETTINGS.retention_batch_size,
+            vacuum_pages=SETTINGS.sqlite_incremental_vacuum_pages,
+            interval=SETTINGS.retention_interval_seconds,
+        ),
+    )
+
+
+def _build_insights() -> InsightEngine | None:
+    if not SETTINGS.insights_enabled or not insights_available():
+        return None
+    return InsightEngine(
+        get_router(),
+        path=SETTINGS.insights_path or None,
+        retention=timedelta(days=SETTINGS.session_retention_days) if SETTINGS.session_retention_days else None,
+        trend_window=timedelta(days=SETTINGS.insights_trend_window_days),
+        refresh_interval=SETTINGS.insights_refresh_interval_ms / 1000,
+        persist_interval=SETTINGS.insights_persist_interval_seconds,
+        batch_size=SETTINGS.insights_batch_size,
+    )
+
+
+def _build_admission() -> AdmissionController:
+    admission = AdmissionController(
+        SETTINGS.admission_max_sessions,
+        queue_size=SETTINGS.admission_queue_size,
+        max_wait=SETTINGS.admission_max_wait_seconds,
+        stages={
+            "transcription": SETTINGS.admission_transcription_capacity,
+            "synthesis": SETTINGS.admission_synthesis_capacity,
+        },
+        session_seconds=SETTINGS.session_duration_seconds,
+    )
+    admission.watch(
+        "db_write",
+        lambda: max((writer.pending_count for writer in get_message_writers().built()), default=0),
+        SETTINGS.admission_db_write_capacity,
+    )
+    return admission
+
+
+def _build_event_bus() -> EventBus:
+    return EventBus(
+        queue_size=SETTINGS.event_subscriber_queue_size,
+        policy=SETTINGS.event_slow_consumer_policy,
+        history_size=SETTINGS.event_history_size,
+    )
+
+
+def _build_resume_cache() -> ResumeCache | None:
+    if not SETTINGS.stream_resume_enabled:
+        return None
+    return ResumeCache(
+        history_size=SETTINGS.stream_resume_history_size,
+        max_sessions=SETTINGS.stream_resume_max_sessions,
+    )
+
+
+def _build_upload_managers() -> PerShard[UploadManager]:
+    router = get_router()
+    orchestrator = get_orchestrator()
+    transcriber = get_transcriber()
+    bus = get_event_bus()
+    writers = get_message_writers()
+    audio_spools = get_audio_spools()
+    segmenter_factory = get_segmenter_factory()
+    admission = get_admission()
+    return PerShard(
+        router,
+        lambda shard: UploadManager(
+            router.read_session_factory(shard),
+            orchestrator,
+            transcriber,
+            bus,
+            writers.for_shard(shard),
+            audio_spools.for_shard(shard) if audio_spools is not None else None,
+            window=SETTINGS.upload_reorder_window,
+            gap_timeout=SETTINGS.upload_reorder_timeout_ms / 1000,
+            idle_timeout=SETTINGS.upload_idle_timeout_seconds,
+            chunk_queue_size=SETTINGS.stream_chunk_queue_size,
+            transcription_concurrency=SETTINGS.stream_transcription_concurrency,
+            segmenter_factory=segmenter_factory,
+            segment_flush_timeout=SETTINGS.vad_flush_timeout_ms / 1000,
+            admission=admission,
+            max_bytes_per_second=SETTINGS.stream_max_bytes_per_second,
+            burst_bytes=SETTINGS.stream_burst_bytes,
+        ),
+    )
+
+
+def _build_expiry_scheduler() -> SessionExpiryScheduler:
+    return SessionExpiryScheduler(expire_sessions, batch_size=SETTINGS.expiry_batch_size)
+
+
+# Nothing is built at import time. Models are loaded on first use, or in the
+# parent process before workers fork when listed in ``preload_components``.
+COMPONENTS = ComponentRegistry()
+COMPONENTS.register("orchestrator", _build_orchestrator, fork_safe=SETTINGS.conversation_store != "sqlite")
+COMPONENTS.register("transcriber", _build_transcriber)
+COMPONENTS.register("segmenter_factory", _build_segmenter_factory)
+COMPONENTS.register("synthesizer", _build_synthesizer)
+COMPONENTS.register("message_writer", _build_message_writers)
+COMPONENTS.register("summary_worker", _build_summary_workers, fork_safe=SETTINGS.conversation_store != "sqlite")
+COMPONENTS.register("audio_spool", _build_audio_spools)
+COMPONENTS.register("session_compactor", _build_session_compactors)
+COMPONENTS.register("insights", _build_insights, fork_safe=False)
+COMPONENTS.register("admission", _build_admission)
+COMPONENTS.register("event_bus", _build_event_bus)
+COMPONENTS.register("resume_cache", _build_resume_cache)
+COMPONENTS.register("upload_manager", _build_upload_managers, fork_safe=SETTINGS.conversation_store != "sqlite")
+COMPONENTS.register("expiry_scheduler", _build_expiry_scheduler)
+app.state.components = COMPONENTS
+COMPONENTS.preload(SETTINGS.preload_components)
 
 
 def get_orchestrator() -> LLMOrchestrator:
-    return app.state.orchestrator
+    return app.state.components.get("orchestrator")
 
 
 def get_transcriber() -> Transcriber:
-    return app.state.transcriber
+    return app.state.components.get("transcriber")
+
+
+def get_synthesizer() -> Synthesizer | None:
+    return app.state.components.get("synthesizer")
+
+
+def get_message_writers() -> PerShard[MessageWriter]:
+    return app.state.components.get("message_writer")
+
+
+def get_summary_workers() -> PerShard[SummaryWorker]:
+    return app.state.components.get("summary_worker")
+
+
+def get_audio_spools() -> PerShard[AudioSpool] | None:
+    return app.state.components.get("audio_spool")
+
+
+def get_segmenter_factory() -> Callable[[], UtteranceSegmenter] | None:
+    return app.state.components.get("segmenter_factory")
+
+
+def get_session_compactors() -> PerShard[SessionCompactor]:
+    return app.state.components.get("session_compactor")
+
+
+def get_insights() -> InsightEngine | None:
+    return app.state.components.get("insights")
+
+
+def get_admission() -> AdmissionController:
+    return app.state.components.get("admission")
+
 
+def get_event_bus() -> EventBus:
+    return app.state.components.get("event_bus")
 
-def get_synthesizer() -> Synthesizer:
-    return app.state.synthesizer
 
+def get_resume_cache() -> ResumeCache | None:
+    return app.state.components.get("resume_cache")
 
-async def get_db_session() -> AsyncGenerator[AsyncSession, None]:
-    async with get_session() as session:
+
+def get_upload_managers() -> PerShard[UploadManager]:
+    return app.state.components.get("upload_manager")
+
+
+def session_shard(session_id: int) -> int:
+    """Shard of the ``session_id`` path parameter; unknown shards are a 404."""
+
+    try:
+        return get_router().shard_for_session(session_id)
+    except LookupError as exc:
+        raise HTTPException(status_code=404, detail=str(exc)) from exc
+
+
+async def get_db_session(shard: int = Depends(session_shard)) -> AsyncGenerator[AsyncSession, None]:
+    async with get_router().session_factory(shard)() as session:
         yield session
 
 
-async def schedule_auto_end(session_id: int) -> None:
-    await asyncio.sleep(SETTINGS.session_duration_seconds)
-    async with get_session() as session:
-        service = SessionService(session, get_orchestrator())
-        try:
-            await service.end_session(session_id)
-            await service.finalise_session(session_id)
-            await session.commit()
-        except ValueError:
-            await session.rollback()
-        except Exception:
-            await session.rollback()
-            raise
+async def get_read_db_session(shard: int = Depends(session_shard)) -> AsyncGenerator[AsyncSession, None]:
+    async with get_router().read_session_factory(shard)() as session:
+        yield session
+
+
+def get_message_writer(shard: int = Depends(session_shard)) -> MessageWriter:
+    return get_message_writers().for_shard(shard)
+
+
+def get_summary_worker(shard: int = Depends(session_shard)) -> SummaryWorker:
+    return get_summary_workers().for_shard(shard)
+
+
+def get_audio_spool(shard: int = Depends(session_shard)) -> AudioSpool | None:
+    audio_spools = get_audio_spools()
+    return audio_spools.for_shard(shard) if audio_spools is not None else None
+
+
+def get_upload_manager(shard: int = Depends(session_shard)) -> UploadManager:
+    return get_upload_managers().for_shard(shard)
+
+
+async def expire_sessions(session_ids: List[int]) -> None:
+    router = get_router()
+    writers = get_message_writers()
+
+    async def expire(shard: int, shard_session_ids: List[int]) -> List[int]:
+        async with router.session_factory(shard)() as session:
+            service = SessionService(session, get_orchestrator(), writers.for_shard(shard))
+            try:
+                expired = await service.expire_sessions(shard_session_ids)
+                await session.commit()
+            except Exception:
+                await session.rollback()
+                raise
+        return expired
+
+    groups = router.group_by_shard(session_ids)
+    results = await asyncio.gather(*(expire(shard, ids) for shard, ids in groups.items()), return_exceptions=True)
+    failed = {
+        session_id
+        for ids, result in zip(groups.values(), results)
+        if isinstance(result, BaseException)
+        for session_id in ids
+    }
+    # Sessions ended elsewhere are not in ``expired`` but are over all the same;
+    # those of a shard that did not commit are still active and keep their slot.
+    ended = [session_id for session_id in session_ids if session_id not in failed]
+    admission = get_admission()
+    for session_id in ended:
+        admission.release(session_id)
+    _forget_ended(ended)
+    summaries = get_summary_workers()
+    for expired in results:
+        if not isinstance(expired, BaseException):
+            for session_id in expired:
+                summaries.for_session(session_id).finalise(session_id)
+    if failed:
+        error = next(result for result in results if isinstance(result, BaseException))
+        raise ExpiryFailed(sorted(failed)) from error
+
+
+def _forget_ended(session_ids: List[int]) -> None:
+    uploads = COMPONENTS.peek("upload_manager")
+    if uploads is not None:
+        for manager in uploads.built():
+            manager.forget(session_ids)
+    audio_spools = COMPONENTS.peek("audio_spool")
+    if audio_spools is not None:
+        for spool in audio_spools.built():
+            spool.end(session_ids)
+
+
+def get_expiry_scheduler() -> SessionExpiryScheduler:
+    return app.state.components.get("expiry_scheduler")
+
+
+def _measure_loaded(name: str, measure: Callable[[Any], float]) -> Callable[[], float]:
+    """Report ``measure`` of a component at scrape time, or 0 before it is built."""
+
+    def read() -> float:
+        component = COMPONENTS.peek(name)
+        return measure(component) if component is not None else 0
+
+    return read
+
+
+OPEN_WEBSOCKETS = REGISTRY.gauge("mindful_open_websockets", "Stream WebSockets currently open.").labels()
+REGISTRY.gauge("mindful_conversation_states", "Conversations held by the orchestrator state store.").set_function(
+    _measure_loaded("orchestrator", lambda orchestrator: len(orchestrator.store))
+)
+REGISTRY.gauge("mindful_pending_expiry_timers", "Sessions waiting for their automatic end.").set_function(
+    _measure_loaded("expiry_scheduler", len)
+)
+REGISTRY.gauge("mindful_pending_messages", "Messages buffered by the message writers.").set_function(
+    _measure_loaded("message_writer", lambda writers: sum(writer.pending_count for writer in writers.built()))
+)
+REGISTRY.gauge("mindful_open_shards", "Database shards with open connections.").set_function(
+    lambda: get_router().open_shards
+)
+REGISTRY.gauge("mindful_insight_documents", "Sessions in the insight index.").set_function(
+    _measure_loaded("insights", lambda insights: insights.documents)
+)
+REGISTRY.gauge("mindful_event_subscribers", "Open Server-Sent Events streams.").set_function(
+    _measure_loaded("event_bus", lambda bus: bus.subscriber_count)
+)
+REGISTRY.gauge("mindful_resumable_streams", "Sessions with recent stream events kept for resuming.").set_function(
+    _measure_loaded("resume_cache", len)
+)
+REGISTRY.gauge("mindful_admitted_sessions", "Sessions holding an admission slot.").set_function(
+    _measure_loaded("admission", lambda admission: admission.sessions)
+)
+REGISTRY.gauge("mindful_admission_queue_length", "New sessions waiting for an admission slot.").set_function(
+    _measure_loaded("admission", lambda admission: admission.queued)
+)
+_STAGE_IN_FLIGHT = REGISTRY.gauge("mindful_stage_in_flight", "Operations running in a limited stage.", ("stage",))
+_STAGE_WAITING = REGISTRY.gauge("mindful_stage_waiting", "Operations waiting for a limited stage.", ("stage",))
+for _stage in ("transcription", "synthesis"):
+    _STAGE_IN_FLIGHT.set_function(
+        _measure_loaded("admission", lambda admission, stage=_stage: admission.stage(stage).in_flight), _stage
+    )
+    _STAGE_WAITING.set_function(
+        _measure_loaded("admission", lambda admission, stage=_stage: admission.stage(stage).waiting), _stage
+    )
+REGISTRY.gauge("mindful_audio_spool_buffered_bytes", "Received audio not yet written to the spool.").set_function(
+    _measure_loaded("audio_spool", lambda spools: sum(spool.buffered_bytes for spool in spools.built()))
+)
+
+
+def _overloaded(exc: AdmissionRejected) -> Response:
+    return FastJSONResponse(
+        {
+            "detail": str(exc),
+            "retry_after": round(exc.retry_after, 1),
+            "estimated_start": datetime.utcnow() + timedelta(seconds=exc.retry_after),
+        },
+        status_code=503,
+        headers={"Retry-After": retry_after_header(exc.retry_after)},
+    )
 
 
 @app.post("/session/start", response_model=SessionStartResponse)
 async def start_session(
-    background_tasks: BackgroundTasks,
-    session: AsyncSession = Depends(get_db_session),
+    user_id: str | None = Header(default=None, alias="X-User-Id", min_length=1, max_length=64),
     orchestrator: LLMOrchestrator = Depends(get_orchestrator),
-) -> SessionStartResponse:
-    service = SessionService(session, orchestrator)
+    scheduler: SessionExpiryScheduler = Depends(get_expiry_scheduler),
+    admission: AdmissionController = Depends(get_admission),
+) -> Response:
     try:
-        instance, first_question = await service.create_session()
-        await session.commit()
-    except SQLAlchemyError as exc:
-        await session.rollback()
-        raise HTTPException(status_code=500, detail=str(exc)) from exc
+        await admission.reserve()
+    except AdmissionRejected as exc:
+        return _overloaded(exc)
+    router = get_router()
+    async with router.session_factory(router.shard_for_user(user_id))() as session:
+        service = SessionService(session, orchestrator)
+        try:
+            instance, first_question = await service.create_session(user_id)
+            await session.commit()
+        except SQLAlchemyError as exc:
+            admission.abandon()
+            await session.rollback()
+            raise HTTPException(status_code=500, detail=str(exc)) from exc
 
-    background_tasks.add_task(schedule_auto_end, instance.id)
+    admission.assign(instance.id)
+    scheduler.schedule(instance.id, instance.started_at + SESSION_DURATION)
     return SessionStartResponse(session_id=instance.id, question=first_question)
 
 
@@ -107,11 +618,15 @@ async def end_session(
     session_id: int,
     session: AsyncSession = Depends(get_db_session),
     orchestrator: LLMOrchestrator = Depends(get_orchestrator),
+    writer: MessageWriter = Depends(get_message_writer),
+    scheduler: SessionExpiryScheduler = Depends(get_expiry_scheduler),
+    summaries: SummaryWorker = Depends(get_summary_worker),
+    admission: AdmissionController = Depends(get_admission),
+    resume_cache: ResumeCache | None = Depends(get_resume_cache),
 ) -> SessionEndResponse:
-    service = SessionService(session, orchestrator)
+    service = SessionService(session, orchestrator, writer)
     try:
         instance = await service.end_session(session_id)
-        await service.finalise_session(session_id)
         await session.commit()
     except ValueError as exc:
         await session.rollback()
@@ -120,94 +635,322 @@ async def end_session(
         await session.rollback()
         raise HTTPException(status_code=500, detail="Unable to end session") from exc
 
-    return SessionEndResponse(session_id=session_id, ended_at=instance.ended_at or datetime.utcnow())
+    scheduler.cancel(session_id)
+    admission.release(session_id)
+    _forget_ended([session_id])
+    if resume_cache is not None:
+        resume_cache.discard(session_id)
+    if instance.summary_status == "pending":
+        summaries.finalise(session_id)
+    return SessionEndResponse(
+        session_id=session_id,
+        ended_at=instance.ended_at or datetime.utcnow(),
+        summary_status=instance.summary_status,
+    )
 
 
 @app.websocket("/session/{session_id}/stream")
 async def stream_audio(
     websocket: WebSocket,
     session_id: int,
+    log_id: str | None = Query(default=None, max_length=32),
+    last_seq: int | None = Query(default=None, ge=0),
+    next_chunk: int | None = Query(default=None, ge=1),
     transcriber: Transcriber = Depends(get_transcriber),
-    synthesizer: Synthesizer = Depends(get_synthesizer),
+    synthesizer: Synthesizer | None = Depends(get_synthesizer),
+    admission: AdmissionController = Depends(get_admission),
+    resume_cache: ResumeCache | None = Depends(get_resume_cache),
 ) -> None:
+    """Stream audio chunks in and questions out.
+
+    A client reconnecting after a dropped connection passes the ``log`` and
+    ``seq`` of the last event it saw as ``log_id`` and ``last_seq`` and is
+    sent a ``resumed`` message followed by the events it missed. Chunks are
+    numbered from ``next_chunk`` (by default after the last chunk received,
+    which every event reports as ``chunk``); those received before are
+    dropped. ``last_seq`` and ``next_chunk`` only count with the current
+    ``log_id``; otherwise the client is told events are missing.
+    """
+
     await websocket.accept()
+    try:
+        shard = get_router().shard_for_session(session_id)
+    except LookupError:
+        # 1008: policy violation, there is no such session.
+        await websocket.close(code=1008, reason="Session not found")
+        return
+    if not admission.claim(session_id):
+        # 1013: try again later.
+        await websocket.close(code=1013, reason="Server is at capacity")
+        return
     orchestrator = get_orchestrator()
+    OPEN_WEBSOCKETS.inc()
+    pipeline: StreamPipeline | None = None
     try:
-        async with get_session() as db_session:
-            service = SessionService(db_session, orchestrator)
-            while True:
-                try:
-                    message = await websocket.receive()
-                except WebSocketDisconnect:
-                    break
-
-                data: bytes | None = None
-                if message.get("bytes") is not None:
-                    data = message["bytes"]
-                elif message.get("text") is not None:
-                    data = message["text"].encode("utf-8")
-
-                if not data:
-                    continue
-
-                transcript = await transcriber.transcribe_chunk(data)
-                await service.append_user_message(session_id, transcript)
-                await db_session.commit()
-                await websocket.send_json({"type": "transcript", "text": transcript})
-
-                next_question = orchestrator.next_question(session_id)
-                if next_question:
-                    await service.append_assistant_message(session_id, next_question)
-                    await db_session.commit()
-                    await websocket.send_json({"type": "question", "text": next_question})
-                    if SETTINGS.enable_text_to_speech:
-                        audio = await synthesizer.synthesize(next_question)
-                        await websocket.send_bytes(audio)
-                else:
-                    await websocket.send_json({"type": "complete"})
-                    break
+        # Messages go through the write-behind writer, so the pipeline never
+        # waits on a flush or commit before replying to the client.
+        pipeline = StreamPipeline(
+            websocket,
+            session_id,
+            get_router().read_session_factory(shard),
+            get_message_writers().for_shard(shard),
+            orchestrator,
+            transcriber,
+            synthesizer,
+            chunk_queue_size=SETTINGS.stream_chunk_queue_size,
+            transcription_concurrency=SETTINGS.stream_transcription_concurrency,
+            synthesis_queue_size=SETTINGS.stream_synthesis_queue_size,
+            frame_size=SETTINGS.tts_stream_frame_bytes,
+            speculative_synthesis=SETTINGS.tts_speculative_synthesis,
+            audio_spool=get_audio_spool(shard),
+            segmenter_factory=get_segmenter_factory(),
+            segment_flush_timeout=SETTINGS.vad_flush_timeout_ms / 1000,
+            admission=admission,
+            max_bytes_per_second=SETTINGS.stream_max_bytes_per_second,
+            burst_bytes=SETTINGS.stream_burst_bytes,
+            log=resume_cache.open(session_id) if resume_cache is not None else None,
+        )
+        if resume_cache is not None:
+            if not await pipeline.resume(
+                log_id, last_seq, next_chunk, SETTINGS.stream_resume_takeover_timeout_seconds
+            ):
+                await websocket.close(code=1013, reason="Session is still streaming elsewhere")
+                return
+            # A connection taken over released the session's slot on its way out.
+            if not admission.claim(session_id):
+                await websocket.close(code=1013, reason="Server is at capacity")
+                return
+        await pipeline.run()
     finally:
+        if pipeline is not None:
+            # Lets the next connection attach even if resuming failed midway.
+            pipeline.release()
+        OPEN_WEBSOCKETS.dec()
+        admission.release_claim(session_id)
         try:
             await websocket.close()
         except RuntimeError:
             pass
 
 
+@app.post("/sessions/{session_id}/audio", status_code=202)
+async def upload_audio_chunk(
+    session_id: int,
+    request: Request,
+    uploads: UploadManager = Depends(get_upload_manager),
+) -> Any:
+    try:
+        sequence, chunk = await read_chunk_upload(
+            request.headers.get("content-type", ""), request.stream(), SETTINGS.upload_max_chunk_bytes
+        )
+    except UploadTooLarge as exc:
+        raise HTTPException(status_code=413, detail=str(exc)) from exc
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    try:
+        accepted = await uploads.offer(session_id, sequence, chunk)
+    except LookupError as exc:
+        raise HTTPException(status_code=404, detail=str(exc)) from exc
+    except AdmissionRejected as exc:
+        return _overloaded(exc)
+    return {"sequence": sequence, "status": "queued" if accepted else "duplicate"}
+
+
+@app.get("/sessions/{session_id}/events")
+async def session_events(
+    session_id: int,
+    request: Request,
+    bus: EventBus = Depends(get_event_bus),
+) -> StreamingResponse:
+    last_event_id = request.headers.get("last-event-id")
+    subscription = bus.subscribe(
+        session_id, int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+    )
+
+    async def body() -> AsyncGenerator[str, None]:
+        try:
+            while not subscription.closed:
+                event = await subscription.next(timeout=SETTINGS.sse_heartbeat_seconds)
+                if event is not None:
+                    yield format_sse(event)
+                elif not subscription.closed:
+                    if await request.is_disconnected():
+                        break
+                    yield format_sse_comment("keep-alive")
+        finally:
+            subscription.close()
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/session/{session_id}/audio")
+async def get_session_audio(
+    session_id: int,
+    request: Request,
+    audio_spool: AudioSpool | None = Depends(get_audio_spool),
+) -> Response:
+    if audio_spool is None:
+        raise HTTPException(status_code=404, detail="Audio spooling is disabled")
+    extents = await audio_spool.extents(session_id)
+    if not extents:
+        raise HTTPException(status_code=404, detail="No audio recorded for this session")
+    size = sum(extent.length for extent in extents)
+    headers = {"Accept-Ranges": "bytes"}
+    byte_range = None
+    if "range" in request.headers:
+        try:
+            byte_range = parse_byte_range(request.headers["range"], size)
+        except ValueError:
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+    start, end = byte_range or (0, size)
+    headers["Content-Length"] = str(end - start)
+    if byte_range is not None:
+        headers["Content-Range"] = f"bytes {start}-{end - 1}/{size}"
+
+    async def body() -> AsyncGenerator[bytes, None]:
+        # ASGI bodies are bytes, so each mapped frame is copied once on its way out.
+        async for view in audio_spool.iter_range(session_id, extents, start, end):
+            yield view.tobytes()
+
+    return StreamingResponse(
+        body(),
+        status_code=206 if byte_range is not None else 200,
+        media_type="application/octet-stream",
+        headers=headers,
+    )
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics() -> PlainTextResponse:
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/export")
+async def export(
+    export_format: Literal["ndjson", "csv"] = Query(default="ndjson", alias="format"),
+    compress: bool = Query(default=False, alias="gzip"),
+    since: datetime | None = None,
+    until: datetime | None = None,
+    cursor: str | None = None,
+    limit: int | None = Query(default=None, ge=1),
+) -> StreamingResponse:
+    router = get_router()
+    try:
+        after = decode_export_cursor(cursor) if cursor is not None else None
+        if after is not None:
+            router.shard_for_session(after[0])
+    except (ValueError, LookupError) as exc:
+        raise HTTPException(status_code=400, detail="Invalid cursor") from exc
+    batches = iter_sharded_export_batches(
+        router,
+        since=since,
+        until=until,
+        after=after,
+        batch_size=SETTINGS.export_batch_size,
+        limit=limit,
+    )
+    return StreamingResponse(
+        encode_export(batches, export_format, compress),
+        media_type="application/gzip" if compress else MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{export_filename(export_format, compress)}"'},
+    )
+
+
 @app.get("/journals", response_model=JournalListResponse)
 async def list_journals(
-    session: AsyncSession = Depends(get_db_session),
+    limit: int = Query(default=20, ge=1, le=100),
+    cursor: str | None = None,
+    user_id: str | None = Query(default=None, min_length=1, max_length=64),
     orchestrator: LLMOrchestrator = Depends(get_orchestrator),
-) -> JournalListResponse:
-    service = SessionService(session, orchestrator)
-    summaries = await service.fetch_summaries()
-    entries = [
-        SummarySchema(
-            session_id=summary.session_id,
-            journal_entry=summary.journal_entry,
-            recommendations=summary.recommendations,
-            created_at=summary.created_at,
+) -> Response:
+    # Every shard returns its own newest rows; the page is the newest of all.
+    try:
+        pages = await get_router().fan_out(
+            lambda session: SessionService(session, orchestrator).fetch_summary_rows(limit, cursor, user_id)
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    entries, next_cursor = summary_page(merge_sorted(pages, summary_key, limit + 1, reverse=True), limit)
+    return FastJSONResponse({"entries": entries, "next_cursor": next_cursor})
+
+
+@app.get("/journals/search", response_model=JournalSearchResponse)
+async def search_journals(
+    q: str = Query(..., min_length=1, max_length=256),
+    limit: int = Query(default=20, ge=1, le=100),
+    cursor: str | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    orchestrator: LLMOrchestrator = Depends(get_orchestrator),
+) -> Response:
+    try:
+        pages = await get_router().fan_out(
+            lambda session: SessionService(session, orchestrator).search_rows(q, limit, cursor, since, until)
         )
-        for summary in summaries
-    ]
-    return JournalListResponse(entries=entries)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    results, next_cursor = search_page(merge_sorted(pages, search_key, limit + 1), limit)
+    return FastJSONResponse({"results": results, "next_cursor": next_cursor})
+
+
+@app.get("/journals/insights", response_model=JournalInsightsResponse)
+async def journal_insights(
+    user_id: str = Query(..., min_length=1, max_length=64),
+    session_id: int | None = None,
+    limit: int = Query(default=10, ge=1, le=50),
+    insights: InsightEngine | None = Depends(get_insights),
+) -> Response:
+    # Declared before /journals/{session_id}, which would otherwise match.
+    # Anonymous sessions have no history of their own, so a user id is required.
+    if insights is None:
+        raise HTTPException(status_code=404, detail="Insights are disabled")
+    try:
+        result = await insights.insights(user_id, session_id=session_id, limit=limit)
+    except LookupError as exc:
+        raise HTTPException(status_code=404, detail=str(exc)) from exc
+    return FastJSONResponse(result.as_dict())
 
 
 @app.get("/journals/{session_id}", response_model=JournalDetailResponse)
 async def get_journal(
     session_id: int,
-    session: AsyncSession = Depends(get_db_session),
+    session: AsyncSession = Depends(get_read_db_session),
     orchestrator: LLMOrchestrator = Depends(get_orchestrator),
-) -> JournalDetailResponse:
-    service = SessionService(session, orchestrator)
+    writer: MessageWriter = Depends(get_message_writer),
+) -> Response:
+    service = SessionService(session, orchestrator, writer)
     summary = await service.fetch_summary(session_id)
+    if summary is None:
+        status = await service.fetch_summary_status(session_id)
+        if status == "pending":
+            return JSONResponse(
+                status_code=202,
+                content={"detail": "Journal entry is being generated", "summary_status": "pending"},
+            )
+        if status == "failed":
+            # Retried when the server restarts.
+            return JSONResponse(
+                status_code=500,
+                content={"detail": "Journal entry could not be generated", "summary_status": "failed"},
+            )
+        if status == "ready":
+            # The entry was written between the two reads.
+            summary = await service.fetch_summary(session_id)
     if summary is None:
         raise HTTPException(status_code=404, detail="Journal entry not found")
     messages = await service.fetch_messages(session_id)
-    return JournalDetailResponse(
-        session=session_id,
-        journal_entry=summary.journal_entry,
-        recommendations=summary.recommendations,
-        messages=messages,
+    # Rows are trusted, so skip response-model validation and encode once.
+    return FastJSONResponse(
+        {
+            "session": session_id,
+            "journal_entry": summary.journal_entry,
+            "recommendations": summary.recommendations,
+            "messages": [message.as_dict() for message in messages],
+        }
     )
 
 
@@ -0,0 +1,280 @@
+"""Lightweight in-process metrics with Prometheus text exposition.
+
+Histograms have fixed buckets and keep their counts in a preallocated list,
+so recording a sample is a bisect and three additions with no allocation
+and no lock. Samples are expected to be recorded from the event loop
+thread; every worker process keeps its own counts, as with any
+per-process Prometheus client.
+"""
+from __future__ import annotations
+
+import functools
+import time
+from bisect import bisect_left
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple, TypeVar
+
+# Seconds, from sub-millisecond queries up to slow model calls.
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+T = TypeVar("T")
+
+
+def _format_labels(labels: Sequence[Tuple[str, str]]) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(f'{name}="{value}"' for name, value in labels)
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    __slots__ = ("_labels", "_bounds", "_counts", "_sum", "_count", "_spans")
+
+    def __init__(self, labels: Sequence[Tuple[str, str]], bounds: Tuple[float, ...]) -> None:
+        self._labels = tuple(labels)
+        self._bounds = bounds
+        self._counts = [0] * (len(bounds) + 1)
+        self._sum = 0.0
+        self._count = 0
+        # Finished spans, handed out again by ``time``.
+        self._spans: List[Span] = []
+
+    def observe(self, value: float) -> None:
+        self._counts[bisect_left(self._bounds, value)] += 1
+        self._sum += value
+        self._count += 1
+
+    def time(self) -> "Span":
+        """Return a span timing one block; spans are recycled once they exit.
+
+        A new span is only created when more blocks are being timed at once
+        than ever before, so steady-state sampling allocates nothing.
+        """
+
+        spans = self._spans
+        return spans.pop() if spans else Span(self)
+
+    def render(self, name: str) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self._bounds + (float("inf"),), self._counts):
+            cumulative += count
+            labels = _format_labels(self._labels + (("le", _format_value(bound)),))
+            lines.append(f"{name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self._labels)
+        lines.append(f"{name}_sum{labels} {self._sum!r}")
+        lines.append(f"{name}_count{labels} {self._count}")
+        return lines
+
+
+class Span:
+    """Context manager recording the monotonic time spent in its block.
+
+    Obtained from :meth:`Histogram.time` and returned to it on exit, so a
+    span must not be kept and entered again.
+    """
+
+    __slots__ = ("_histogram", "_started")
+
+    def __init__(self, histogram: Histogram) -> None:
+        self._histogram = histogram
+        self._started = 0.0
+
+    def __enter__(self) -> "Span":
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        histogram = self._histogram
+        histogram.observe(time.perf_counter() - self._started)
+        histogram._spans.append(self)
+
+
+class Gauge:
+    __slots__ = ("_labels", "_value", "_function")
+
+    def __init__(
+        self, labels: Sequence[Tuple[str, str]], function: Optional[Callable[[], float]] = None
+    ) -> None:
+        self._labels = tuple(labels)
+        self._value = 0.0
+        self._function = function
+
+    def set(self, value: float) -> None:
+        self._value = value
+
+    def inc(self, amount: float = 1) -> None:
+        self._value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        self._value -= amount
+
+    @property
+    def value(self) -> float:
+        return self._function() if self._function is not None else self._value
+
+    def render(self, name: str) -> List[str]:
+        return [f"{name}{_format_labels(self._labels)} {_format_value(self.value)}"]
+
+
+class Counter(Gauge):
+    __slots__ = ()
+
+    def inc(self, amount: float = 1) -> None:
+        if amount < 0:
+            raise ValueError("Counters can only increase")
+        self._value += amount
+
+
+class MetricFamily:
+    """A named metric and its children, one per combination of label values.
+
+    Children are meant to be created once, typically at import time, and kept
+    in module-level names so the hot path never looks them up.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        kind: str,
+        labelnames: Sequence[str] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.kind = kind
+        self._labelnames = tuple(labelnames)
+        self._buckets = tuple(sorted(buckets))
+        self._children: Dict[Tuple[str, ...], Any] = {}
+
+    def labels(self, *values: str) -> Any:
+        if len(values) != len(self._labelnames):
+            raise ValueError(f"{self.name} expects labels {self._labelnames}")
+        child = self._children.get(values)
+        if child is None:
+            labels = list(zip(self._labelnames, values))
+            if self.kind == "histogram":
+                child = Histogram(labels, self._buckets)
+            elif self.kind == "counter":
+                child = Counter(labels)
+            else:
+                child = Gauge(labels)
+            self._children[values] = child
+        return child
+
+    def set_function(self, function: Callable[[], float], *values: str) -> None:
+        """Report the result of ``function`` at scrape time instead of a stored value."""
+
+        if self.kind != "gauge":
+            raise ValueError("Only gauges can be computed at scrape time")
+        self._children[values] = Gauge(list(zip(self._labelnames, values)), function)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for child in self._children.values():
+            lines.extend(child.render(self.name))
+        return lines
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._families: Dict[str, MetricFamily] = {}
+
+    def _register(self, family: MetricFamily) -> MetricFamily:
+        if family.name in self._families:
+            raise ValueError(f"Metric {family.name} is already registered")
+        self._families[family.name] = family
+        return family
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> MetricFamily:
+        return self._register(MetricFamily(name, documentation, "histogram", labelnames, buckets))
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> MetricFamily:
+        return self._register(MetricFamily(name, documentation, "counter", labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> MetricFamily:
+        return self._register(MetricFamily(name, documentation, "gauge", labelnames))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for family in self._families.values():
+            lines.extend(family.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "mindful_stage_seconds",
+    "Time spent in each stage of a streaming turn.",
+    ("stage",),
+)
+QUERY_SECONDS = REGISTRY.histogram(
+    "mindful_query_seconds",
+    "Time spent in SessionService database operations.",
+    ("query",),
+)
+
+
+def timed(family: MetricFamily) -> Callable[[Callable[..., Awaitable[T]]], Callable[..., Awaitable[T]]]:
+    """Record the duration of every call of a coroutine function in ``family``.
+
+    The child histogram is labelled with the function name.
+    """
+
+    def decorator(func: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+        histogram: Histogram = family.labels(func.__name__)
+
+        @functools.wraps(func)
+        async def wrapper(*args: Any, **kwargs: Any) -> T:
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - started)
+
+        return wrapper
+
+    return decorator
+
+
+__all__ = [
+    "DEFAULT_BUCKETS",
+    "Histogram",
+    "Span",
+    "Gauge",
+    "Counter",
+    "MetricFamily",
+    "Registry",
+    "REGISTRY",
+    "STAGE_SECONDS",
+    "QUERY_SECONDS",
+    "timed",
+]
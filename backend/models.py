@@ -3,11 +3,14 @@ from __future__ import annotations
 
 from datetime import datetime
 
-from sqlalchemy import Column, DateTime, ForeignKey, Integer, String, Text
+from sqlalchemy import BigInteger, Column, DateTime, ForeignKey, Index, Integer, LargeBinary, String, Text
 from sqlalchemy.orm import declarative_base, relationship
 
 Base = declarative_base()
 
+# Length of the journal preview stored alongside each summary for list views.
+PREVIEW_LENGTH = 160
+
 
 class Session(Base):
     __tablename__ = "sessions"
@@ -16,6 +19,17 @@ class Session(Base):
     started_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     ended_at = Column(DateTime, nullable=True)
     status = Column(String(32), default="active", nullable=False)
+    # Who the session belongs to; it decides the database shard. Anonymous
+    # sessions have none.
+    user_id = Column(String(64), nullable=True, index=True)
+    # Rolling summary of the messages up to ``(summary_watermark,
+    # summary_watermark_id)``, kept current while the session runs so only the
+    # tail is summarised when it ends. Text appended to it since it was last
+    # rewritten lives in ``summary_parts``.
+    partial_summary = Column(Text, nullable=True)
+    summary_watermark = Column(DateTime, nullable=True)
+    summary_watermark_id = Column(Integer, nullable=True)
+    summary_status = Column(String(16), default="none", nullable=False)
 
     messages = relationship("Message", back_populates="session", cascade="all, delete-orphan")
     summary = relationship("SessionSummary", back_populates="session", uselist=False, cascade="all, delete-orphan")
@@ -40,9 +54,57 @@ class SessionSummary(Base):
     session_id = Column(Integer, ForeignKey("sessions.id", ondelete="CASCADE"), nullable=False, unique=True)
     journal_entry = Column(Text, nullable=False)
     recommendations = Column(Text, nullable=False)
+    preview = Column(String(PREVIEW_LENGTH), nullable=False, default="")
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
 
     session = relationship("Session", back_populates="summary")
 
+    # Journal listings merge shards on ``(created_at, session_id)``, which is
+    # unique across shards where the summary id is not.
+    __table_args__ = (Index("ix_session_summaries_created_at_session_id", "created_at", "session_id"),)
+
+
+class SummaryPart(Base):
+    """Text appended to a session's rolling summary, in ``id`` order."""
+
+    __tablename__ = "summary_parts"
+
+    id = Column(Integer, primary_key=True)
+    session_id = Column(Integer, ForeignKey("sessions.id", ondelete="CASCADE"), nullable=False, index=True)
+    text = Column(Text, nullable=False)
+
+
+class AudioChunk(Base):
+    """Location of one received audio chunk inside a session's spool segment."""
+
+    __tablename__ = "audio_chunks"
+
+    session_id = Column(Integer, ForeignKey("sessions.id", ondelete="CASCADE"), primary_key=True)
+    sequence = Column(Integer, primary_key=True)
+    segment = Column(String(64), nullable=False)
+    byte_offset = Column(BigInteger, nullable=False)
+    length = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class MessageArchive(Base):
+    """Compressed messages of a finished session, moved out of ``messages``."""
+
+    __tablename__ = "message_archives"
+
+    session_id = Column(Integer, ForeignKey("sessions.id", ondelete="CASCADE"), primary_key=True)
+    message_count = Column(Integer, nullable=False)
+    payload = Column(LargeBinary, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
 
-__all__ = ["Base", "Session", "Message", "SessionSummary"]
+__all__ = [
+    "Base",
+    "Session",
+    "Message",
+    "SessionSummary",
+    "SummaryPart",
+    "AudioChunk",
+    "MessageArchive",
+    "PREVIEW_LENGTH",
+]
@@ -1,11 +1,20 @@
 """Conversation and summarisation logic for the mindfulness coach."""
 from __future__ import annotations
 
+import asyncio
+import logging
 from collections import deque
 from dataclasses import dataclass, field
-from typing import Deque, Dict, Iterable, List
+from typing import TYPE_CHECKING, Callable, Deque, Iterable, List, Sequence
 
-from .schemas import MessageSchema
+from .llm import ChatError, ChatMessage, ChatModel, Generation, GenerationCache, prompt_key
+from .records import MessageRecord
+from .state_store import ConversationStore, InMemoryConversationStore
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .insights import Insights
+
+logger = logging.getLogger(__name__)
 
 
 DEFAULT_QUESTIONS: List[str] = [
@@ -16,11 +25,48 @@ DEFAULT_QUESTIONS: List[str] = [
     "What is one intention for tomorrow?",
 ]
 
+DEFAULT_RECOMMENDATIONS = (
+    "1. Celebrate one positive moment from today.\n"
+    "2. Address a noted challenge with a small, concrete next step.\n"
+    "3. Schedule a self-care activity aligned with tomorrow's intention."
+)
+
+
+def personalised_recommendations(insights: Insights | None) -> str:
+    """Recommendations that pick up the themes and trends of earlier sessions."""
+
+    if not insights:
+        return DEFAULT_RECOMMENDATIONS
+    lines = ["Celebrate one positive moment from today."]
+    if insights.themes:
+        themes = insights.themes[:3]
+        terms = ", ".join(f'"{theme.term}"' for theme in themes)
+        lines.append(
+            f"{terms} {'keeps' if len(themes) == 1 else 'keep'} coming up in your reflections;"
+            " take one small, concrete step on what weighs most."
+        )
+    else:
+        lines.append("Address a noted challenge with a small, concrete next step.")
+    if insights.rising:
+        lines.append(
+            f'"{insights.rising[0].term}" has come up more often lately; plan a moment'
+            " for it tomorrow."
+        )
+    elif insights.similar:
+        written = insights.similar[0].created_at
+        lines.append(
+            f"Reread your journal from {written:%B} {written.day}, which touched on similar"
+            " things, and notice what has changed since."
+        )
+    else:
+        lines.append("Schedule a self-care activity aligned with tomorrow's intention.")
+    return "\n".join(f"{number}. {line}" for number, line in enumerate(lines, 1))
+
 
 @dataclass
 class ConversationState:
     questions: Deque[str] = field(default_factory=lambda: deque(DEFAULT_QUESTIONS))
-    history: List[MessageSchema] = field(default_factory=list)
+    history: List[MessageRecord] = field(default_factory=list)
 
 
 class LLMOrchestrator:
@@ -29,20 +75,64 @@ class LLMOrchestrator:
     This class encapsulates the logic that would normally be handled by a large
     language model. The default implementation uses deterministic templates so
     the backend works even without direct LLM access, but the methods can be
-    extended to integrate with OpenAI, Azure, or other vendors.
+    extended to integrate with OpenAI, Azure, or other vendors; see
+    :class:`ChatOrchestrator`. Callers on the event loop use the ``async``
+    methods (:meth:`ask_next_question`, :meth:`fold_summary`,
+    :meth:`compose_summary`), which a model-backed orchestrator implements without blocking.
+
+    Conversation state lives in a :class:`~backend.state_store.ConversationStore`
+    so it can be bounded, evicted and shared between worker processes. Only the
+    most recent ``history_limit`` messages are kept per conversation; the full
+    transcript remains in the database.
     """
 
-    def __init__(self) -> None:
-        self._conversations: Dict[int, ConversationState] = {}
+    def __init__(self, store: ConversationStore | None = None, history_limit: int = 20) -> None:
+        self._conversations: ConversationStore = store if store is not None else InMemoryConversationStore()
+        self._history_limit = history_limit
+        self._listeners: List[Callable[[int, MessageRecord], None]] = []
+
+    @property
+    def store(self) -> ConversationStore:
+        return self._conversations
+
+    def subscribe(self, listener: Callable[[int, MessageRecord], None]) -> None:
+        """Call ``listener`` with every message passed to :meth:`record_message`."""
+
+        self._listeners.append(listener)
 
     def start_session(self, session_id: int) -> str:
         state = ConversationState()
-        self._conversations[session_id] = state
+        self._conversations.put(session_id, state)
         return state.questions[0]
 
-    def record_message(self, session_id: int, message: MessageSchema) -> None:
-        state = self._conversations.setdefault(session_id, ConversationState())
+    def has_session(self, session_id: int) -> bool:
+        return self._conversations.get(session_id) is not None
+
+    def restore_session(self, session_id: int, messages: Iterable[MessageRecord]) -> None:
+        """Rebuild evicted state from the persisted transcript of a session."""
+
+        history = list(messages)
+        asked = sum(1 for message in history if message.role == "assistant")
+        state = ConversationState(
+            questions=deque(DEFAULT_QUESTIONS[max(asked - 1, 0):]),
+            history=history[-self._history_limit:] if self._history_limit > 0 else [],
+        )
+        self._conversations.put(session_id, state)
+
+    def end_session(self, session_id: int) -> None:
+        self._conversations.delete(session_id)
+
+    def record_message(self, session_id: int, message: MessageRecord) -> None:
+        for listener in self._listeners:
+            listener(session_id, message)
+        state = self._conversations.get(session_id)
+        if state is None:
+            # Evicted conversations are rebuilt from the database on demand.
+            return
         state.history.append(message)
+        if len(state.history) > self._history_limit:
+            del state.history[: len(state.history) - self._history_limit]
+        self._conversations.put(session_id, state)
 
     def next_question(self, session_id: int) -> str | None:
         state = self._conversations.get(session_id)
@@ -51,25 +141,259 @@ class LLMOrchestrator:
         if state.questions:
             # Discard the question that was already asked and return the next one.
             state.questions.popleft()
+        self._conversations.put(session_id, state)
         if state.questions:
             return state.questions[0]
         return None
 
-    def summarise(self, messages: Iterable[MessageSchema]) -> tuple[str, str]:
-        """Produce a journal entry and actionable recommendations."""
+    def upcoming_question(self, session_id: int) -> str | None:
+        """Return the question that will follow the current one, if known."""
+
+        state = self._conversations.get(session_id)
+        if not state or len(state.questions) < 2:
+            return None
+        return state.questions[1]
+
+    def update_summary(self, partial: str, messages: Iterable[MessageRecord]) -> str:
+        """Fold ``messages`` into the rolling ``partial`` summary of a session."""
+
+        lines = "\n".join(f"{m.role}: {m.content}" for m in messages)
+        if not lines:
+            return partial
+        return f"{partial}\n{lines}" if partial else lines
+
+    def complete_summary(
+        self, partial: str, tail: Iterable[MessageRecord], insights: Insights | None = None
+    ) -> tuple[str, str]:
+        """Merge the unsummarised ``tail`` into ``partial`` and finish the journal.
+
+        ``insights`` from the user's earlier sessions personalise the
+        recommendations.
+        """
 
-        transcript = "\n".join(f"{m.role}: {m.content}" for m in messages)
+        transcript = self.update_summary(partial, tail)
         journal_entry = (
             "Daily Reflection Summary:\n" + transcript + "\n\n"
             "Overall, focus on gratitude, acknowledging challenges, and planning"
             " supportive actions for tomorrow."
         )
-        recommendations = (
-            "1. Celebrate one positive moment from today.\n"
-            "2. Address a noted challenge with a small, concrete next step.\n"
-            "3. Schedule a self-care activity aligned with tomorrow's intention."
+        return journal_entry, personalised_recommendations(insights)
+
+    def summarise(self, messages: Iterable[MessageRecord]) -> tuple[str, str]:
+        """Produce a journal entry and actionable recommendations."""
+
+        return self.complete_summary("", messages)
+
+    async def ask_next_question(self, session_id: int) -> str | None:
+        """Advance the conversation and return the question to ask next."""
+
+        return self.next_question(session_id)
+
+    async def fold_summary(self, partial: str, messages: Sequence[MessageRecord]) -> str:
+        """Async :meth:`update_summary`, run in an executor."""
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.update_summary, partial, messages)
+
+    async def compose_summary(
+        self, partial: str, tail: Sequence[MessageRecord], insights: Insights | None = None
+    ) -> tuple[str, str]:
+        """Async :meth:`complete_summary`, run in an executor."""
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.complete_summary, partial, tail, insights)
+
+    async def close(self) -> None:
+        return None
+
+
+QUESTION_PROMPT = (
+    "You are a warm, unhurried mindfulness coach guiding someone through an evening"
+    " reflection. Reply to what they just said in at most one short sentence, then"
+    " ask exactly one open question. Do not give advice yet."
+)
+SUMMARY_PROMPT = (
+    "You keep running notes on a reflection session. Rewrite the notes so far to also"
+    " cover the new messages, in at most 200 words. Keep what the user said about"
+    " their day, feelings, challenges and intentions; drop pleasantries. Reply with"
+    " the notes only."
+)
+JOURNAL_PROMPT = (
+    "You turn the notes and the latest messages of a reflection session into a short"
+    " first-person journal entry in the user's voice. After the entry write a line"
+    " 'Recommendations:' followed by three numbered, concrete and kind suggestions"
+    " for tomorrow."
+)
+
+
+class ChatOrchestrator(LLMOrchestrator):
+    """Word questions and write journal entries with a chat model.
+
+    The template questions still set the course and length of a
+    conversation; the model phrases each one as a reply to what the user
+    said. With ``prefetch`` the next question starts generating as soon as a
+    user message is recorded, and :meth:`ask_next_question` picks that
+    generation up, finished or still streaming, from a
+    :class:`~backend.llm.GenerationCache` keyed by the hash of the
+    conversation so far. When the model fails, or its generation is
+    cancelled (e.g. evicted from the cache), the template text is used.
+
+    :meth:`fold_summary` has the model condense new messages into the
+    session's running notes as they arrive, so :meth:`compose_summary` only
+    sends those notes and the messages after them, however long the session.
+
+    :meth:`upcoming_question` always returns ``None``: the next question is
+    worded after the answer to the current one, so there is nothing to
+    render ahead, and speculative synthesis does not apply to this
+    orchestrator.
+    """
+
+    def __init__(
+        self,
+        model: ChatModel,
+        store: ConversationStore | None = None,
+        history_limit: int = 20,
+        *,
+        cache_size: int = 1024,
+        prefetch: bool = True,
+    ) -> None:
+        super().__init__(store, history_limit)
+        self._model = model
+        self._model_name = getattr(model, "model", type(model).__name__)
+        self._cache = GenerationCache(cache_size)
+        self._prefetch = prefetch
+
+    def record_message(self, session_id: int, message: MessageRecord) -> None:
+        super().record_message(session_id, message)
+        if self._prefetch and message.role == "user":
+            self.prefetch_question(session_id)
+
+    def prefetch_question(self, session_id: int) -> None:
+        """Start generating the question that follows the conversation so far."""
+
+        state = self._conversations.get(session_id)
+        if state is None or len(state.questions) < 2:
+            return
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._generate(self._question_prompt(state))
+
+    def upcoming_question(self, session_id: int) -> str | None:
+        # The wording depends on the answer, so there is nothing to render ahead.
+        return None
+
+    async def ask_next_question(self, session_id: int) -> str | None:
+        state = self._conversations.get(session_id)
+        if state is None or len(state.questions) < 2:
+            return self.next_question(session_id)
+        generation = self._generate(self._question_prompt(state))
+        try:
+            text = (await _result(generation)).strip()
+        except Exception as exc:
+            logger.warning("Falling back to the template question for session %s: %s", session_id, exc)
+            text = ""
+        topic = self.next_question(session_id)
+        return text or topic
+
+    async def fold_summary(self, partial: str, messages: Sequence[MessageRecord]) -> str:
+        if not messages:
+            return partial
+        prompt: List[ChatMessage] = [
+            {"role": "system", "content": SUMMARY_PROMPT},
+            {"role": "user", "content": _notes_prompt(partial, messages)},
+        ]
+        try:
+            text = (await _result(self._generate(prompt))).strip()
+        except Exception as exc:
+            logger.warning("Falling back to the transcript for the running summary: %s", exc)
+            text = ""
+        return text or await super().fold_summary(partial, messages)
+
+    async def compose_summary(
+        self, partial: str, tail: Sequence[MessageRecord], insights: Insights | None = None
+    ) -> tuple[str, str]:
+        if not partial and not tail:
+            return await super().compose_summary(partial, tail, insights)
+        messages: List[ChatMessage] = [{"role": "system", "content": JOURNAL_PROMPT}]
+        history = _history_prompt(insights) if insights else ""
+        if history:
+            messages.append({"role": "system", "content": history})
+        messages.append({"role": "user", "content": _notes_prompt(partial, tail)})
+        try:
+            text = await _result(self._generate(messages))
+        except Exception as exc:
+            logger.warning("Falling back to the template journal entry: %s", exc)
+            return await super().compose_summary(partial, tail, insights)
+        journal_entry, _, recommendations = text.partition("Recommendations:")
+        if not journal_entry.strip():
+            return await super().compose_summary(partial, tail, insights)
+        return journal_entry.strip(), recommendations.strip() or personalised_recommendations(insights)
+
+    async def close(self) -> None:
+        self._cache.clear()
+        close = getattr(self._model, "close", None)
+        if close is not None:
+            await close()
+
+    def _question_prompt(self, state: ConversationState) -> List[ChatMessage]:
+        messages: List[ChatMessage] = [{"role": "system", "content": QUESTION_PROMPT}]
+        messages.extend({"role": message.role, "content": message.content} for message in state.history)
+        # questions[0] was just asked; steer the reply towards the one after it.
+        messages.append({"role": "system", "content": f"Next, ask about: {state.questions[1]}"})
+        return messages
+
+    def _generate(self, messages: List[ChatMessage]) -> Generation:
+        generation, _ = self._cache.get_or_start(
+            prompt_key(self._model_name, messages), lambda: self._model.stream(messages)
         )
-        return journal_entry, recommendations
+        return generation
+
+
+async def _result(generation: Generation) -> str:
+    """Wait for ``generation``; its own cancellation is a :class:`ChatError`, the caller's is not."""
 
+    try:
+        return await generation.result()
+    except asyncio.CancelledError:
+        if generation.failed:
+            raise ChatError("Generation was cancelled") from None
+        raise
 
-__all__ = ["LLMOrchestrator", "ConversationState", "DEFAULT_QUESTIONS"]
+
+def _notes_prompt(partial: str, messages: Sequence[MessageRecord]) -> str:
+    """The running notes of a session followed by the messages they do not cover yet."""
+
+    lines = "\n".join(f"{m.role}: {m.content}" for m in messages)
+    if not partial:
+        return f"New messages:\n{lines}"
+    if not lines:
+        return f"Notes so far:\n{partial}"
+    return f"Notes so far:\n{partial}\n\nNew messages:\n{lines}"
+
+
+def _history_prompt(insights: Insights) -> str:
+    """What the earlier sessions say, for the journal prompt; empty when nothing stands out."""
+
+    lines = []
+    if insights.themes:
+        lines.append("Recurring themes: " + ", ".join(theme.term for theme in insights.themes[:5]) + ".")
+    if insights.rising:
+        lines.append("Mentioned more often lately: " + ", ".join(trend.term for trend in insights.rising[:3]) + ".")
+    if insights.falling:
+        lines.append("Mentioned less often lately: " + ", ".join(trend.term for trend in insights.falling[:3]) + ".")
+    if not lines:
+        return ""
+    lines.insert(0, "From the user's earlier sessions; let the recommendations build on it where it fits.")
+    return "\n".join(lines)
+
+
+__all__ = [
+    "LLMOrchestrator",
+    "ChatOrchestrator",
+    "ConversationState",
+    "DEFAULT_QUESTIONS",
+    "DEFAULT_RECOMMENDATIONS",
+    "personalised_recommendations",
+]
@@ -0,0 +1,86 @@
+"""Opaque cursors for keyset pagination."""
+from __future__ import annotations
+
+import base64
+import binascii
+from datetime import datetime
+
+
+def _encode(raw: str) -> str:
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _decode(cursor: str) -> str:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    return base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8")
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    """Encode the ``(created_at, id)`` key of the last row on a page."""
+
+    return _encode(f"{created_at.isoformat()}|{row_id}")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """Decode a cursor produced by :func:`encode_cursor`.
+
+    Raises ``ValueError`` when the cursor is malformed.
+    """
+
+    try:
+        created_at, row_id = _decode(cursor).rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (binascii.Error, UnicodeError, ValueError) as exc:
+        raise ValueError("Invalid cursor") from exc
+
+
+def encode_search_cursor(score: float, source: str, session_id: int, row_id: int) -> str:
+    """Encode the ``(score, source, session_id, id)`` key of the last search hit on a page."""
+
+    # repr() round-trips floats exactly, so the next page starts right after this hit.
+    return _encode(f"{score!r}|{source}|{session_id}|{row_id}")
+
+
+def decode_search_cursor(cursor: str) -> tuple[float, str, int, int]:
+    """Decode a cursor produced by :func:`encode_search_cursor`.
+
+    Raises ``ValueError`` when the cursor is malformed.
+    """
+
+    try:
+        score, source, session_id, row_id = _decode(cursor).split("|")
+        return float(score), source, int(session_id), int(row_id)
+    except (binascii.Error, UnicodeError, ValueError) as exc:
+        raise ValueError("Invalid cursor") from exc
+
+
+def encode_export_cursor(session_id: int, message_id: int) -> str:
+    """Encode the ``(session_id, message_id)`` position reached by an export.
+
+    ``message_id`` is ``0`` when only the session record has been emitted.
+    """
+
+    return _encode(f"{session_id}|{message_id}")
+
+
+def decode_export_cursor(cursor: str) -> tuple[int, int]:
+    """Decode a cursor produced by :func:`encode_export_cursor`.
+
+    Raises ``ValueError`` when the cursor is malformed.
+    """
+
+    try:
+        session_id, message_id = _decode(cursor).split("|")
+        return int(session_id), int(message_id)
+    except (binascii.Error, UnicodeError, ValueError) as exc:
+        raise ValueError("Invalid cursor") from exc
+
+
+__all__ = [
+    "encode_cursor",
+    "decode_cursor",
+    "encode_search_cursor",
+    "decode_search_cursor",
+    "encode_export_cursor",
+    "decode_export_cursor",
+]
@@ -0,0 +1,416 @@
+"""Concurrent processing stages for a streaming audio session."""
+from __future__ import annotations
+
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from fastapi import WebSocket, WebSocketDisconnect
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .admission import AdmissionController, TokenBucket
+from .audio_spool import AudioSpool
+from .metrics import STAGE_SECONDS
+from .orchestrator import LLMOrchestrator
+from .resume import StreamLog, resume_events
+from .services import SessionService
+from .transcriber import Transcriber
+from .tts import AudioBuffer, CachingSynthesizer, Synthesizer, iter_frames, synthesize_frames
+from .vad import UtteranceSegmenter
+from .writer import MessageWriter
+
+SpeechItem = Tuple[str, Optional["asyncio.Task[AudioBuffer]"]]
+
+_TRANSCRIBE_SECONDS = STAGE_SECONDS.labels("transcribe")
+_NEXT_QUESTION_SECONDS = STAGE_SECONDS.labels("next_question")
+_SYNTHESIZE_SECONDS = STAGE_SECONDS.labels("synthesize")
+_SEND_SECONDS = STAGE_SECONDS.labels("socket_send")
+
+
+class StreamPipeline:
+    """Run one WebSocket session as a chain of bounded asyncio stages.
+
+    ``reader`` receives chunks from the socket, ``transcription`` starts a
+    transcription task per chunk, ``responder`` persists transcripts and
+    questions (through the message writer) and replies, and
+    ``synthesis`` renders spoken questions when a synthesizer is supplied.
+
+    Each pair of stages is joined by a bounded queue. When a downstream stage
+    falls behind its queue fills, the upstream ``put`` waits, and eventually
+    the reader stops pulling from the socket, so pressure reaches the client
+    instead of growing server-side buffers. Transcription tasks are queued in
+    chunk order and awaited in that order, so up to
+    ``transcription_concurrency`` chunks are transcribed at once while replies
+    still follow the sequence in which chunks arrived. A chunk is only taken
+    off the queue once one of those slots is free.
+
+    Spoken questions are sent as a series of binary frames followed by an
+    ``audio_end`` event, so playback can start with the first frame. While the
+    user answers a question, the question the orchestrator has lined up next
+    is rendered speculatively; if the conversation takes that path the audio
+    is already there, otherwise the speculative work is cancelled.
+
+    A database session from ``session_factory`` is opened per reply and only
+    touches the database when the conversation has to be restored, so an idle
+    socket never holds a pooled connection or pins an old read snapshot. None
+    is open while the orchestrator produces the next question, which may
+    mean waiting on a remote model.
+
+    With an ``audio_spool`` every received chunk is also kept on disk before
+    it is transcribed.
+
+    With a ``segmenter_factory`` chunks pass through voice-activity detection
+    first: silence is dropped and speech is regrouped into utterances, each
+    transcribed as one unit. An utterance still open when the stream goes
+    quiet for ``segment_flush_timeout`` seconds is transcribed as it is.
+
+    Transcription and synthesis run inside the ``admission`` controller's
+    stage limits, shared by every session of the process. Speculative
+    synthesis is skipped while the synthesis stage is saturated. The reader
+    admits at most ``max_bytes_per_second`` of audio (bursts up to
+    ``burst_bytes``) and otherwise waits, slowing the client down.
+
+    With a ``log`` the session can be resumed after a dropped connection (see
+    :mod:`backend.resume`): JSON events are numbered and kept before they are
+    sent, chunks are numbered and acknowledged once queued, and chunks already
+    received are dropped. Replies still in progress when the client leaves are
+    completed into the log. :meth:`resume` must then be called before
+    :meth:`run`.
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        session_id: int,
+        session_factory: Callable[[], AsyncSession],
+        writer: Optional[MessageWriter],
+        orchestrator: LLMOrchestrator,
+        transcriber: Transcriber,
+        synthesizer: Optional[Synthesizer] = None,
+        *,
+        chunk_queue_size: int = 8,
+        transcription_concurrency: int = 2,
+        synthesis_queue_size: int = 4,
+        frame_size: int = 4096,
+        speculative_synthesis: bool = True,
+        audio_spool: Optional[AudioSpool] = None,
+        segmenter_factory: Optional[Callable[[], UtteranceSegmenter]] = None,
+        segment_flush_timeout: float = 8.0,
+        admission: Optional[AdmissionController] = None,
+        max_bytes_per_second: float = 0,
+        burst_bytes: float = 0,
+        log: Optional[StreamLog] = None,
+    ) -> None:
+        self._websocket = websocket
+        self._session_id = session_id
+        self._session_factory = session_factory
+        self._writer = writer
+        self._orchestrator = orchestrator
+        self._transcriber = transcriber
+        self._synthesizer = synthesizer
+        self._chunks: asyncio.Queue[Optional[Tuple[int, bytes]]] = asyncio.Queue(maxsize=max(1, chunk_queue_size))
+        self._transcripts: asyncio.Queue[Optional[Tuple[int, asyncio.Task[str]]]] = asyncio.Queue(
+            maxsize=max(1, transcription_concurrency)
+        )
+        self._transcription_slots = asyncio.Semaphore(max(1, transcription_concurrency))
+        self._speech: asyncio.Queue[Optional[SpeechItem]] = asyncio.Queue(maxsize=max(1, synthesis_queue_size))
+        self._frame_size = frame_size
+        self._speculate = speculative_synthesis and synthesizer is not None
+        self._speculations: Dict[str, asyncio.Task[AudioBuffer]] = {}
+        self._audio_spool = audio_spool
+        self._segmenter_factory = segmenter_factory
+        self._segment_flush_timeout = segment_flush_timeout
+        admission = admission or AdmissionController()
+        self._transcription_stage = admission.stage("transcription")
+        self._synthesis_stage = admission.stage("synthesis")
+        self._inbound = TokenBucket(max_bytes_per_second, burst_bytes or max_bytes_per_second)
+        self._log = log
+        self._attached = False
+        self._first_chunk = 1
+        # Set once the client is gone or another connection took the session over.
+        self._detached = False
+        self._superseded = False
+        self._reader: Optional[asyncio.Task[None]] = None
+        self._reading = False
+
+    async def resume(
+        self, log_id: Optional[str], last_seq: Optional[int], next_chunk: Optional[int], timeout: float
+    ) -> bool:
+        """Take the session's log over and bring the client up to date.
+
+        A client resuming after ``last_seq`` of log ``log_id`` is sent the
+        events it missed; its chunks are numbered from ``next_chunk``, or
+        after the last one received. Numbers that are not the current log's
+        are ignored and the client is told events are missing. Returns
+        ``False`` if a previous connection of the session did not finish
+        within ``timeout`` seconds.
+        """
+
+        assert self._log is not None
+        if not await self._log.attach(self._take_over, timeout):
+            return False
+        self._attached = True
+        current = self._log.current(log_id)
+        self._first_chunk = next_chunk if next_chunk is not None and current else self._log.received + 1
+        if last_seq is not None or (next_chunk is not None and not current):
+            for event in resume_events(self._log, log_id, last_seq or 0):
+                if not self._detached:
+                    await self._send_resumable(self._websocket.send_json(event))
+        return True
+
+    def release(self) -> None:
+        """Let go of the session's log, for a stream that ends without :meth:`run`."""
+
+        if self._attached:
+            self._attached = False
+            self._log.detach()  # type: ignore[union-attr]
+
+    def _take_over(self) -> None:
+        # Stop reading; replies already under way finish into the log.
+        self._superseded = self._detached = True
+        if self._reading and self._reader is not None:
+            self._reader.cancel()
+
+    async def run(self) -> None:
+        """Process the socket until the client leaves or the conversation ends."""
+
+        sinks: List[asyncio.Task[None]] = [asyncio.create_task(self._respond())]
+        if self._synthesizer is not None:
+            sinks.append(asyncio.create_task(self._synthesize()))
+        self._reader = asyncio.create_task(self._read())
+        stages: Set[asyncio.Task[None]] = {
+            self._reader,
+            asyncio.create_task(self._transcribe()),
+            *sinks,
+        }
+        pending = set(stages)
+        try:
+            while not all(task.done() for task in sinks):
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    task.result()
+        finally:
+            for task in stages:
+                task.cancel()
+            await asyncio.gather(*stages, return_exceptions=True)
+            self._cancel_queued_transcriptions()
+            self._cancel_speculations()
+            self.release()
+
+    async def _read(self) -> None:
+        if not self._superseded:
+            self._reading = True
+            try:
+                await self._read_chunks()
+            except asyncio.CancelledError:
+                if not self._superseded:
+                    raise
+            self._reading = False
+        self._detached = True
+        await self._chunks.put(None)
+
+    async def _read_chunks(self) -> None:
+        log = self._log
+        sequence = self._first_chunk - 1
+        while True:
+            try:
+                message = await self._websocket.receive()
+            except WebSocketDisconnect:
+                break
+            if message.get("type") == "websocket.disconnect":
+                break
+
+            data: bytes | None = None
+            if message.get("bytes") is not None:
+                data = message["bytes"]
+            elif message.get("text") is not None:
+                data = message["text"].encode("utf-8")
+
+            if not data:
+                continue
+            sequence += 1
+            if log is not None and log.duplicate(sequence):
+                continue
+            await self._inbound.consume(len(data))
+            if self._audio_spool is not None:
+                try:
+                    await self._audio_spool.append(self._session_id, data)
+                except LookupError:
+                    # No such session: keep nothing of it and stop reading.
+                    break
+            await self._chunks.put((sequence, data))
+            if log is not None:
+                log.acknowledge(sequence)
+
+    async def _transcribe(self) -> None:
+        segmenter = self._segmenter_factory() if self._segmenter_factory is not None else None
+        slots = self._transcription_slots
+        sequence = 0
+        while True:
+            # Hold a transcription slot before taking a chunk, so chunks wait
+            # in the bounded queue rather than in this stage.
+            await slots.acquire()
+            if segmenter is not None and segmenter.pending:
+                try:
+                    item = await asyncio.wait_for(self._chunks.get(), self._segment_flush_timeout)
+                except asyncio.TimeoutError:
+                    # The speaker stopped mid-utterance; don't hold it back forever.
+                    slots.release()
+                    for segment in segmenter.flush():
+                        sequence += 1
+                        await self._submit(sequence, segment)
+                    continue
+            else:
+                item = await self._chunks.get()
+            if item is None:
+                slots.release()
+                break
+            _, data = item
+            segments = segmenter.feed(data) if segmenter is not None else [data]
+            for index, segment in enumerate(segments):
+                sequence += 1
+                await self._submit(sequence, segment, holding_slot=index == 0)
+            if not segments:
+                slots.release()
+        if segmenter is not None:
+            for segment in segmenter.flush():
+                sequence += 1
+                await self._submit(sequence, segment)
+        await self._transcripts.put(None)
+
+    async def _submit(self, sequence: int, data: bytes, *, holding_slot: bool = False) -> None:
+        if not holding_slot:
+            await self._transcription_slots.acquire()
+        task = asyncio.create_task(self._transcribe_chunk(data))
+        # A callback also frees the slot of a task cancelled before it started.
+        task.add_done_callback(lambda _: self._transcription_slots.release())
+        await self._transcripts.put((sequence, task))
+
+    async def _transcribe_chunk(self, data: bytes) -> str:
+        async with self._transcription_stage:
+            with _TRANSCRIBE_SECONDS.time():
+                return await self._transcriber.transcribe_chunk(data)
+
+    async def _respond(self) -> None:
+        completed = await self._respond_in_order()
+        if self._synthesizer is not None:
+            # Let queued speech reach the client before announcing completion.
+            await self._speech.put(None)
+            await self._speech.join()
+        if completed:
+            await self._send_json({"type": "complete"})
+
+    async def _respond_in_order(self) -> bool:
+        """Reply to transcripts in chunk order; return ``True`` once the conversation ends."""
+
+        session_id = self._session_id
+        if self._speculate and await self._load_conversation():
+            self._start_speculation(self._orchestrator.upcoming_question(session_id))
+        while True:
+            item = await self._transcripts.get()
+            if item is None:
+                return False
+            _, task = item
+            transcript = await task
+
+            async with self._session_factory() as db_session:
+                service = SessionService(db_session, self._orchestrator, self._writer)
+                if not await service.load_conversation(session_id):
+                    return True
+                # Recording the answer starts the next question generating.
+                await service.append_user_message(session_id, transcript)
+            await self._send_json({"type": "transcript", "text": transcript})
+
+            # No database session is open while a model may be generating.
+            with _NEXT_QUESTION_SECONDS.time():
+                next_question = await self._orchestrator.ask_next_question(session_id)
+            if not next_question:
+                return True
+            async with self._session_factory() as db_session:
+                service = SessionService(db_session, self._orchestrator, self._writer)
+                await service.append_assistant_message(session_id, next_question)
+            await self._send_json({"type": "question", "text": next_question})
+            if self._synthesizer is not None:
+                speculation = self._speculations.pop(next_question, None)
+                # Whatever else was rendered ahead belongs to a path not taken.
+                self._cancel_speculations()
+                await self._speech.put((next_question, speculation))
+                if self._speculate:
+                    self._start_speculation(self._orchestrator.upcoming_question(session_id))
+
+    async def _load_conversation(self) -> bool:
+        async with self._session_factory() as db_session:
+            service = SessionService(db_session, self._orchestrator, self._writer)
+            return await service.load_conversation(self._session_id)
+
+    async def _synthesize(self) -> None:
+        assert self._synthesizer is not None
+        while True:
+            item = await self._speech.get()
+            try:
+                if item is None:
+                    return
+                text, speculation = item
+                with _SYNTHESIZE_SECONDS.time():
+                    if speculation is not None:
+                        try:
+                            audio = await speculation
+                        except Exception:
+                            speculation = None
+                        else:
+                            for frame in iter_frames(audio, self._frame_size):
+                                await self._send_bytes(frame)
+                    if speculation is None:
+                        async with self._synthesis_stage:
+                            async for frame in synthesize_frames(self._synthesizer, text, self._frame_size):
+                                await self._send_bytes(frame)
+                await self._send_json({"type": "audio_end", "text": text})
+            finally:
+                self._speech.task_done()
+
+    async def _send_json(self, payload: Dict[str, str]) -> None:
+        event = self._log.record(payload) if self._log is not None else payload
+        if not self._detached:
+            with _SEND_SECONDS.time():
+                await self._send_resumable(self._websocket.send_json(event))
+
+    async def _send_bytes(self, frame: AudioBuffer) -> None:
+        if not self._detached:
+            # Frames may be views of cached or mmap'd audio; ASGI needs bytes.
+            data = frame if isinstance(frame, bytes) else bytes(frame)
+            with _SEND_SECONDS.time():
+                await self._send_resumable(self._websocket.send_bytes(data))
+
+    async def _send_resumable(self, send: Awaitable[None]) -> None:
+        try:
+            await send
+        except (WebSocketDisconnect, RuntimeError, OSError):
+            # The client dropped; the rest of this stream only reaches the
+            # database (and the log, if there is one).
+            self._detached = True
+
+    def _start_speculation(self, text: Optional[str]) -> None:
+        if not text or text in self._speculations or self._synthesizer is None:
+            return
+        if self._synthesis_stage.saturated:
+            # Speculative audio is the first work to shed under load.
+            return
+        if isinstance(self._synthesizer, CachingSynthesizer):
+            # Cached audio may be an mmap view; keep it without copying.
+            render = self._synthesizer.synthesize_view(text)
+        else:
+            render = self._synthesizer.synthesize(text)
+        self._speculations[text] = asyncio.create_task(render)
+
+    def _cancel_speculations(self) -> None:
+        for task in self._speculations.values():
+            task.cancel()
+        self._speculations.clear()
+
+    def _cancel_queued_transcriptions(self) -> None:
+        while not self._transcripts.empty():
+            item = self._transcripts.get_nowait()
+            if item is not None:
+                item[1].cancel()
+
+
+__all__ = ["StreamPipeline"]
@@ -0,0 +1,28 @@
+"""Compact in-process records for data read from trusted sources.
+
+Rows coming out of the database or the conversation store are already
+valid, so the service and orchestrator layers pass them around as plain
+named tuples instead of validated pydantic models.
+"""
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+
+class MessageRecord(NamedTuple):
+    role: str
+    content: str
+    created_at: datetime
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"role": self.role, "content": self.content, "created_at": self.created_at}
+
+
+# Last message covered by a rolling summary, as ``(created_at, message id)``.
+# Watermarks written before ids were recorded carry ``None`` and cover every
+# message up to and including ``created_at``.
+SummaryWatermark = Tuple[datetime, Optional[int]]
+
+
+__all__ = ["MessageRecord", "SummaryWatermark"]
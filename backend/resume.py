@@ -0,0 +1,201 @@
+"""Replay of recent stream events for clients reconnecting to a session.
+
+Every JSON event the stream WebSocket sends is numbered with a per-session
+``seq`` and kept in a bounded :class:`StreamLog`, together with the number of
+audio chunks received so far and the random ``log`` id of the log that
+numbered it. A client that loses its connection reconnects with that log id,
+the last ``seq`` it saw and the number of its next chunk; it is sent only
+the events it missed, and chunks it sends again that were already received
+are dropped instead of being transcribed twice. Nothing is read from the
+database to resume.
+
+Spoken audio frames are not numbered or kept; a replayed ``audio_end``
+still carries the question's text. Logs live in the memory of the process
+serving the stream. A client resuming on another worker, or after its log
+was evicted, names a log id that is not the current one: it is told that
+events are missing, its chunks are numbered after the last one the current
+log received, and it reloads the session and continues with the new log's
+numbers.
+"""
+from __future__ import annotations
+
+import asyncio
+import uuid
+from collections import OrderedDict, deque
+from functools import partial
+from itertools import islice
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from .metrics import REGISTRY
+
+_RESUMES = REGISTRY.counter(
+    "mindful_stream_resumes_total", "Stream reconnections that resumed from a sequence number.", ("outcome",)
+)
+_REPLAYED = REGISTRY.counter("mindful_stream_replayed_events_total", "Events sent again to resuming clients.").labels()
+_DUPLICATE_CHUNKS = REGISTRY.counter(
+    "mindful_stream_duplicate_chunks_total", "Audio chunks sent again by resuming clients and dropped."
+).labels()
+
+
+class StreamLog:
+    """Recent outbound events and received chunks of one stream session.
+
+    ``id`` is random, so numbers handed out by a log that this one replaced
+    are never taken for its own. ``last_seq`` is the number of the latest
+    event and ``received`` that of the latest chunk accepted. Only the last
+    ``size`` events are kept. ``on_record`` is called for every event.
+    """
+
+    def __init__(self, size: int = 64, on_record: Optional[Callable[[], None]] = None) -> None:
+        self._events: Deque[Dict[str, Any]] = deque(maxlen=max(1, size))
+        self._on_record = on_record
+        self.id = uuid.uuid4().hex
+        self.last_seq = 0
+        self.received = 0
+        self._takeover: Optional[Callable[[], None]] = None
+        self._released = asyncio.Event()
+        self._released.set()
+
+    @property
+    def attached(self) -> bool:
+        return self._takeover is not None
+
+    def record(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Number ``payload`` and keep it; return the event to send."""
+
+        self.last_seq += 1
+        event = {**payload, "log": self.id, "seq": self.last_seq, "chunk": self.received}
+        self._events.append(event)
+        if self._on_record is not None:
+            self._on_record()
+        return event
+
+    def current(self, log_id: Optional[str]) -> bool:
+        """Whether numbers the client got from log ``log_id`` are this log's."""
+
+        return log_id == self.id
+
+    def since(self, seq: int, log_id: Optional[str]) -> Optional[List[Dict[str, Any]]]:
+        """Events after ``seq`` of log ``log_id``, or ``None`` when some of them are no longer kept."""
+
+        if not self.current(log_id) or seq > self.last_seq:
+            # Numbered by a log this one replaced.
+            return None
+        if seq == self.last_seq:
+            return []
+        if not self._events or self._events[0]["seq"] > seq + 1:
+            return None
+        return [event for event in self._events if event["seq"] > seq]
+
+    def duplicate(self, chunk: int) -> bool:
+        """Whether chunk number ``chunk`` was received before."""
+
+        if chunk <= self.received:
+            _DUPLICATE_CHUNKS.inc()
+            return True
+        return False
+
+    def acknowledge(self, chunk: int) -> None:
+        """Record chunk number ``chunk`` as received; later events report it."""
+
+        self.received = max(self.received, chunk)
+
+    async def attach(self, takeover: Callable[[], None], timeout: float) -> bool:
+        """Make the caller the session's stream, once any previous one has let go.
+
+        A stream still attached, typically one whose client vanished without
+        closing the socket, has its ``takeover`` callback called and is
+        given ``timeout`` seconds to finish the replies it has started, so
+        they are in the log before it is replayed. Returns ``False`` if it
+        did not finish in time.
+        """
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while self._takeover is not None:
+            self._takeover()
+            try:
+                await asyncio.wait_for(self._released.wait(), max(deadline - loop.time(), 0))
+            except asyncio.TimeoutError:
+                return False
+        self._takeover = takeover
+        self._released.clear()
+        return True
+
+    def detach(self) -> None:
+        self._takeover = None
+        self._released.set()
+
+
+class ResumeCache:
+    """Stream logs of up to ``max_sessions`` sessions, least recently used evicted first.
+
+    A log is used when it is opened and whenever it records an event. Logs
+    attached to a stream are never evicted, so the cache may briefly hold
+    more than ``max_sessions`` when that many sessions are streaming.
+    """
+
+    def __init__(self, *, history_size: int = 64, max_sessions: int = 10000) -> None:
+        self._history_size = history_size
+        self._max_sessions = max(1, max_sessions)
+        self._logs: "OrderedDict[int, StreamLog]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._logs)
+
+    def open(self, session_id: int) -> StreamLog:
+        """The log of ``session_id``, started empty if there is none."""
+
+        log = self._logs.get(session_id)
+        if log is not None:
+            self._logs.move_to_end(session_id)
+            return log
+        log = self._logs[session_id] = StreamLog(self._history_size, partial(self._touch, session_id))
+        excess = len(self._logs) - self._max_sessions
+        if excess > 0:
+            idle = (
+                other
+                for other, other_log in self._logs.items()
+                if other != session_id and not other_log.attached
+            )
+            for other in list(islice(idle, excess)):
+                del self._logs[other]
+        return log
+
+    def get(self, session_id: int) -> Optional[StreamLog]:
+        return self._logs.get(session_id)
+
+    def discard(self, session_id: int) -> None:
+        self._logs.pop(session_id, None)
+
+    def _touch(self, session_id: int) -> None:
+        if session_id in self._logs:
+            self._logs.move_to_end(session_id)
+
+
+def resume_events(log: StreamLog, log_id: Optional[str], last_seq: int) -> List[Dict[str, Any]]:
+    """Messages bringing a client that last saw ``last_seq`` of log ``log_id`` up to date.
+
+    A ``resumed`` message comes first with the current ``log`` id and
+    ``seq``, the last ``chunk`` received and whether events are ``missing``.
+    The missed events follow unless some are gone, in which case the client
+    should reload the session instead and number what it sends from then on
+    after the ``chunk`` of this message.
+    """
+
+    events = log.since(last_seq, log_id)
+    _RESUMES.labels("missing" if events is None else "replayed").inc()
+    header = {
+        "type": "resumed",
+        "log": log.id,
+        "seq": log.last_seq,
+        "chunk": log.received,
+        "missing": events is None,
+    }
+    if not events:
+        return [header]
+    _REPLAYED.inc(len(events))
+    return [header, *events]
+
+
+__all__ = ["ResumeCache", "StreamLog", "resume_events"]
@@ -0,0 +1,321 @@
+"""Compaction of finished sessions' messages and retention of old sessions.
+
+Messages of a session that ended more than ``archive_after`` ago, and whose
+journal entry has been written, are moved out of ``messages`` into one
+zlib-compressed ``message_archives`` row. This keeps the table and indexes
+that every new message is inserted into proportional to recent activity
+rather than to the whole history. :meth:`SessionService.fetch_messages
+<backend.services.SessionService.fetch_messages>` and the bulk export read
+archives transparently. Archived messages leave the full-text message index
+with their rows, so transcript search stops finding them; journal entries
+stay searchable. Archiving is therefore off unless
+``message_archive_after_days`` is set.
+
+Sessions that ended more than ``retention`` ago are deleted with everything
+that belongs to them. Freed pages are returned to the file system a bounded
+number at a time with ``PRAGMA incremental_vacuum``, so the database file
+stops growing once retention is reached. Databases created before
+incremental vacuum was enabled need one full ``VACUUM`` to switch over,
+which the command below runs on every shard::
+
+    python -m backend.retention --vacuum
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import zlib
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .audio_spool import AudioSpool
+from .metrics import REGISTRY
+from .models import Message, MessageArchive, Session
+from .records import MessageRecord, SummaryWatermark
+from .responses import dumps
+
+logger = logging.getLogger(__name__)
+
+ArchivedMessage = Tuple[int, str, str, datetime]
+
+_SESSIONS = REGISTRY.counter(
+    "mindful_retention_sessions_total",
+    "Finished sessions compacted or deleted by the retention job.",
+    ("action",),
+)
+_ARCHIVED_SESSIONS = _SESSIONS.labels("archived")
+_DELETED_SESSIONS = _SESSIONS.labels("deleted")
+_ARCHIVED_MESSAGES = REGISTRY.counter(
+    "mindful_retention_archived_messages_total", "Messages moved into compressed archives."
+).labels()
+_VACUUMED_PAGES = REGISTRY.counter(
+    "mindful_retention_vacuumed_pages_total", "Database pages released by incremental vacuum."
+).labels()
+
+
+def pack_messages(rows: Sequence[ArchivedMessage]) -> bytes:
+    """Compress ``(id, role, content, created_at)`` rows into an archive payload."""
+
+    return zlib.compress(dumps([list(row) for row in rows]), 6)
+
+
+def unpack_messages(payload: bytes) -> List[ArchivedMessage]:
+    return [
+        (message_id, role, content, datetime.fromisoformat(created_at))
+        for message_id, role, content, created_at in json.loads(zlib.decompress(payload))
+    ]
+
+
+def archived_records(payload: bytes, since: SummaryWatermark | None = None) -> List[MessageRecord]:
+    """Return the archived messages after the ``since`` watermark in conversation order."""
+
+    rows = sorted(unpack_messages(payload), key=lambda row: (row[3], row[0]))
+    return [
+        MessageRecord(role, content, created_at)
+        for message_id, role, content, created_at in rows
+        if since is None or _after(since, created_at, message_id)
+    ]
+
+
+def _after(since: SummaryWatermark, created_at: datetime, message_id: int) -> bool:
+    watermark, watermark_id = since
+    if watermark_id is None:
+        return created_at > watermark
+    return (created_at, message_id) > (watermark, watermark_id)
+
+
+@dataclass
+class RetentionResult:
+    archived_sessions: int = 0
+    archived_messages: int = 0
+    deleted_sessions: int = 0
+    vacuumed_pages: int = 0
+
+
+class SessionCompactor:
+    """Periodically archive, expire and vacuum finished sessions.
+
+    Each step works through at most ``batch_size`` sessions per transaction,
+    so the single SQLite write connection is never held for long and live
+    message inserts interleave with a large backlog.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], AsyncSession],
+        audio_spool: Optional[AudioSpool] = None,
+        *,
+        archive_after: Optional[timedelta] = None,
+        retention: Optional[timedelta] = None,
+        batch_size: int = 50,
+        vacuum_pages: int = 2000,
+        interval: float = 3600.0,
+        clock: Callable[[], datetime] = datetime.utcnow,
+    ) -> None:
+        self._session_factory = session_factory
+        self._audio_spool = audio_spool
+        self._archive_after = archive_after
+        self._retention = retention
+        self._batch_size = max(1, batch_size)
+        self._vacuum_pages = vacuum_pages
+        self._interval = interval
+        self._clock = clock
+        self._task: Optional[asyncio.Task[None]] = None
+        self._warned_auto_vacuum = False
+
+    async def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def maintain(self, now: Optional[datetime] = None) -> RetentionResult:
+        """Delete expired sessions, archive old ones, then release free pages."""
+
+        now = now or self._clock()
+        result = RetentionResult()
+        if self._retention is not None:
+            result.deleted_sessions = await self._delete_expired(now - self._retention)
+        if self._archive_after is not None:
+            result.archived_sessions, result.archived_messages = await self._archive(now - self._archive_after)
+        if self._vacuum_pages > 0:
+            result.vacuumed_pages = await self._vacuum()
+        return result
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self._interval)
+            try:
+                result = await self.maintain()
+            except Exception:  # pragma: no cover - depends on the database
+                logger.exception("Session retention pass failed")
+            else:
+                if result.archived_sessions or result.deleted_sessions:
+                    logger.info(
+                        "Archived %d sessions (%d messages), deleted %d, vacuumed %d pages",
+                        result.archived_sessions,
+                        result.archived_messages,
+                        result.deleted_sessions,
+                        result.vacuumed_pages,
+                    )
+
+    async def _delete_expired(self, cutoff: datetime) -> int:
+        stmt = (
+            select(Session.id)
+            .where(Session.ended_at.is_not(None), Session.ended_at < cutoff)
+            .order_by(Session.id)
+            .limit(self._batch_size)
+        )
+        deleted = 0
+        while True:
+            async with self._session_factory() as session:
+                expired = list((await session.execute(stmt)).scalars())
+            if not expired:
+                return deleted
+            if self._audio_spool is not None:
+                await self._audio_spool.remove(expired)
+            async with self._session_factory() as session:
+                # Messages, archives, summaries and audio index rows cascade.
+                await session.execute(delete(Session).where(Session.id.in_(expired)))
+                await session.commit()
+            deleted += len(expired)
+            _DELETED_SESSIONS.inc(len(expired))
+
+    async def _archive(self, cutoff: datetime) -> Tuple[int, int]:
+        candidates = (
+            select(Session.id)
+            .where(
+                Session.ended_at.is_not(None),
+                Session.ended_at < cutoff,
+                Session.summary_status == "ready",
+                select(Message.id).where(Message.session_id == Session.id).exists(),
+            )
+            .order_by(Session.id)
+            .limit(self._batch_size)
+        )
+        sessions = messages = 0
+        while True:
+            async with self._session_factory() as session:
+                session_ids = list((await session.execute(candidates)).scalars())
+                if not session_ids:
+                    return sessions, messages
+                rows = (
+                    await session.execute(
+                        select(Message.session_id, Message.id, Message.role, Message.content, Message.created_at)
+                        .where(Message.session_id.in_(session_ids))
+                        .order_by(Message.session_id, Message.id)
+                    )
+                ).all()
+                grouped: Dict[int, List[ArchivedMessage]] = {}
+                for row in rows:
+                    grouped.setdefault(row.session_id, []).append((row.id, row.role, row.content, row.created_at))
+                await session.execute(
+                    insert(MessageArchive),
+                    [
+                        {"session_id": session_id, "message_count": len(items), "payload": pack_messages(items)}
+                        for session_id, items in grouped.items()
+                    ],
+                )
+                await session.execute(delete(Message).where(Message.session_id.in_(list(grouped))))
+                await session.commit()
+            sessions += len(grouped)
+            messages += len(rows)
+            _ARCHIVED_SESSIONS.inc(len(grouped))
+            _ARCHIVED_MESSAGES.inc(len(rows))
+
+    async def _vacuum(self) -> int:
+        async with self._session_factory() as session:
+            connection = await session.connection()
+            if connection.dialect.name != "sqlite":
+                return 0
+            if (await connection.exec_driver_sql("PRAGMA auto_vacuum")).scalar() != 2:
+                if not self._warned_auto_vacuum:
+                    logger.warning("Incremental vacuum is off; run 'python -m backend.retention --vacuum' once")
+                    self._warned_auto_vacuum = True
+                return 0
+            before = (await connection.exec_driver_sql("PRAGMA freelist_count")).scalar()
+            # Run as a script: a plain execute steps the pragma once and frees one page.
+            raw = await connection.get_raw_connection()
+            await raw.driver_connection.executescript(f"PRAGMA incremental_vacuum({int(self._vacuum_pages)});")
+            after = (await connection.exec_driver_sql("PRAGMA freelist_count")).scalar()
+            await session.commit()
+        _VACUUMED_PAGES.inc(before - after)
+        return before - after
+
+
+async def _maintain(args: argparse.Namespace) -> Optional[List[RetentionResult]]:
+    from .config import get_settings
+    from .database import dispose_engines, get_router
+
+    settings = get_settings()
+    router = get_router()
+    try:
+        if args.vacuum:
+            for shard in router.shards:
+                async with router.write_engine(shard).connect() as connection:
+                    connection = await connection.execution_options(isolation_level="AUTOCOMMIT")
+                    await connection.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+                    await connection.exec_driver_sql("VACUUM")
+            return None
+        results = []
+        for shard in router.shards:
+            session_factory = router.session_factory(shard)
+            audio_spool = AudioSpool(settings.audio_spool_dir, session_factory) if settings.audio_spool_dir else None
+            compactor = SessionCompactor(
+                session_factory,
+                audio_spool,
+                archive_after=timedelta(days=settings.message_archive_after_days)
+                if settings.message_archive_after_days
+                else None,
+                retention=timedelta(days=settings.session_retention_days)
+                if settings.session_retention_days
+                else None,
+                batch_size=settings.retention_batch_size,
+                vacuum_pages=settings.sqlite_incremental_vacuum_pages,
+            )
+            results.append(await compactor.maintain())
+        return results
+    finally:
+        await dispose_engines()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Archive, expire and vacuum finished sessions.")
+    parser.add_argument(
+        "--vacuum",
+        action="store_true",
+        help="rebuild the database once with incremental vacuum enabled instead of running a pass",
+    )
+    args = parser.parse_args(argv)
+    results = asyncio.run(_maintain(args))
+    for result in results or ():
+        print(result)
+
+
+__all__ = [
+    "ArchivedMessage",
+    "RetentionResult",
+    "SessionCompactor",
+    "pack_messages",
+    "unpack_messages",
+    "archived_records",
+    "main",
+]
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""Central scheduler that ends sessions once their time is up."""
+from __future__ import annotations
+
+import asyncio
+import heapq
+import logging
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+ExpireCallback = Callable[[List[int]], Awaitable[None]]
+
+
+class ExpiryFailed(Exception):
+    """Raised by an expire callback when only ``session_ids`` failed to expire."""
+
+    def __init__(self, session_ids: List[int]) -> None:
+        super().__init__(f"Failed to expire {len(session_ids)} sessions")
+        self.session_ids = session_ids
+
+
+class SessionExpiryScheduler:
+    """Track session deadlines in one heap served by a single task.
+
+    Scheduling and cancelling are O(log n) and O(1) respectively; cancelled
+    entries are dropped lazily when they reach the top of the heap, and the
+    heap is rebuilt once stale entries outnumber live ones. Due sessions are
+    handed to ``expire`` in groups of at most ``batch_size`` so they can share
+    a database transaction.
+
+    Sessions whose expiry fails are scheduled again ``retry_delay`` seconds
+    later, doubling with every consecutive failure up to ``max_retry_delay``.
+    A callback that raises :class:`ExpiryFailed` has only the sessions it
+    names retried; any other exception retries the whole group.
+    """
+
+    def __init__(
+        self,
+        expire: ExpireCallback,
+        *,
+        batch_size: int = 256,
+        retry_delay: float = 5.0,
+        max_retry_delay: float = 300.0,
+        clock: Callable[[], datetime] = datetime.utcnow,
+    ) -> None:
+        self._expire = expire
+        self._batch_size = max(1, batch_size)
+        self._retry_delay = retry_delay
+        self._max_retry_delay = max_retry_delay
+        self._failures = 0
+        self._clock = clock
+        self._heap: List[Tuple[datetime, int]] = []
+        self._deadlines: Dict[int, datetime] = {}
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task[None]] = None
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def schedule(self, session_id: int, deadline: datetime) -> None:
+        self._deadlines[session_id] = deadline
+        heapq.heappush(self._heap, (deadline, session_id))
+        if self._heap[0] == (deadline, session_id):
+            self._wakeup.set()
+
+    def schedule_many(self, entries: Iterable[Tuple[int, datetime]]) -> None:
+        for session_id, deadline in entries:
+            self._deadlines[session_id] = deadline
+        self._rebuild()
+        self._wakeup.set()
+
+    def cancel(self, session_id: int) -> bool:
+        if self._deadlines.pop(session_id, None) is None:
+            return False
+        if len(self._heap) > 2 * len(self._deadlines) + 64:
+            self._rebuild()
+        return True
+
+    async def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def _rebuild(self) -> None:
+        self._heap = [(deadline, session_id) for session_id, deadline in self._deadlines.items()]
+        heapq.heapify(self._heap)
+
+    def _next_delay(self) -> float | None:
+        while self._heap:
+            deadline, session_id = self._heap[0]
+            if self._deadlines.get(session_id) == deadline:
+                return max((deadline - self._clock()).total_seconds(), 0.0)
+            heapq.heappop(self._heap)
+        return None
+
+    def _pop_due(self) -> List[int]:
+        now = self._clock()
+        due: List[int] = []
+        while self._heap and len(due) < self._batch_size:
+            deadline, session_id = self._heap[0]
+            if self._deadlines.get(session_id) != deadline:
+                heapq.heappop(self._heap)
+                continue
+            if deadline > now:
+                break
+            heapq.heappop(self._heap)
+            del self._deadlines[session_id]
+            due.append(session_id)
+        return due
+
+    async def _run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            delay = self._next_delay()
+            if delay is None or delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            due = self._pop_due()
+            if not due:
+                continue
+            try:
+                await self._expire(due)
+            except ExpiryFailed as exc:  # pragma: no cover - depends on the database
+                logger.exception("Failed to expire %d of %d sessions", len(exc.session_ids), len(due))
+                self._retry(exc.session_ids)
+            except Exception:  # pragma: no cover - depends on the database
+                logger.exception("Failed to expire %d sessions", len(due))
+                self._retry(due)
+            else:
+                self._failures = 0
+
+    def _retry(self, session_ids: List[int]) -> None:
+        self._failures += 1
+        delay = min(self._retry_delay * 2 ** (self._failures - 1), self._max_retry_delay)
+        deadline = self._clock() + timedelta(seconds=delay)
+        for session_id in session_ids:
+            # Rescheduled while it was being expired: the new deadline stands.
+            if session_id not in self._deadlines:
+                self.schedule(session_id, deadline)
+
+
+__all__ = ["ExpiryFailed", "SessionExpiryScheduler"]
@@ -2,7 +2,7 @@
 from __future__ import annotations
 
 from datetime import datetime
-from typing import List
+from typing import List, Optional
 
 from pydantic import BaseModel
 
@@ -24,6 +24,7 @@ class SessionStartResponse(BaseModel):
 class SessionEndResponse(BaseModel):
     session_id: int
     ended_at: datetime
+    summary_status: str = "pending"
 
 
 class SummarySchema(BaseModel):
@@ -36,8 +37,58 @@ class SummarySchema(BaseModel):
         orm_mode = True
 
 
+class JournalListItem(BaseModel):
+    session_id: int
+    started_at: datetime
+    created_at: datetime
+    preview: str
+
+
 class JournalListResponse(BaseModel):
-    entries: List[SummarySchema]
+    entries: List[JournalListItem]
+    next_cursor: Optional[str] = None
+
+
+class JournalSearchHit(BaseModel):
+    session_id: int
+    source: str
+    created_at: datetime
+    snippet: str
+    score: float
+
+
+class JournalSearchResponse(BaseModel):
+    results: List[JournalSearchHit]
+    next_cursor: Optional[str] = None
+
+
+class InsightTheme(BaseModel):
+    term: str
+    sessions: int
+    score: float
+
+
+class SimilarSession(BaseModel):
+    session_id: int
+    score: float
+    created_at: datetime
+
+
+class TermTrend(BaseModel):
+    term: str
+    delta: float
+
+
+class InsightTrends(BaseModel):
+    rising: List[TermTrend]
+    falling: List[TermTrend]
+
+
+class JournalInsightsResponse(BaseModel):
+    sessions: int
+    themes: List[InsightTheme]
+    similar_sessions: List[SimilarSession]
+    trends: InsightTrends
 
 
 class JournalDetailResponse(BaseModel):
@@ -52,6 +103,14 @@ __all__ = [
     "SessionStartResponse",
     "SessionEndResponse",
     "SummarySchema",
+    "JournalListItem",
     "JournalListResponse",
+    "JournalSearchHit",
+    "JournalSearchResponse",
+    "InsightTheme",
+    "SimilarSession",
+    "TermTrend",
+    "InsightTrends",
+    "JournalInsightsResponse",
     "JournalDetailResponse",
 ]
@@ -0,0 +1,199 @@
+"""SQLite FTS5 full-text index over journal entries and transcripts.
+
+Both indexes are external-content FTS5 tables: they store only the inverted
+index and read the text back from ``session_summaries`` and ``messages``.
+Triggers keep them in step with every insert, update and delete, including
+the batched inserts of the message writer.
+
+Databases created before the index existed can be backfilled with::
+
+    python -m backend.search --rebuild
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import DateTime, Float, Integer, String, bindparam, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.sql.selectable import TextualSelect
+
+SNIPPET_OPEN = "<mark>"
+SNIPPET_CLOSE = "</mark>"
+SNIPPET_TOKENS = 12
+
+
+@dataclass(frozen=True)
+class _IndexedTable:
+    source: str
+    table: str
+    index: str
+    columns: Tuple[str, ...]
+
+
+# Ordered by source name, which is the tie-breaker of the result order.
+SEARCH_SOURCES: Tuple[_IndexedTable, ...] = (
+    _IndexedTable("journal", "session_summaries", "session_summaries_fts", ("journal_entry", "recommendations")),
+    _IndexedTable("message", "messages", "messages_fts", ("content",)),
+)
+
+
+def _index_ddl(spec: _IndexedTable) -> List[str]:
+    columns = ", ".join(spec.columns)
+    new_values = ", ".join(f"new.{column}" for column in spec.columns)
+    old_values = ", ".join(f"old.{column}" for column in spec.columns)
+    insert = f"INSERT INTO {spec.index}(rowid, {columns}) VALUES (new.id, {new_values});"
+    delete = (
+        f"INSERT INTO {spec.index}({spec.index}, rowid, {columns}) "
+        f"VALUES ('delete', old.id, {old_values});"
+    )
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {spec.index} USING fts5("
+        f"{columns}, content='{spec.table}', content_rowid='id', tokenize='porter unicode61')",
+        f"CREATE TRIGGER IF NOT EXISTS {spec.index}_ai AFTER INSERT ON {spec.table} BEGIN {insert} END",
+        f"CREATE TRIGGER IF NOT EXISTS {spec.index}_ad AFTER DELETE ON {spec.table} BEGIN {delete} END",
+        f"CREATE TRIGGER IF NOT EXISTS {spec.index}_au AFTER UPDATE OF {columns} ON {spec.table} "
+        f"BEGIN {delete} {insert} END",
+    ]
+
+
+def search_index_ddl() -> List[str]:
+    """Return the statements that create every index and its triggers."""
+
+    return [statement for spec in SEARCH_SOURCES for statement in _index_ddl(spec)]
+
+
+def install_search_index(connection: Connection) -> None:
+    """Create the FTS5 tables and their sync triggers if they are missing."""
+
+    if connection.dialect.name != "sqlite":
+        return
+    for statement in search_index_ddl():
+        connection.execute(text(statement))
+
+
+def rebuild_search_index(connection: Connection) -> None:
+    """Re-index every stored journal entry and message."""
+
+    for spec in SEARCH_SOURCES:
+        connection.execute(text(f"INSERT INTO {spec.index}({spec.index}) VALUES ('rebuild')"))
+
+
+def build_match_query(query: str) -> str:
+    """Turn free text into an FTS5 query matching every word.
+
+    Each word is quoted, so operators and punctuation typed by the user are
+    searched for literally instead of being parsed as FTS5 syntax. Raises
+    ``ValueError`` when ``query`` contains no words.
+    """
+
+    terms = [term.replace('"', '""') for term in query.split()]
+    if not terms:
+        raise ValueError("Search query is empty")
+    return " ".join(f'"{term}"' for term in terms)
+
+
+def search_statement(
+    spec: _IndexedTable,
+    *,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    after: bool = False,
+) -> TextualSelect:
+    """Return the ranked query for one index.
+
+    Rows are ordered by ``(score, source, session_id, id)``, lower ``bm25``
+    scores being better matches; the session id keeps the key unique across
+    shards. With ``after`` the statement only returns rows past the
+    ``after_score``/``after_source``/``after_session_id``/``after_id`` key of
+    the previous page.
+    """
+
+    filters = []
+    if since is not None:
+        filters.append("AND t.created_at >= :since")
+    if until is not None:
+        filters.append("AND t.created_at < :until")
+    if after:
+        filters.append(
+            f"AND (bm25({spec.index}), '{spec.source}', t.session_id, t.id) "
+            "> (:after_score, :after_source, :after_session_id, :after_id)"
+        )
+    statement = text(
+        f"""
+        SELECT t.id AS id, t.session_id AS session_id, t.created_at AS created_at,
+               '{spec.source}' AS source,
+               bm25({spec.index}) AS score,
+               snippet({spec.index}, -1, :snippet_open, :snippet_close, '…', :snippet_tokens) AS snippet
+        FROM {spec.index}
+        JOIN {spec.table} AS t ON t.id = {spec.index}.rowid
+        WHERE {spec.index} MATCH :match
+        {' '.join(filters)}
+        ORDER BY score, t.session_id, t.id
+        LIMIT :limit
+        """
+    )
+    if since is not None:
+        statement = statement.bindparams(bindparam("since", type_=DateTime))
+    if until is not None:
+        statement = statement.bindparams(bindparam("until", type_=DateTime))
+    return statement.columns(
+        id=Integer,
+        session_id=Integer,
+        created_at=DateTime,
+        source=String,
+        score=Float,
+        snippet=String,
+    )
+
+
+def snippet_params() -> Dict[str, object]:
+    return {
+        "snippet_open": SNIPPET_OPEN,
+        "snippet_close": SNIPPET_CLOSE,
+        "snippet_tokens": SNIPPET_TOKENS,
+    }
+
+
+async def _rebuild() -> None:
+    from .database import dispose_engines, get_router
+
+    router = get_router()
+    for shard in router.shards:
+        async with router.write_engine(shard).begin() as connection:
+            await connection.run_sync(install_search_index)
+            await connection.run_sync(rebuild_search_index)
+    await dispose_engines()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Manage the journal full-text search index.")
+    parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="create the index if needed and re-index all stored journals and messages",
+    )
+    args = parser.parse_args(argv)
+    if not args.rebuild:
+        parser.print_help()
+        return
+    asyncio.run(_rebuild())
+
+
+__all__ = [
+    "SEARCH_SOURCES",
+    "search_index_ddl",
+    "install_search_index",
+    "rebuild_search_index",
+    "build_match_query",
+    "search_statement",
+    "snippet_params",
+    "main",
+]
+
+
+if __name__ == "__main__":
+    main()
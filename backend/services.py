@@ -2,25 +2,46 @@
 from __future__ import annotations
 
 from datetime import datetime
-from typing import List
+from typing import Any, Dict, Iterable, List, Sequence
 
-from sqlalchemy import select
+from sqlalchemy import delete, func, insert, select, tuple_, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from .models import Message, Session, SessionSummary
+from .metrics import QUERY_SECONDS, STAGE_SECONDS, timed
+from .models import PREVIEW_LENGTH, Message, MessageArchive, Session, SessionSummary, SummaryPart
 from .orchestrator import LLMOrchestrator
-from .schemas import MessageSchema
+from .pagination import decode_cursor, decode_search_cursor, encode_cursor, encode_search_cursor
+from .records import MessageRecord, SummaryWatermark
+from .retention import archived_records
+from .search import SEARCH_SOURCES, build_match_query, search_statement, snippet_params
+from .writer import MessageWriter
+
+_STORE_MESSAGE_SECONDS = STAGE_SECONDS.labels("store_message")
 
 
 class SessionService:
-    """High level session operations."""
+    """High level session operations.
+
+    When a :class:`~backend.writer.MessageWriter` is supplied, conversation
+    messages appended during a session are handed to it instead of being
+    flushed through ``session``. The writer is drained before this service
+    takes a write lock, because SQLite only admits one writer and the batch
+    commit would otherwise wait on our own open transaction.
+    """
 
-    def __init__(self, session: AsyncSession, orchestrator: LLMOrchestrator) -> None:
+    def __init__(
+        self,
+        session: AsyncSession,
+        orchestrator: LLMOrchestrator,
+        writer: MessageWriter | None = None,
+    ) -> None:
         self._session = session
         self._orchestrator = orchestrator
+        self._writer = writer
 
-    async def create_session(self) -> tuple[Session, str]:
-        instance = Session()
+    @timed(QUERY_SECONDS)
+    async def create_session(self, user_id: str | None = None) -> tuple[Session, str]:
+        instance = Session(user_id=user_id)
         self._session.add(instance)
         await self._session.flush()
         first_question = self._orchestrator.start_session(instance.id)
@@ -33,63 +54,408 @@ class SessionService:
         await self._session.flush()
         self._orchestrator.record_message(
             session_id,
-            MessageSchema(role=role, content=content, created_at=message.created_at),
+            MessageRecord(role, content, message.created_at),
         )
         return message
 
+    async def _enqueue_message(self, session_id: int, role: str, content: str) -> Message:
+        with _STORE_MESSAGE_SECONDS.time():
+            if self._writer is None:
+                return await self._store_message(session_id, role, content)
+            # Stamp the time now so ordering reflects the conversation, not the batch.
+            message = Message(session_id=session_id, role=role, content=content, created_at=datetime.utcnow())
+            self._orchestrator.record_message(
+                session_id,
+                MessageRecord(role, content, message.created_at),
+            )
+            await self._writer.submit(session_id, role, content, message.created_at)
+            return message
+
     async def append_user_message(self, session_id: int, content: str) -> Message:
-        return await self._store_message(session_id, "user", content)
+        return await self._enqueue_message(session_id, "user", content)
 
     async def append_assistant_message(self, session_id: int, content: str) -> Message:
-        return await self._store_message(session_id, "assistant", content)
+        return await self._enqueue_message(session_id, "assistant", content)
+
+    @timed(QUERY_SECONDS)
+    async def load_conversation(self, session_id: int) -> bool:
+        """Make sure the orchestrator holds state for an active session.
+
+        Returns ``False`` when the session does not exist or has already ended.
+        """
 
+        if self._orchestrator.has_session(session_id):
+            return True
+        await self._flush_writer()
+        instance = await self._session.get(Session, session_id, populate_existing=True)
+        if instance is None or instance.ended_at is not None:
+            return False
+        messages = await self.fetch_messages(session_id)
+        self._orchestrator.restore_session(session_id, messages)
+        return True
+
+    @timed(QUERY_SECONDS)
     async def end_session(self, session_id: int) -> Session:
+        await self._flush_writer()
         instance = await self._session.get(Session, session_id)
         if instance is None:
             raise ValueError("Session not found")
+        self._mark_ended(instance)
+        await self._session.flush()
+        return instance
+
+    @timed(QUERY_SECONDS)
+    async def expire_sessions(self, session_ids: Sequence[int]) -> List[int]:
+        """End a batch of sessions inside the caller's transaction.
+
+        Sessions that are unknown or already ended are skipped. Returns the ids
+        that were actually expired; their summaries are left pending.
+        """
+
+        await self._flush_writer()
+        stmt = select(Session).where(Session.id.in_(session_ids), Session.ended_at.is_(None))
+        result = await self._session.execute(stmt)
+        instances = list(result.scalars())
+        for instance in instances:
+            self._mark_ended(instance)
+        await self._session.flush()
+        return [instance.id for instance in instances]
+
+    @timed(QUERY_SECONDS)
+    async def fetch_active_sessions(self) -> List[tuple[int, datetime]]:
+        stmt = select(Session.id, Session.started_at).where(
+            Session.status == "active",
+            Session.ended_at.is_(None),
+        )
+        result = await self._session.execute(stmt)
+        return [(row.id, row.started_at) for row in result]
+
+    @timed(QUERY_SECONDS)
+    async def fetch_pending_summaries(self) -> List[int]:
+        """Sessions whose journal entry is still to be written, failed ones included."""
+
+        stmt = select(Session.id).where(Session.summary_status.in_(("pending", "failed")))
+        result = await self._session.execute(stmt)
+        return list(result.scalars())
+
+    @timed(QUERY_SECONDS)
+    async def fetch_summary_status(self, session_id: int) -> str | None:
+        stmt = select(Session.summary_status).where(Session.id == session_id)
+        result = await self._session.execute(stmt)
+        return result.scalar_one_or_none()
+
+    @timed(QUERY_SECONDS)
+    async def mark_summary_failed(self, session_id: int) -> None:
+        """Record that the journal entry could not be written, unless it was meanwhile."""
+
+        await self._session.execute(
+            update(Session)
+            .where(Session.id == session_id, Session.summary_status == "pending")
+            .values(summary_status="failed")
+        )
+
+    def _mark_ended(self, instance: Session) -> None:
         if instance.ended_at is None:
             instance.ended_at = datetime.utcnow()
             instance.status = "completed"
-        await self._session.flush()
-        return instance
+            if instance.summary_status != "ready":
+                instance.summary_status = "pending"
+        self._orchestrator.end_session(instance.id)
 
+    @timed(QUERY_SECONDS)
+    async def fetch_partial_summary(self, session_id: int) -> tuple[str, SummaryWatermark | None]:
+        stmt = select(Session.partial_summary, Session.summary_watermark, Session.summary_watermark_id).where(
+            Session.id == session_id
+        )
+        row = (await self._session.execute(stmt)).one_or_none()
+        if row is None:
+            return "", None
+        parts = await self._session.execute(
+            select(SummaryPart.text).where(SummaryPart.session_id == session_id).order_by(SummaryPart.id)
+        )
+        text = (row.partial_summary or "") + "".join(parts.scalars())
+        watermark = (row.summary_watermark, row.summary_watermark_id) if row.summary_watermark is not None else None
+        return text, watermark
+
+    @timed(QUERY_SECONDS)
+    async def save_partial_summaries(self, partials: Iterable[tuple[int, str, bool, datetime]]) -> None:
+        """Persist rolling summaries as ``(session_id, text, appended, watermark)`` tuples.
+
+        With ``appended`` the text continues the stored summary and is added
+        as one more part, so each piece of a long session is written once.
+        Otherwise it replaces the summary and its parts. The watermark id is
+        the newest message at or before ``watermark``, so the messages must
+        already be written.
+        """
+
+        appended: List[Dict[str, Any]] = []
+        for session_id, partial, append, watermark in partials:
+            if append:
+                if partial:
+                    appended.append({"session_id": session_id, "text": partial})
+                values: Dict[str, Any] = {}
+            else:
+                await self._session.execute(delete(SummaryPart).where(SummaryPart.session_id == session_id))
+                values = {"partial_summary": partial}
+            last_id = (
+                select(func.max(Message.id))
+                .where(Message.session_id == session_id, Message.created_at <= watermark)
+                .scalar_subquery()
+            )
+            await self._session.execute(
+                update(Session)
+                .where(Session.id == session_id)
+                .values(summary_watermark=watermark, summary_watermark_id=last_id, **values)
+            )
+        if appended:
+            await self._session.execute(insert(SummaryPart), appended)
+
+    @timed(QUERY_SECONDS)
     async def finalise_session(self, session_id: int) -> SessionSummary:
+        """Write the journal entry by merging the unsummarised tail into the partial.
+
+        Must run before anything else is read or written in the current
+        transaction: it drains the message writer to see the whole tail, and
+        the writer needs the database's only write connection to do so. The
+        transaction stays open while the entry is composed; callers that may
+        wait on a model use :meth:`fetch_summary_input` and
+        :meth:`save_summary` in two transactions instead.
+        """
+
+        pending = await self.fetch_summary_input(session_id)
+        if pending is None:
+            existing = await self.fetch_summary(session_id)
+            assert existing is not None
+            return existing
+        journal_entry, recommendations = await self._orchestrator.compose_summary(*pending)
+        return await self.save_summary(session_id, journal_entry, recommendations)
+
+    @timed(QUERY_SECONDS)
+    async def fetch_summary_input(self, session_id: int) -> tuple[str, List[MessageRecord]] | None:
+        """Return the partial summary and unsummarised tail, or ``None`` if the entry exists.
+
+        Drains the message writer first, so it must come before anything
+        else in the current transaction.
+        """
+
+        await self._flush_writer()
+        if await self.fetch_summary(session_id) is not None:
+            return None
+        partial, watermark = await self.fetch_partial_summary(session_id)
+        return partial, await self.fetch_messages(session_id, since=watermark)
+
+    @timed(QUERY_SECONDS)
+    async def save_summary(self, session_id: int, journal_entry: str, recommendations: str) -> SessionSummary:
+        """Store a composed journal entry unless one was written in the meantime."""
+
         existing = await self.fetch_summary(session_id)
         if existing is not None:
             return existing
-        messages = await self.fetch_messages(session_id)
-        journal_entry, recommendations = self._orchestrator.summarise(messages)
         summary = SessionSummary(
             session_id=session_id,
             journal_entry=journal_entry,
             recommendations=recommendations,
+            preview=journal_entry[:PREVIEW_LENGTH],
         )
         self._session.add(summary)
+        await self._session.execute(
+            update(Session).where(Session.id == session_id).values(summary_status="ready")
+        )
         await self._session.flush()
         return summary
 
-    async def fetch_messages(self, session_id: int) -> List[MessageSchema]:
+    @timed(QUERY_SECONDS)
+    async def fetch_messages(self, session_id: int, since: SummaryWatermark | None = None) -> List[MessageRecord]:
+        """Return the session's messages, only those after the ``since`` watermark if given."""
+
+        # Plain column tuples: no ORM identity map, no per-row model validation.
         stmt = (
-            select(Message)
+            select(Message.role, Message.content, Message.created_at)
             .where(Message.session_id == session_id)
-            .order_by(Message.created_at.asc())
+            .order_by(Message.created_at.asc(), Message.id.asc())
         )
+        if since is not None:
+            watermark, watermark_id = since
+            if watermark_id is None:
+                stmt = stmt.where(Message.created_at > watermark)
+            else:
+                stmt = stmt.where(tuple_(Message.created_at, Message.id) > tuple_(watermark, watermark_id))
         result = await self._session.execute(stmt)
-        records = [row[0] for row in result.fetchall()]
-        return [
-            MessageSchema(role=record.role, content=record.content, created_at=record.created_at)
-            for record in records
-        ]
-
-    async def fetch_summaries(self) -> List[SessionSummary]:
-        stmt = select(SessionSummary).order_by(SessionSummary.created_at.desc())
-        result = await self._session.execute(stmt)
-        return [row[0] for row in result.fetchall()]
+        messages = [MessageRecord._make(row) for row in result.tuples()]
+        if messages:
+            return messages
+        # Compaction moves all of a finished session's messages at once, so
+        # only a session without live rows can have an archive.
+        payload = (
+            await self._session.execute(
+                select(MessageArchive.payload).where(MessageArchive.session_id == session_id)
+            )
+        ).scalar_one_or_none()
+        return archived_records(payload, since) if payload is not None else []
+
+    async def _flush_writer(self) -> None:
+        if self._writer is not None:
+            await self._writer.flush()
+
+    @timed(QUERY_SECONDS)
+    async def fetch_summary_rows(
+        self, limit: int, cursor: str | None = None, user_id: str | None = None
+    ) -> List[Any]:
+        """Return up to ``limit + 1`` journal preview rows, newest first.
+
+        Pages are addressed by the ``(created_at, session_id)`` key of the last
+        row so each request is a bounded range scan on the composite index,
+        however many summaries exist. Raises ``ValueError`` for a malformed
+        cursor.
+        """
+
+        stmt = (
+            select(
+                SessionSummary.session_id,
+                SessionSummary.preview,
+                SessionSummary.created_at,
+                Session.started_at,
+            )
+            .join(Session, Session.id == SessionSummary.session_id)
+            .order_by(SessionSummary.created_at.desc(), SessionSummary.session_id.desc())
+            .limit(limit + 1)
+        )
+        if user_id is not None:
+            stmt = stmt.where(Session.user_id == user_id)
+        if cursor is not None:
+            created_at, session_id = decode_cursor(cursor)
+            stmt = stmt.where(
+                tuple_(SessionSummary.created_at, SessionSummary.session_id) < tuple_(created_at, session_id)
+            )
+        return list((await self._session.execute(stmt)).all())
+
+    async def fetch_summary_page(
+        self, limit: int, cursor: str | None = None, user_id: str | None = None
+    ) -> tuple[List[Dict[str, Any]], str | None]:
+        """Return one page of journal previews, newest first, and the next cursor."""
+
+        return summary_page(await self.fetch_summary_rows(limit, cursor, user_id), limit)
+
+    @timed(QUERY_SECONDS)
+    async def search_rows(
+        self,
+        query: str,
+        limit: int,
+        cursor: str | None = None,
+        since: datetime | None = None,
+        until: datetime | None = None,
+    ) -> List[Any]:
+        """Return up to ``limit + 1`` journal entries and messages matching ``query``.
+
+        Hits from both full-text indexes are ranked together by ``bm25``, best
+        first, and can be limited to ``since <= created_at < until``. Each
+        index returns at most one page past the cursor, so the cost is the
+        index lookup plus ``limit`` rows per source. Raises ``ValueError`` for
+        an empty query or a malformed cursor.
+        """
+
+        params = {"match": build_match_query(query), "limit": limit + 1, **snippet_params()}
+        if cursor is not None:
+            after_score, after_source, after_session_id, after_id = decode_search_cursor(cursor)
+            params.update(
+                after_score=after_score,
+                after_source=after_source,
+                after_session_id=after_session_id,
+                after_id=after_id,
+            )
+        if since is not None:
+            params["since"] = since
+        if until is not None:
+            params["until"] = until
 
+        rows = []
+        for spec in SEARCH_SOURCES:
+            stmt = search_statement(spec, since=since, until=until, after=cursor is not None)
+            rows.extend((await self._session.execute(stmt, params)).all())
+        rows.sort(key=search_key)
+        return rows[: limit + 1]
+
+    async def search_journals(
+        self,
+        query: str,
+        limit: int,
+        cursor: str | None = None,
+        since: datetime | None = None,
+        until: datetime | None = None,
+    ) -> tuple[List[Dict[str, Any]], str | None]:
+        """Return one page of search hits, best first, and the next cursor."""
+
+        return search_page(await self.search_rows(query, limit, cursor, since, until), limit)
+
+    @timed(QUERY_SECONDS)
+    async def fetch_session_owner(self, session_id: int) -> str | None:
+        """Return the user a session belongs to, ``None`` for anonymous sessions."""
+
+        stmt = select(Session.user_id).where(Session.id == session_id)
+        return (await self._session.execute(stmt)).scalar_one_or_none()
+
+    @timed(QUERY_SECONDS)
     async def fetch_summary(self, session_id: int) -> SessionSummary | None:
         stmt = select(SessionSummary).where(SessionSummary.session_id == session_id)
         result = await self._session.execute(stmt)
         return result.scalar_one_or_none()
 
 
-__all__ = ["SessionService"]
+def summary_key(row: Any) -> tuple[datetime, int]:
+    """Sort key of :meth:`SessionService.fetch_summary_rows`, descending."""
+
+    return row.created_at, row.session_id
+
+
+def summary_page(rows: Sequence[Any], limit: int) -> tuple[List[Dict[str, Any]], str | None]:
+    """Turn up to ``limit + 1`` summary rows into a page and its next cursor."""
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].session_id)
+    entries = [
+        {
+            "session_id": row.session_id,
+            "started_at": row.started_at,
+            "created_at": row.created_at,
+            "preview": row.preview,
+        }
+        for row in rows
+    ]
+    return entries, next_cursor
+
+
+def search_key(row: Any) -> tuple[float, str, int, int]:
+    """Sort key of :meth:`SessionService.search_rows`, ascending.
+
+    Message and journal ids restart on every shard, so the session id, whose
+    high bits name the shard, comes before the row id.
+    """
+
+    return row.score, row.source, row.session_id, row.id
+
+
+def search_page(rows: Sequence[Any], limit: int) -> tuple[List[Dict[str, Any]], str | None]:
+    """Turn up to ``limit + 1`` search rows into a page of hits and its next cursor."""
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_search_cursor(
+            rows[-1].score, rows[-1].source, rows[-1].session_id, rows[-1].id
+        )
+    hits = [
+        {
+            "session_id": row.session_id,
+            "source": row.source,
+            "created_at": row.created_at,
+            "snippet": row.snippet,
+            "score": row.score,
+        }
+        for row in rows
+    ]
+    return hits, next_cursor
+
+
+__all__ = ["SessionService", "search_key", "search_page", "summary_key", "summary_page"]
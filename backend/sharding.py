@@ -0,0 +1,356 @@
+"""Routing of users and sessions to SQLite shard files.
+
+Users are mapped to one of ``database_shards`` database files by a
+consistent hash ring, so changing the number of shards only moves the users
+on the affected parts of the ring. A session lives in the shard its user
+mapped to when it started, and its id says which: shard ``k`` allocates
+session ids upwards from ``k << SHARD_ID_BITS``, so any session id is routed
+without a lookup. Shard 0 is the ``database_url`` file itself, which makes a
+single shard exactly the unsharded layout.
+
+Every shard has its own single-connection write engine and read pool, so
+writes to different shards never wait on each other's lock. Engines are
+created on first use; once more than ``max_open_shards`` shards have open
+connections, those of the least recently used idle shard are closed and
+reopened when it is needed again.
+
+Components with per-database state (the message writer, summary worker,
+audio spool, compactor and upload manager) run one instance per shard
+through :class:`PerShard`, and queries spanning all users go through
+:meth:`ShardRouter.fan_out` and :func:`merge_sorted`.
+"""
+from __future__ import annotations
+
+import asyncio
+import bisect
+import hashlib
+import logging
+import os
+import random
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import partial
+from heapq import merge
+from itertools import islice
+from typing import Any, Awaitable, Callable, Dict, Generic, Iterable, List, Optional, Sequence, Set, TypeVar
+
+from sqlalchemy import event, func, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from .config import Settings
+from .metrics import REGISTRY
+from .models import Session
+from .storage import create_read_engine, create_write_engine, is_memory_database
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# 2**40 sessions per shard, and up to 2**13 shards within the 2**53 integers
+# JavaScript clients represent exactly.
+SHARD_ID_BITS = 40
+MAX_SHARDS = 1 << 13
+
+_CLOSED_SHARDS = REGISTRY.counter(
+    "mindful_shard_closures_total", "Idle shards whose connections were closed to stay within the open limit."
+).labels()
+
+
+def shard_database_url(url: str, shard: int) -> str:
+    """Database URL of ``shard``: ``app.db`` becomes ``app-shard001.db`` and so on."""
+
+    if shard == 0 or is_memory_database(url):
+        return url
+    parsed = make_url(url)
+    root, extension = os.path.splitext(parsed.database)
+    return parsed.set(database=f"{root}-shard{shard:03d}{extension}").render_as_string(hide_password=False)
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """Consistent hash ring over shards ``0..shards-1``."""
+
+    def __init__(self, shards: int, virtual_nodes: int = 64) -> None:
+        points = sorted(
+            (_hash(f"shard-{shard}-{replica}"), shard)
+            for shard in range(shards)
+            for replica in range(max(1, virtual_nodes))
+        )
+        self._points = [point for point, _ in points]
+        self._shards = [shard for _, shard in points]
+
+    def shard_for(self, key: str) -> int:
+        index = bisect.bisect(self._points, _hash(key)) % len(self._points)
+        return self._shards[index]
+
+
+class _ShardSession(AsyncSession):
+    """Session that tells its shard when it is closed."""
+
+    _release: Optional[Callable[[], None]] = None
+
+    async def close(self) -> None:
+        try:
+            await super().close()
+        finally:
+            release, self._release = self._release, None
+            if release is not None:
+                release()
+
+
+@dataclass
+class _ShardEngines:
+    write: AsyncEngine
+    read: AsyncEngine
+    write_factory: sessionmaker
+    read_factory: sessionmaker
+    # Sessions opened and not closed yet; the engines are only disposed at 0.
+    sessions: int = 0
+
+    def release(self) -> None:
+        self.sessions -= 1
+
+
+class ShardRouter:
+    """Map users and sessions to shards and hand out each shard's sessions.
+
+    Sessions must be closed (``async with factory() as session``) for their
+    shard to count as idle.
+    """
+
+    def __init__(
+        self,
+        settings: Settings,
+        shards: Optional[int] = None,
+        *,
+        virtual_nodes: Optional[int] = None,
+        max_open_shards: Optional[int] = None,
+    ) -> None:
+        count = settings.database_shards if shards is None else shards
+        if not 1 <= count <= MAX_SHARDS:
+            raise ValueError(f"database_shards must be between 1 and {MAX_SHARDS}")
+        self._settings = settings
+        self._count = count
+        self._ring = HashRing(
+            count, settings.database_shard_virtual_nodes if virtual_nodes is None else virtual_nodes
+        )
+        self._max_open = max(
+            1, settings.database_max_open_shards if max_open_shards is None else max_open_shards
+        )
+        # Closing an in-memory database's connection would discard it.
+        self._evict = not is_memory_database(settings.database_url)
+        # Engines of the shards in use, least recently used first.
+        self._engines: "OrderedDict[int, _ShardEngines]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._closing: Set["asyncio.Task[None]"] = set()
+
+    @property
+    def shard_count(self) -> int:
+        return self._count
+
+    @property
+    def shards(self) -> range:
+        return range(self._count)
+
+    @property
+    def open_shards(self) -> int:
+        return len(self._engines)
+
+    def shard_for_user(self, user_id: Optional[str]) -> int:
+        """Shard holding ``user_id``'s sessions; anonymous sessions are spread evenly."""
+
+        if user_id is None:
+            return random.randrange(self._count)
+        return self._ring.shard_for(user_id)
+
+    def shard_for_session(self, session_id: int) -> int:
+        """Shard holding ``session_id``; raises ``LookupError`` for ids no shard allocates."""
+
+        shard = session_id >> SHARD_ID_BITS
+        if session_id < 0 or shard >= self._count:
+            raise LookupError("Session not found")
+        return shard
+
+    def group_by_shard(self, session_ids: Iterable[int]) -> Dict[int, List[int]]:
+        """Split ``session_ids`` by shard, dropping ids no shard allocates."""
+
+        grouped: Dict[int, List[int]] = {}
+        for session_id in session_ids:
+            try:
+                shard = self.shard_for_session(session_id)
+            except LookupError:
+                continue
+            grouped.setdefault(shard, []).append(session_id)
+        return grouped
+
+    def write_engine(self, shard: int) -> AsyncEngine:
+        return self._shard(shard).write
+
+    def read_engine(self, shard: int) -> AsyncEngine:
+        return self._shard(shard).read
+
+    def session_factory(self, shard: int) -> Callable[..., AsyncSession]:
+        """Factory of sessions on ``shard``'s write connection."""
+
+        return partial(self._session, shard, False)
+
+    def read_session_factory(self, shard: int) -> Callable[..., AsyncSession]:
+        """Factory of sessions on ``shard``'s read-only pool."""
+
+        return partial(self._session, shard, True)
+
+    async def fan_out(
+        self, query: Callable[[AsyncSession], Awaitable[T]], shards: Optional[Iterable[int]] = None
+    ) -> List[T]:
+        """Run ``query`` on a read session of every shard concurrently, in shard order."""
+
+        async def run(shard: int) -> T:
+            async with self.read_session_factory(shard)() as session:
+                return await query(session)
+
+        return list(await asyncio.gather(*(run(shard) for shard in (self.shards if shards is None else shards))))
+
+    async def dispose(self) -> None:
+        """Close every pooled connection; shards reconnect on next use."""
+
+        if self._closing:
+            await asyncio.gather(*self._closing, return_exceptions=True)
+        for engines in list(self._engines.values()):
+            await _dispose(engines)
+
+    def _shard(self, shard: int) -> _ShardEngines:
+        engines = self._engines.get(shard)
+        if engines is None:
+            if not 0 <= shard < self._count:
+                raise LookupError(f"No shard {shard}")
+            with self._lock:
+                engines = self._engines.get(shard)
+                if engines is None:
+                    engines = self._engines[shard] = self._create(shard)
+        return engines
+
+    def _create(self, shard: int) -> _ShardEngines:
+        settings = self._settings
+        if shard:
+            settings = settings.copy(update={"database_url": shard_database_url(settings.database_url, shard)})
+        engine = create_write_engine(settings)
+        read_engine = create_read_engine(settings, engine)
+        # Read back when a session is inserted, see _allocate_session_id.
+        write = engine.execution_options(shard=shard)
+        read = write if read_engine is engine else read_engine
+        return _ShardEngines(
+            write,
+            read,
+            sessionmaker(write, expire_on_commit=False, class_=_ShardSession),
+            sessionmaker(read, expire_on_commit=False, class_=_ShardSession),
+        )
+
+    def _session(self, shard: int, read: bool, **kwargs: Any) -> AsyncSession:
+        engines = self._shard(shard)
+        self._engines.move_to_end(shard)
+        session = (engines.read_factory if read else engines.write_factory)(**kwargs)
+        session._release = engines.release
+        engines.sessions += 1
+        if self._evict and len(self._engines) > self._max_open:
+            self._close_idle()
+        return session
+
+    def _close_idle(self) -> None:
+        """Drop the least recently used idle shards' engines and close their connections.
+
+        A shard is only dropped while none of its sessions is open, and its
+        next session gets new engines, so a connection is never taken from a
+        pool that is being closed.
+        """
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        for shard, engines in list(self._engines.items())[:-1]:
+            if len(self._engines) <= self._max_open:
+                return
+            if engines.sessions == 0:
+                del self._engines[shard]
+                task = loop.create_task(_dispose(engines))
+                self._closing.add(task)
+                task.add_done_callback(self._closing.discard)
+
+
+async def _dispose(engines: _ShardEngines) -> None:
+    try:
+        await engines.write.dispose()
+        if engines.read is not engines.write:
+            await engines.read.dispose()
+    except Exception:  # pragma: no cover - depends on the database
+        logger.exception("Closing shard connections failed")
+    else:
+        _CLOSED_SHARDS.inc()
+
+
+@event.listens_for(Session, "before_insert")
+def _allocate_session_id(_: Any, connection: Any, target: Session) -> None:
+    """Start shard ``k``'s session ids at ``k << SHARD_ID_BITS``.
+
+    SQLite assigns one more than the largest id, so only an insert into a
+    shard without sessions in its range needs an explicit id.
+    """
+
+    shard = connection.get_execution_options().get("shard", 0)
+    if not shard or target.id is not None:
+        return
+    base = shard << SHARD_ID_BITS
+    current = connection.execute(select(func.max(Session.id))).scalar()
+    if current is None or current < base:
+        target.id = base + 1
+
+
+class PerShard(Generic[T]):
+    """One instance of a component per shard, built on first use."""
+
+    def __init__(self, router: ShardRouter, build: Callable[[int], T]) -> None:
+        self._router = router
+        self._build = build
+        self._instances: Dict[int, T] = {}
+
+    def for_shard(self, shard: int) -> T:
+        instance = self._instances.get(shard)
+        if instance is None:
+            instance = self._instances[shard] = self._build(shard)
+        return instance
+
+    def for_session(self, session_id: int) -> T:
+        return self.for_shard(self._router.shard_for_session(session_id))
+
+    def all(self) -> List[T]:
+        """Every shard's instance, building those not used yet."""
+
+        return [self.for_shard(shard) for shard in self._router.shards]
+
+    def built(self) -> List[T]:
+        return list(self._instances.values())
+
+
+def merge_sorted(
+    results: Iterable[Sequence[T]], key: Callable[[T], Any], limit: int, *, reverse: bool = False
+) -> List[T]:
+    """Merge per-shard results that are each sorted by ``key`` and keep the first ``limit``."""
+
+    return list(islice(merge(*results, key=key, reverse=reverse), limit))
+
+
+__all__ = [
+    "HashRing",
+    "MAX_SHARDS",
+    "PerShard",
+    "SHARD_ID_BITS",
+    "ShardRouter",
+    "merge_sorted",
+    "shard_database_url",
+]
@@ -0,0 +1,329 @@
+"""Storage backends for in-progress conversation state."""
+from __future__ import annotations
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Dict, List, NamedTuple, Protocol
+
+from .config import Settings
+
+if TYPE_CHECKING:  # pragma: no cover - imported for type checking only
+    from .orchestrator import ConversationState
+    from .records import MessageRecord
+
+logger = logging.getLogger(__name__)
+
+
+class ConversationStore(Protocol):
+    """Protocol describing where :class:`LLMOrchestrator` keeps its state."""
+
+    def get(self, session_id: int) -> "ConversationState | None":
+        """Return the state for ``session_id`` or ``None`` on a miss."""
+
+    def put(self, session_id: int, state: "ConversationState") -> None:
+        """Store ``state`` after it has been created or mutated."""
+
+    def delete(self, session_id: int) -> None:
+        """Forget the state for ``session_id``."""
+
+    def __len__(self) -> int:
+        """Return the number of conversations currently held."""
+
+
+class InMemoryConversationStore:
+    """Process-local LRU store that also drops idle conversations.
+
+    Entries are kept in access order, so expired entries always sit at the
+    front of the ordered dict and can be evicted without scanning.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 10_000,
+        idle_ttl_seconds: float = 900.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._max_entries = max(1, max_entries)
+        self._ttl = idle_ttl_seconds
+        self._clock = clock
+        self._entries: "OrderedDict[int, tuple[float, ConversationState]]" = OrderedDict()
+
+    def get(self, session_id: int) -> "ConversationState | None":
+        now = self._clock()
+        self._evict_idle(now)
+        entry = self._entries.get(session_id)
+        if entry is None:
+            return None
+        state = entry[1]
+        self._entries[session_id] = (now, state)
+        self._entries.move_to_end(session_id)
+        return state
+
+    def put(self, session_id: int, state: "ConversationState") -> None:
+        now = self._clock()
+        self._entries[session_id] = (now, state)
+        self._entries.move_to_end(session_id)
+        self._evict_idle(now)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    def delete(self, session_id: int) -> None:
+        self._entries.pop(session_id, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _evict_idle(self, now: float) -> None:
+        if self._ttl <= 0:
+            return
+        cutoff = now - self._ttl
+        while self._entries:
+            session_id, (touched, _) = next(iter(self._entries.items()))
+            if touched >= cutoff:
+                break
+            del self._entries[session_id]
+
+
+class _ConversationSnapshot(NamedTuple):
+    questions: List[str]
+    history: List["MessageRecord"]
+
+
+class _CachedState:
+    """A conversation held by this process and the version it was based on."""
+
+    __slots__ = ("state", "version", "updated_at", "checked_at")
+
+    def __init__(self, state: "ConversationState", version: str, updated_at: float, checked_at: float) -> None:
+        self.state = state
+        self.version = version
+        self.updated_at = updated_at
+        self.checked_at = checked_at
+
+
+class SQLiteConversationStore:
+    """Conversation store shared by every worker process on one host.
+
+    State is serialised to JSON in a small WAL-mode SQLite file so that any
+    uvicorn worker can continue a conversation started by another one. Idle
+    rows are purged on write at most once per ``sweep_interval`` seconds.
+
+    Each process keeps the conversations it uses in memory and writes them
+    through to the file, in order, on one background thread, so the event
+    loop neither waits on SQLite nor encodes JSON to record a message. Every
+    row carries a random version, and a write based on a cached copy only
+    applies over the version it was read at. A cached copy older than
+    ``revalidate_after`` seconds is checked against the file before use.
+    When another process changed the row in between, its state wins: the
+    write is dropped with a warning and the cached copy reloaded.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        idle_ttl_seconds: float = 900.0,
+        sweep_interval: float = 60.0,
+        revalidate_after: float = 1.0,
+    ) -> None:
+        self._path = str(path)
+        self._ttl = idle_ttl_seconds
+        self._sweep_interval = sweep_interval
+        self._revalidate_after = revalidate_after
+        self._last_sweep = 0.0
+        self._last_cache_sweep = 0.0
+        # Guards the cache, which the background thread also drops entries from.
+        self._lock = threading.Lock()
+        self._cache: Dict[int, _CachedState] = {}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="conversation-store")
+        self._conn = sqlite3.connect(self._path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS conversation_state ("
+            " session_id INTEGER PRIMARY KEY,"
+            " payload TEXT NOT NULL,"
+            " updated_at REAL NOT NULL,"
+            " version TEXT NOT NULL DEFAULT '')"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(conversation_state)")}
+        if "version" not in columns:
+            self._conn.execute("ALTER TABLE conversation_state ADD COLUMN version TEXT NOT NULL DEFAULT ''")
+
+    def get(self, session_id: int) -> "ConversationState | None":
+        now = time.time()
+        with self._lock:
+            cached = self._cache.get(session_id)
+        if cached is not None and now - cached.checked_at < self._revalidate_after:
+            if self._ttl > 0 and cached.updated_at < now - self._ttl:
+                self.delete(session_id)
+                return None
+            return cached.state
+        # Runs after the writes already queued, so the file is read as this
+        # process left it.
+        known = cached.version if cached is not None else None
+        loaded = self._executor.submit(self._load, session_id, known).result()
+        if loaded is None:
+            with self._lock:
+                self._cache.pop(session_id, None)
+            return None
+        version, updated_at, state = loaded
+        if self._ttl > 0 and updated_at < now - self._ttl:
+            self.delete(session_id)
+            return None
+        if state is None:
+            state = cached.state  # type: ignore[union-attr]
+        with self._lock:
+            self._cache[session_id] = _CachedState(state, version, updated_at, now)
+        return state
+
+    def put(self, session_id: int, state: "ConversationState") -> None:
+        now = time.time()
+        version = uuid.uuid4().hex
+        with self._lock:
+            cached = self._cache.get(session_id)
+            self._cache[session_id] = _CachedState(state, version, now, now)
+        if self._ttl > 0 and now - self._last_cache_sweep >= self._sweep_interval:
+            self._last_cache_sweep = now
+            with self._lock:
+                idle = [key for key, entry in self._cache.items() if entry.updated_at < now - self._ttl]
+                for key in idle:
+                    del self._cache[key]
+        # A new state object (a started or restored session) replaces the row.
+        expected = cached.version if cached is not None and cached.state is state else None
+        # Snapshot the state here, as it keeps changing while the write is
+        # queued; the messages themselves are immutable.
+        snapshot = _ConversationSnapshot(list(state.questions), list(state.history))
+        self._executor.submit(self._write, session_id, snapshot, expected, version, now)
+
+    def delete(self, session_id: int) -> None:
+        with self._lock:
+            self._cache.pop(session_id, None)
+        self._executor.submit(self._delete, session_id)
+
+    def __len__(self) -> int:
+        return self._executor.submit(self._count).result()
+
+    def close(self) -> None:
+        """Finish the queued writes and close the file; blocks until done."""
+
+        self._executor.shutdown(wait=True)
+        self._conn.close()
+
+    # The methods below run on the store's background thread.
+
+    def _load(self, session_id: int, known: str | None) -> "tuple[str, float, ConversationState | None] | None":
+        row = self._conn.execute(
+            "SELECT version, updated_at FROM conversation_state WHERE session_id = ?",
+            (session_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        version, updated_at = row
+        if version == known:
+            return version, updated_at, None
+        (payload,) = self._conn.execute(
+            "SELECT payload FROM conversation_state WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        return version, updated_at, _decode_state(json.loads(payload))
+
+    def _write(
+        self, session_id: int, snapshot: "_ConversationSnapshot", expected: str | None, version: str, now: float
+    ) -> None:
+        try:
+            payload = json.dumps(_encode_state(snapshot))
+            if expected is None:
+                self._conn.execute(
+                    "INSERT INTO conversation_state (session_id, payload, updated_at, version) VALUES (?, ?, ?, ?)"
+                    " ON CONFLICT(session_id) DO UPDATE SET payload = excluded.payload,"
+                    " updated_at = excluded.updated_at, version = excluded.version",
+                    (session_id, payload, now, version),
+                )
+                applied = True
+            else:
+                cursor = self._conn.execute(
+                    "UPDATE conversation_state SET payload = ?, updated_at = ?, version = ?"
+                    " WHERE session_id = ? AND version = ?",
+                    (payload, now, version, session_id, expected),
+                )
+                applied = cursor.rowcount > 0
+            if self._ttl > 0 and now - self._last_sweep >= self._sweep_interval:
+                self._last_sweep = now
+                self._conn.execute(
+                    "DELETE FROM conversation_state WHERE updated_at < ?",
+                    (now - self._ttl,),
+                )
+        except Exception:
+            logger.exception("Failed to store conversation %s", session_id)
+            applied = False
+        else:
+            if not applied:
+                logger.warning("Conversation %s was changed by another process; keeping its state", session_id)
+        if not applied:
+            with self._lock:
+                cached = self._cache.get(session_id)
+                if cached is not None and cached.version == version:
+                    del self._cache[session_id]
+
+    def _delete(self, session_id: int) -> None:
+        try:
+            self._conn.execute("DELETE FROM conversation_state WHERE session_id = ?", (session_id,))
+        except Exception:
+            logger.exception("Failed to delete conversation %s", session_id)
+
+    def _count(self) -> int:
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM conversation_state").fetchone()
+        return int(count)
+
+
+def build_conversation_store(settings: Settings) -> ConversationStore:
+    """Create the conversation store selected by ``settings``."""
+
+    if settings.conversation_store == "sqlite":
+        return SQLiteConversationStore(
+            settings.conversation_store_path,
+            idle_ttl_seconds=settings.conversation_idle_ttl_seconds,
+        )
+    return InMemoryConversationStore(
+        max_entries=settings.conversation_cache_size,
+        idle_ttl_seconds=settings.conversation_idle_ttl_seconds,
+    )
+
+
+def _encode_state(state: "ConversationState | _ConversationSnapshot") -> Dict[str, object]:
+    return {
+        "questions": list(state.questions),
+        "history": [
+            {"role": m.role, "content": m.content, "created_at": m.created_at.isoformat()}
+            for m in state.history
+        ],
+    }
+
+
+def _decode_state(payload: Dict[str, object]) -> "ConversationState":
+    from .orchestrator import ConversationState
+    from .records import MessageRecord
+
+    return ConversationState(
+        questions=deque(payload["questions"]),  # type: ignore[arg-type]
+        history=[
+            MessageRecord(item["role"], item["content"], datetime.fromisoformat(item["created_at"]))
+            for item in payload["history"]  # type: ignore[union-attr]
+        ],
+    )
+
+
+__all__ = [
+    "ConversationStore",
+    "InMemoryConversationStore",
+    "SQLiteConversationStore",
+    "build_conversation_store",
+]
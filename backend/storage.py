@@ -0,0 +1,106 @@
+"""SQLite storage engine profile: pragmas and split read/write pools."""
+from __future__ import annotations
+
+from typing import Any
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from .config import Settings
+
+
+def _is_sqlite(url: str) -> bool:
+    return make_url(url).get_backend_name() == "sqlite"
+
+
+def is_memory_database(url: str) -> bool:
+    database = make_url(url).database
+    return database in (None, "", ":memory:")
+
+
+def _install_pragmas(engine: AsyncEngine, settings: Settings, *, read_only: bool) -> None:
+    pragmas = [
+        f"PRAGMA busy_timeout = {int(settings.sqlite_busy_timeout_ms)}",
+        f"PRAGMA cache_size = {int(settings.sqlite_cache_size)}",
+        f"PRAGMA mmap_size = {int(settings.sqlite_mmap_size)}",
+        "PRAGMA foreign_keys = ON",
+    ]
+    if read_only:
+        pragmas.append("PRAGMA query_only = ON")
+    else:
+        # journal_mode is persistent, so only the writer needs to set it.
+        # auto_vacuum takes effect when the first table is created, or on an
+        # existing database at its next full VACUUM.
+        pragmas.insert(0, "PRAGMA auto_vacuum = INCREMENTAL")
+        pragmas.insert(1, f"PRAGMA journal_mode = {settings.sqlite_journal_mode}")
+        pragmas.append(f"PRAGMA synchronous = {settings.sqlite_synchronous}")
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def _configure(dbapi_connection: Any, _: Any) -> None:
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+
+def create_write_engine(settings: Settings) -> AsyncEngine:
+    """Create the engine every write goes through.
+
+    For SQLite the pool holds exactly one connection. SQLite admits a single
+    writer anyway; queueing for that connection in the pool serializes writes
+    in-process instead of letting them collide on the database lock.
+    In-memory databases keep SQLAlchemy's single shared connection, which
+    takes no pool sizing.
+    """
+
+    url = settings.database_url
+    if not _is_sqlite(url):
+        return create_async_engine(url, echo=False, future=True)
+    if is_memory_database(url):
+        engine = create_async_engine(url, echo=False, future=True)
+    else:
+        # The pool class is explicit: the sizing arguments need a queue pool,
+        # which is not the default for every SQLite URL and dialect version.
+        engine = create_async_engine(
+            url,
+            echo=False,
+            future=True,
+            poolclass=AsyncAdaptedQueuePool,
+            pool_size=1,
+            max_overflow=0,
+            pool_timeout=settings.sqlite_write_timeout_seconds,
+        )
+    _install_pragmas(engine, settings, read_only=False)
+    return engine
+
+
+def create_read_engine(settings: Settings, write_engine: AsyncEngine) -> AsyncEngine:
+    """Create a pool of read-only connections for query endpoints.
+
+    In WAL mode readers never block the writer or each other, so this pool is
+    sized to the number of cores. In-memory databases cannot be shared between
+    connections and reuse ``write_engine``.
+    """
+
+    url = settings.database_url
+    if not _is_sqlite(url):
+        return create_async_engine(url, echo=False, future=True)
+    if is_memory_database(url):
+        return write_engine
+    engine = create_async_engine(
+        url,
+        echo=False,
+        future=True,
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=max(1, settings.sqlite_read_pool_size),
+        max_overflow=0,
+    )
+    _install_pragmas(engine, settings, read_only=True)
+    return engine
+
+
+__all__ = ["create_write_engine", "create_read_engine", "is_memory_database"]
@@ -0,0 +1,271 @@
+"""Background maintenance of rolling session summaries."""
+from __future__ import annotations
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Set
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .orchestrator import LLMOrchestrator
+from .records import MessageRecord
+from .services import SessionService
+from .writer import MessageWriter
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .insights import InsightEngine, Insights
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PartialSummary:
+    text: str
+    watermark: Optional[datetime]
+    # The text as last persisted; what follows it is written as a new part.
+    stored: str = ""
+
+
+class SummaryWorker:
+    """Keep each session's summary current so ending a session is cheap.
+
+    :meth:`observe` is subscribed to :meth:`LLMOrchestrator.record_message`
+    and only buffers the message. A background task folds buffered messages
+    into the session's rolling summary with
+    :meth:`LLMOrchestrator.fold_summary`, and persists the
+    summary together with the position of the last message it covers at most
+    every ``persist_interval`` seconds. That position is capped at what the
+    ``writer`` has confirmed as committed, rather than flushing its batch
+    early; messages folded but not yet written are folded again after a
+    crash, which is better than losing them. A summary that only grew since it was
+    last persisted is stored by appending the new text, so a long session does
+    not rewrite its whole summary on every persist. :meth:`finalise` returns
+    immediately; the journal entry is written later by merging only the
+    messages after that watermark, composed with :meth:`LLMOrchestrator.compose_summary`
+    while no database connection is held. With an ``insights`` engine the
+    composer also gets what the user's earlier sessions say. A journal entry
+    that fails is retried up to ``finalise_attempts`` times, waiting
+    ``retry_delay`` seconds and doubling it each time; then the session's
+    ``summary_status`` becomes ``"failed"`` and is retried at the next start.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], AsyncSession],
+        orchestrator: LLMOrchestrator,
+        writer: Optional[MessageWriter] = None,
+        *,
+        insights: Optional[InsightEngine] = None,
+        persist_interval: float = 1.0,
+        finalise_attempts: int = 5,
+        retry_delay: float = 2.0,
+    ) -> None:
+        self._session_factory = session_factory
+        self._orchestrator = orchestrator
+        self._writer = writer
+        self._insights = insights
+        self._persist_interval = persist_interval
+        self._finalise_attempts = max(1, finalise_attempts)
+        self._retry_delay = retry_delay
+        self._buffered: Dict[int, List[MessageRecord]] = {}
+        self._partials: Dict[int, PartialSummary] = {}
+        self._dirty: Set[int] = set()
+        self._lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task[None]] = None
+        self._finalising: Set[asyncio.Task[None]] = set()
+        self._closed = asyncio.Event()
+
+    def observe(self, session_id: int, message: MessageRecord) -> None:
+        self._buffered.setdefault(session_id, []).append(message)
+        self._wakeup.set()
+
+    async def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._closed.clear()
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        # Journal entries waiting for a retry stay pending for the next start.
+        self._closed.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._finalising:
+            await asyncio.gather(*self._finalising, return_exceptions=True)
+        async with self._lock:
+            await self._fold(list(self._buffered))
+            await self._persist()
+
+    def finalise(self, session_id: int) -> None:
+        """Schedule the journal entry for an ended session."""
+
+        task = asyncio.create_task(self._finalise(session_id))
+        self._finalising.add(task)
+        task.add_done_callback(self._finalising.discard)
+
+    async def _run(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            try:
+                async with self._lock:
+                    await self._fold(list(self._buffered))
+                    await self._persist()
+            except Exception:  # pragma: no cover - depends on the database
+                logger.exception("Failed to update rolling summaries")
+            await asyncio.sleep(self._persist_interval)
+
+    async def _fold(self, session_ids: List[int]) -> None:
+        # A model-backed fold takes a while; sessions do not wait on each other.
+        await asyncio.gather(*(self._fold_session(session_id) for session_id in session_ids))
+
+    async def _fold_session(self, session_id: int) -> None:
+        messages = self._buffered.pop(session_id, None)
+        if not messages:
+            return
+        partial = self._partials.get(session_id)
+        if partial is None:
+            partial = await self._load(session_id)
+        # Only a summary persisted by another process can already cover
+        # observed messages. Ties on the timestamp are kept: folding one
+        # twice is better than dropping one.
+        fresh = [m for m in messages if partial.watermark is None or m.created_at >= partial.watermark]
+        if not fresh:
+            self._partials[session_id] = partial
+            return
+        text = await self._orchestrator.fold_summary(partial.text, fresh)
+        self._partials[session_id] = PartialSummary(text, fresh[-1].created_at, partial.stored)
+        self._dirty.add(session_id)
+
+    async def _load(self, session_id: int) -> PartialSummary:
+        async with self._session_factory() as session:
+            text, watermark = await SessionService(session, self._orchestrator).fetch_partial_summary(session_id)
+        return PartialSummary(text, watermark[0] if watermark is not None else None, text)
+
+    async def _persist(self) -> None:
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, set()
+        partials = {}
+        rows = []
+        for session_id in dirty:
+            partial = self._partials.get(session_id)
+            if partial is None:
+                continue
+            watermark = partial.watermark
+            if self._writer is not None:
+                # Watermarks name a message in the table, so only written ones count.
+                committed = self._writer.committed_through(session_id)
+                if committed is None:
+                    self._dirty.add(session_id)
+                    continue
+                if watermark is None or committed < watermark:
+                    watermark = committed
+            partials[session_id] = partial
+            if partial.text.startswith(partial.stored):
+                rows.append((session_id, partial.text[len(partial.stored) :], True, watermark))
+            else:
+                rows.append((session_id, partial.text, False, watermark))
+        if not rows:
+            return
+        try:
+            async with self._session_factory() as session:
+                await SessionService(session, self._orchestrator).save_partial_summaries(rows)
+                await session.commit()
+        except BaseException:
+            self._dirty |= dirty
+            raise
+        for partial in partials.values():
+            partial.stored = partial.text
+
+    async def _finalise(self, session_id: int) -> None:
+        delay = self._retry_delay
+        for attempt in range(1, self._finalise_attempts + 1):
+            try:
+                await self._write_journal(session_id)
+                return
+            except Exception:  # pragma: no cover - depends on the database
+                if attempt == self._finalise_attempts:
+                    logger.exception(
+                        "Giving up on the summary for session %s after %d attempts", session_id, attempt
+                    )
+                    await self._mark_failed(session_id)
+                    return
+                logger.warning(
+                    "Failed to finalise summary for session %s (attempt %d of %d), retrying",
+                    session_id,
+                    attempt,
+                    self._finalise_attempts,
+                    exc_info=True,
+                )
+            try:
+                await asyncio.wait_for(self._closed.wait(), timeout=delay)
+                return
+            except asyncio.TimeoutError:
+                delay *= 2
+
+    async def _write_journal(self, session_id: int) -> None:
+        if self._writer is not None:
+            # Once per session: the journal must see its last messages.
+            await self._writer.flush()
+        async with self._lock:
+            await self._fold([session_id])
+            await self._persist()
+            self._partials.pop(session_id, None)
+            if self._writer is not None:
+                self._writer.forget([session_id])
+        user_id = None
+        async with self._session_factory() as session:
+            service = SessionService(session, self._orchestrator, self._writer)
+            pending = await service.fetch_summary_input(session_id)
+            if pending is not None and self._insights is not None:
+                user_id = await service.fetch_session_owner(session_id)
+        if pending is None:
+            return
+        insights = await self._history(user_id, *pending)
+        # Composed outside any transaction: a model may take seconds, and
+        # the write connection is shared by every session.
+        journal_entry, recommendations = await self._orchestrator.compose_summary(*pending, insights)
+        async with self._session_factory() as session:
+            service = SessionService(session, self._orchestrator, self._writer)
+            try:
+                await service.save_summary(session_id, journal_entry, recommendations)
+                await session.commit()
+            except Exception:
+                await session.rollback()
+                raise
+
+    async def _mark_failed(self, session_id: int) -> None:
+        try:
+            async with self._session_factory() as session:
+                await SessionService(session, self._orchestrator).mark_summary_failed(session_id)
+                await session.commit()
+        except Exception:  # pragma: no cover - depends on the database
+            # Still pending, so the next start retries it all the same.
+            logger.exception("Failed to mark the summary of session %s as failed", session_id)
+
+    async def _history(self, user_id: Optional[str], partial: str, tail: List[MessageRecord]) -> Optional[Insights]:
+        """Insights from ``user_id``'s earlier sessions, nearest ones judged by this session's text.
+
+        Anonymous sessions have no history: other anonymous users' journals
+        are not theirs.
+        """
+
+        if self._insights is None or user_id is None:
+            return None
+        text = "\n".join([partial, *(message.content for message in tail if message.role == "user")])
+        try:
+            return await self._insights.insights(user_id, text=text, limit=5)
+        except Exception:  # pragma: no cover - the journal entry must not depend on it
+            logger.exception("Failed to look up insights for a journal entry")
+            return None
+
+
+__all__ = ["SummaryWorker", "PartialSummary"]
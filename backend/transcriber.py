@@ -1,7 +1,15 @@
 """Speech-to-text integration helpers."""
 from __future__ import annotations
 
-from typing import Protocol
+import asyncio
+import sys
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Callable, Dict, List, Optional, Protocol, Sequence, Tuple
 
 
 class Transcriber(Protocol):
@@ -24,4 +32,239 @@ class MockTranscriber:
         return f"[audio chunk: {byte_count} bytes]"
 
 
-__all__ = ["Transcriber", "MockTranscriber"]
+class SpeechModel(Protocol):
+    """Synchronous speech model loaded once inside each pool worker."""
+
+    def transcribe_batch(self, chunks: Sequence[memoryview]) -> List[str]:
+        """Return one transcript per chunk, in order."""
+
+
+class ChecksumSpeechModel:
+    """Deterministic CPU-bound stand-in for a local speech model.
+
+    Each chunk is hashed ``rounds`` times so the cost scales with the payload
+    like a real model would, and the transcript only depends on the bytes.
+    """
+
+    def __init__(self, rounds: int = 1) -> None:
+        self._rounds = max(1, rounds)
+
+    def transcribe_batch(self, chunks: Sequence[memoryview]) -> List[str]:
+        transcripts = []
+        for chunk in chunks:
+            digest = 0
+            for _ in range(self._rounds):
+                digest = zlib.crc32(chunk, digest)
+            transcripts.append(f"[audio chunk: {len(chunk)} bytes, crc {digest:08x}]")
+        return transcripts
+
+
+_WORKER_MODEL: Optional[SpeechModel] = None
+
+
+def _init_worker(model_factory: Callable[..., SpeechModel], model_kwargs: Dict[str, Any]) -> None:
+    global _WORKER_MODEL
+    _WORKER_MODEL = model_factory(**model_kwargs)
+
+
+def _attach_shared(name: str) -> SharedMemory:
+    """Open a segment owned by the parent without tracking it in this worker."""
+
+    if sys.version_info >= (3, 13):
+        return SharedMemory(name=name, track=False)
+    # Before 3.13 attaching always registers the segment. Workers share the
+    # parent's resource tracker (see PooledTranscriber.start), where that is a
+    # no-op; unregistering here would drop the parent's own registration.
+    return SharedMemory(name=name)
+
+
+def _transcribe_shared(name: str, spans: Sequence[Tuple[int, int]]) -> List[str]:
+    assert _WORKER_MODEL is not None, "worker was not initialised"
+    segment = _attach_shared(name)
+    views = [segment.buf[start:end] for start, end in spans]
+    try:
+        return _WORKER_MODEL.transcribe_batch(views)
+    finally:
+        for view in views:
+            view.release()
+        segment.close()
+
+
+@dataclass
+class TranscriberStats:
+    batches: int = 0
+    chunks: int = 0
+    max_batch_size: int = 0
+    total_queue_wait: float = 0.0
+    max_queue_wait: float = 0.0
+
+    @property
+    def mean_batch_size(self) -> float:
+        return self.chunks / self.batches if self.batches else 0.0
+
+    @property
+    def mean_queue_wait(self) -> float:
+        return self.total_queue_wait / self.chunks if self.chunks else 0.0
+
+
+@dataclass
+class _PendingChunk:
+    data: bytes
+    future: "asyncio.Future[str]"
+    enqueued_at: float
+
+
+class PooledTranscriber:
+    """Run a CPU-bound :class:`SpeechModel` in a process pool.
+
+    Chunks from every concurrent session are collected into micro-batches,
+    dispatched when ``max_batch_size`` chunks are waiting or ``max_wait``
+    seconds after the first one arrived. Each batch is copied once into a
+    shared memory segment and workers read it through ``memoryview`` slices,
+    so audio never passes through pickling. At most ``max_inflight_batches``
+    batches are handed to the pool at a time; while the pool is saturated new
+    chunks keep accumulating, which grows batches exactly when it helps.
+    """
+
+    def __init__(
+        self,
+        model_factory: Callable[..., SpeechModel] = ChecksumSpeechModel,
+        model_kwargs: Optional[Dict[str, Any]] = None,
+        *,
+        workers: int = 2,
+        max_batch_size: int = 16,
+        max_wait: float = 0.02,
+        max_inflight_batches: Optional[int] = None,
+    ) -> None:
+        self._model_factory = model_factory
+        self._model_kwargs = dict(model_kwargs or {})
+        self._workers = max(1, workers)
+        self._max_batch_size = max(1, max_batch_size)
+        self._max_wait = max_wait
+        self._inflight = asyncio.Semaphore(max_inflight_batches or self._workers * 2)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pending: List[_PendingChunk] = []
+        self._has_pending = asyncio.Event()
+        self._batch_full = asyncio.Event()
+        self._task: Optional[asyncio.Task[None]] = None
+        self._dispatches: set[asyncio.Task[None]] = set()
+        self._stats = TranscriberStats()
+
+    @property
+    def stats(self) -> TranscriberStats:
+        return TranscriberStats(**vars(self._stats))
+
+    def start(self) -> None:
+        if self._pool is None:
+            # Start the resource tracker before any worker exists so every
+            # worker inherits it instead of starting its own, which would
+            # report the parent's segments as leaked and unlink them on exit.
+            resource_tracker.ensure_running()
+            self._pool = ProcessPoolExecutor(
+                max_workers=self._workers,
+                initializer=_init_worker,
+                initargs=(self._model_factory, self._model_kwargs),
+            )
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._dispatches:
+            await asyncio.gather(*self._dispatches, return_exceptions=True)
+        for item in self._pending:
+            if not item.future.done():
+                item.future.set_exception(RuntimeError("PooledTranscriber is closed"))
+        self._pending.clear()
+        if self._pool is not None:
+            pool, self._pool = self._pool, None
+            # Waiting for the workers to exit blocks; keep it off the event loop.
+            await asyncio.get_running_loop().run_in_executor(None, pool.shutdown)
+
+    async def transcribe_chunk(self, data: bytes) -> str:
+        self.start()
+        future: asyncio.Future[str] = asyncio.get_running_loop().create_future()
+        self._pending.append(_PendingChunk(data, future, time.monotonic()))
+        self._has_pending.set()
+        if len(self._pending) >= self._max_batch_size:
+            self._batch_full.set()
+        return await future
+
+    async def _run(self) -> None:
+        while True:
+            await self._has_pending.wait()
+            if len(self._pending) < self._max_batch_size:
+                try:
+                    await asyncio.wait_for(self._batch_full.wait(), timeout=self._max_wait)
+                except asyncio.TimeoutError:
+                    pass
+            await self._inflight.acquire()
+            batch = self._pending[: self._max_batch_size]
+            del self._pending[: self._max_batch_size]
+            if len(self._pending) < self._max_batch_size:
+                self._batch_full.clear()
+            if not self._pending:
+                self._has_pending.clear()
+            task = asyncio.create_task(self._dispatch(batch))
+            self._dispatches.add(task)
+            task.add_done_callback(self._dispatches.discard)
+
+    async def _dispatch(self, batch: List[_PendingChunk]) -> None:
+        try:
+            batch = [item for item in batch if not item.future.done()]
+            if not batch:
+                return
+            dispatched_at = time.monotonic()
+            self._record(batch, dispatched_at)
+
+            spans: List[Tuple[int, int]] = []
+            offset = 0
+            for item in batch:
+                spans.append((offset, offset + len(item.data)))
+                offset += len(item.data)
+            segment = SharedMemory(create=True, size=max(offset, 1))
+            try:
+                for item, (start, end) in zip(batch, spans):
+                    segment.buf[start:end] = item.data
+                loop = asyncio.get_running_loop()
+                transcripts = await loop.run_in_executor(self._pool, _transcribe_shared, segment.name, spans)
+            except Exception as exc:
+                for item in batch:
+                    if not item.future.done():
+                        item.future.set_exception(exc)
+                return
+            finally:
+                segment.close()
+                segment.unlink()
+
+            for item, transcript in zip(batch, transcripts):
+                if not item.future.done():
+                    item.future.set_result(transcript)
+        finally:
+            self._inflight.release()
+
+    def _record(self, batch: List[_PendingChunk], dispatched_at: float) -> None:
+        stats = self._stats
+        stats.batches += 1
+        stats.chunks += len(batch)
+        stats.max_batch_size = max(stats.max_batch_size, len(batch))
+        for item in batch:
+            wait = dispatched_at - item.enqueued_at
+            stats.total_queue_wait += wait
+            stats.max_queue_wait = max(stats.max_queue_wait, wait)
+
+
+__all__ = [
+    "Transcriber",
+    "MockTranscriber",
+    "SpeechModel",
+    "ChecksumSpeechModel",
+    "PooledTranscriber",
+    "TranscriberStats",
+]
@@ -1,7 +1,18 @@
 """Text-to-speech integration helpers."""
 from __future__ import annotations
 
-from typing import Protocol
+import asyncio
+import hashlib
+import mmap
+import os
+import tempfile
+from collections import OrderedDict
+from functools import partial
+from dataclasses import dataclass
+from pathlib import Path
+from typing import AsyncIterator, Dict, Iterable, Iterator, Optional, Protocol, Set, Union
+
+AudioBuffer = Union[bytes, memoryview]
 
 
 class Synthesizer(Protocol):
@@ -11,6 +22,36 @@ class Synthesizer(Protocol):
         """Return audio data for the provided ``text``."""
 
 
+class StreamingSynthesizer(Synthesizer, Protocol):
+    """Synthesizer that can emit audio frames while the utterance is rendered."""
+
+    def synthesize_stream(self, text: str) -> AsyncIterator[AudioBuffer]:
+        """Yield consecutive audio frames for ``text``."""
+
+
+def iter_frames(audio: AudioBuffer, frame_size: int) -> Iterator[memoryview]:
+    """Split ``audio`` into zero-copy frames of at most ``frame_size`` bytes."""
+
+    view = memoryview(audio)
+    for start in range(0, len(view), frame_size):
+        yield view[start : start + frame_size]
+
+
+async def synthesize_frames(
+    synthesizer: Synthesizer, text: str, frame_size: int = 4096
+) -> AsyncIterator[AudioBuffer]:
+    """Yield audio frames from any synthesizer, streaming when it supports it."""
+
+    stream = getattr(synthesizer, "synthesize_stream", None)
+    if stream is not None:
+        async for frame in stream(text):
+            yield frame
+        return
+    audio = await synthesizer.synthesize(text)
+    for frame in iter_frames(audio, frame_size):
+        yield frame
+
+
 class SilentSynthesizer:
     """Development synthesizer that returns silence.
 
@@ -22,4 +63,339 @@ class SilentSynthesizer:
         return b""
 
 
-__all__ = ["Synthesizer", "SilentSynthesizer"]
+@dataclass
+class SynthesisCacheStats:
+    memory_hits: int = 0
+    inflight_waits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+    memory_bytes: int = 0
+    memory_entries: int = 0
+    disk_bytes: int = 0
+    disk_entries: int = 0
+    disk_evictions: int = 0
+
+
+def _forward(target: "asyncio.Future[AudioBuffer]", source: "asyncio.Future[AudioBuffer]") -> None:
+    if source.cancelled():
+        target.set_exception(RuntimeError("Synthesis was cancelled"))
+        return
+    error = source.exception()
+    if error is not None:
+        target.set_exception(error)
+    else:
+        target.set_result(source.result())
+
+
+class _Render:
+    """A rendering in progress and how many callers are waiting for it."""
+
+    __slots__ = ("future", "waiters")
+
+    def __init__(self, future: "asyncio.Future[AudioBuffer]") -> None:
+        self.future = future
+        self.waiters = 0
+
+
+class CachingSynthesizer:
+    """Content-addressed cache in front of another :class:`Synthesizer`.
+
+    Audio is keyed by a hash of ``(text, voice, audio_format)``. The memory
+    tier is an LRU bounded by ``memory_budget`` bytes; the optional disk tier
+    keeps one file per key under ``cache_dir`` and serves hits through
+    ``mmap``, so :meth:`synthesize_view` can hand the page-cache backed buffer
+    straight to the socket. The disk tier is an LRU too, bounded by
+    ``disk_budget`` bytes (``0`` for no bound); recency is kept in the files'
+    modification times, so it survives restarts. Processes sharing a
+    directory each enforce the budget on the files they know of, so together
+    they may briefly exceed it. Concurrent misses for the same key share a
+    single call to the wrapped synthesizer; callers that joined one are
+    counted as ``inflight_waits``, not as hits.
+    """
+
+    def __init__(
+        self,
+        inner: Synthesizer,
+        *,
+        voice: str = "default",
+        audio_format: str = "wav",
+        memory_budget: int = 32 * 1024 * 1024,
+        cache_dir: Optional[Union[str, Path]] = None,
+        disk_budget: int = 256 * 1024 * 1024,
+        frame_size: int = 4096,
+    ) -> None:
+        self._inner = inner
+        self._frame_size = frame_size
+        self._voice = voice
+        self._format = audio_format
+        self._memory_budget = memory_budget
+        # Created on the first write, so an unused cache leaves no directory.
+        self._cache_dir = Path(cache_dir) if cache_dir is not None else None
+        self._disk_budget = disk_budget
+        # Sizes of the files on disk, least recently used first; read on first use.
+        self._disk: Optional["OrderedDict[str, int]"] = None
+        self._disk_bytes = 0
+        self._memory: "OrderedDict[str, AudioBuffer]" = OrderedDict()
+        self._memory_bytes = 0
+        self._inflight: Dict[str, _Render] = {}
+        self._finishing: Set[asyncio.Future[AudioBuffer]] = set()
+        self._stats = SynthesisCacheStats()
+
+    @property
+    def stats(self) -> SynthesisCacheStats:
+        return SynthesisCacheStats(
+            memory_hits=self._stats.memory_hits,
+            inflight_waits=self._stats.inflight_waits,
+            disk_hits=self._stats.disk_hits,
+            misses=self._stats.misses,
+            memory_bytes=self._memory_bytes,
+            memory_entries=len(self._memory),
+            disk_bytes=self._disk_bytes,
+            disk_entries=len(self._disk) if self._disk is not None else 0,
+            disk_evictions=self._stats.disk_evictions,
+        )
+
+    def cache_key(self, text: str) -> str:
+        payload = "\0".join((self._voice, self._format, text)).encode("utf-8")
+        return hashlib.sha256(payload).hexdigest()
+
+    async def synthesize(self, text: str) -> bytes:
+        audio = await self.synthesize_view(text)
+        return audio if isinstance(audio, bytes) else audio.tobytes()
+
+    async def synthesize_view(self, text: str) -> AudioBuffer:
+        """Return cached audio without copying it out of the cache.
+
+        A miss renders in a task of its own that every caller of the same key
+        waits on through :func:`asyncio.shield`, so a cancelled caller never
+        takes the rendering away from the others. It is only abandoned when
+        the last caller waiting for it is cancelled.
+        """
+
+        key = self.cache_key(text)
+        cached = self._memory.get(key)
+        if cached is not None:
+            self._memory.move_to_end(key)
+            self._stats.memory_hits += 1
+            return cached
+
+        render = self._inflight.get(key)
+        if render is not None:
+            self._stats.inflight_waits += 1
+        else:
+            render = self._track(key, asyncio.ensure_future(self._render(key, text)))
+        render.waiters += 1
+        try:
+            return await asyncio.shield(render.future)
+        except asyncio.CancelledError:
+            future = render.future
+            if render.waiters == 1 and isinstance(future, asyncio.Task) and not future.done():
+                # Nobody else wants this audio; stop rendering it.
+                self._untrack(key, render)
+                future.cancel()
+            raise
+        finally:
+            render.waiters -= 1
+
+    async def synthesize_stream(self, text: str) -> AsyncIterator[AudioBuffer]:
+        """Yield frames of cached audio, or forward frames of a fresh rendering.
+
+        On a miss against a streaming synthesizer each frame is passed on as
+        soon as it arrives and the complete utterance is cached at the end.
+        If the consumer stops early while other callers wait for the same
+        audio, the rest of the stream is rendered for them in the background.
+        """
+
+        key = self.cache_key(text)
+        stream = getattr(self._inner, "synthesize_stream", None)
+        if stream is None or key in self._memory or key in self._inflight:
+            for frame in iter_frames(await self.synthesize_view(text), self._frame_size):
+                yield frame
+            return
+        audio = self._load_from_disk(key)
+        if audio is not None:
+            self._stats.disk_hits += 1
+            self._remember(key, audio)
+            for frame in iter_frames(audio, self._frame_size):
+                yield frame
+            return
+
+        self._stats.misses += 1
+        render = self._track(key, asyncio.get_running_loop().create_future())
+        frames = stream(text)
+        rendered = bytearray()
+        try:
+            async for frame in frames:
+                rendered += frame
+                yield frame
+            self._complete(key, render.future, rendered)
+        except Exception as exc:
+            render.future.set_exception(exc)
+            raise
+        finally:
+            if not render.future.done():
+                if render.waiters:
+                    # The consumer left; render the audio afresh for the callers
+                    # still waiting, as the stream may have been cut mid-frame.
+                    finishing = asyncio.ensure_future(self._render(key, text))
+                    finishing.add_done_callback(partial(_forward, render.future))
+                    self._finishing.add(finishing)
+                    finishing.add_done_callback(self._finishing.discard)
+                else:
+                    render.future.set_exception(RuntimeError("Synthesis stream was abandoned"))
+            closing = getattr(frames, "aclose", None)
+            if closing is not None:
+                await closing()
+
+    async def prewarm(self, texts: Iterable[str]) -> None:
+        """Render every text in ``texts`` so later requests are cache hits."""
+
+        await asyncio.gather(*(self.synthesize_view(text) for text in dict.fromkeys(texts)))
+
+    async def _render(self, key: str, text: str) -> AudioBuffer:
+        audio = self._load_from_disk(key)
+        if audio is not None:
+            self._stats.disk_hits += 1
+        else:
+            self._stats.misses += 1
+            rendered = await self._inner.synthesize(text)
+            audio = self._store_on_disk(key, rendered)
+        self._remember(key, audio)
+        return audio
+
+    def _complete(self, key: str, future: "asyncio.Future[AudioBuffer]", rendered: bytearray) -> None:
+        audio = self._store_on_disk(key, bytes(rendered))
+        self._remember(key, audio)
+        future.set_result(audio)
+
+    def _track(self, key: str, future: "asyncio.Future[AudioBuffer]") -> "_Render":
+        render = _Render(future)
+        self._inflight[key] = render
+
+        def finished(done: "asyncio.Future[AudioBuffer]") -> None:
+            self._untrack(key, render)
+            if not done.cancelled():
+                # Mark the exception as retrieved when nobody else was waiting.
+                done.exception()
+
+        future.add_done_callback(finished)
+        return render
+
+    def _untrack(self, key: str, render: "_Render") -> None:
+        if self._inflight.get(key) is render:
+            del self._inflight[key]
+
+    def _remember(self, key: str, audio: AudioBuffer) -> None:
+        size = len(audio)
+        if size > self._memory_budget:
+            return
+        self._memory[key] = audio
+        self._memory_bytes += size
+        while self._memory_bytes > self._memory_budget:
+            # Evicted mmap views are closed once the last sender drops them.
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def _path_for(self, key: str) -> Optional[Path]:
+        if self._cache_dir is None:
+            return None
+        return self._cache_dir / f"{key}.{self._format}"
+
+    def _load_from_disk(self, key: str) -> Optional[AudioBuffer]:
+        path = self._path_for(key)
+        if path is None:
+            return None
+        try:
+            with open(path, "rb") as handle:
+                size = os.fstat(handle.fileno()).st_size
+                if size == 0:
+                    mapped = None
+                else:
+                    mapped = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            self._forget_on_disk(key)
+            return None
+        self._use_on_disk(key, size)
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return memoryview(mapped) if mapped is not None else b""
+
+    def _store_on_disk(self, key: str, audio: bytes) -> AudioBuffer:
+        path = self._path_for(key)
+        if path is None or (self._disk_budget and len(audio) > self._disk_budget):
+            return audio
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            descriptor, temporary = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        except OSError:
+            return audio
+        try:
+            with os.fdopen(descriptor, "wb") as handle:
+                handle.write(audio)
+            os.replace(temporary, path)
+        except OSError:
+            try:
+                os.unlink(temporary)
+            except OSError:
+                pass
+            return audio
+        self._use_on_disk(key, len(audio))
+        self._evict_from_disk()
+        return audio
+
+    def _disk_index(self) -> "OrderedDict[str, int]":
+        if self._disk is None:
+            self._disk = OrderedDict()
+            suffix = f".{self._format}"
+            found = []
+            try:
+                with os.scandir(self._cache_dir) as entries:
+                    for entry in entries:
+                        if entry.name.endswith(suffix) and entry.is_file():
+                            info = entry.stat()
+                            found.append((info.st_mtime, entry.name[: -len(suffix)], info.st_size))
+            except OSError:
+                pass
+            for _, key, size in sorted(found):
+                self._disk[key] = size
+                self._disk_bytes += size
+        return self._disk
+
+    def _use_on_disk(self, key: str, size: int) -> None:
+        index = self._disk_index()
+        self._disk_bytes += size - index.get(key, 0)
+        index[key] = size
+        index.move_to_end(key)
+
+    def _forget_on_disk(self, key: str) -> None:
+        if self._disk is not None:
+            self._disk_bytes -= self._disk.pop(key, 0)
+
+    def _evict_from_disk(self) -> None:
+        if not self._disk_budget:
+            return
+        index = self._disk_index()
+        # The file just written is the most recent and never evicted.
+        while self._disk_bytes > self._disk_budget and len(index) > 1:
+            key, size = index.popitem(last=False)
+            self._disk_bytes -= size
+            self._stats.disk_evictions += 1
+            try:
+                # Mappings already handed out stay valid after the unlink.
+                os.unlink(self._path_for(key))  # type: ignore[arg-type]
+            except OSError:
+                pass
+
+
+__all__ = [
+    "Synthesizer",
+    "StreamingSynthesizer",
+    "SilentSynthesizer",
+    "iter_frames",
+    "synthesize_frames",
+    "CachingSynthesizer",
+    "SynthesisCacheStats",
+    "AudioBuffer",
+]
@@ -0,0 +1,391 @@
+"""HTTP chunk-upload transport feeding the stream pipeline.
+
+Clients that cannot keep a WebSocket open post audio chunks with a
+``sequence`` number and read replies from a Server-Sent Events stream. Each
+session gets an :class:`UploadChannel` that puts chunks back in order and
+presents them to a regular :class:`~backend.pipeline.StreamPipeline` as if
+they had arrived on a socket; everything the pipeline sends is published on
+the :class:`~backend.events.EventBus` instead.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections import deque
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .admission import AdmissionController, AdmissionRejected
+from .audio_spool import AudioSpool
+from .events import EventBus
+from .orchestrator import LLMOrchestrator
+from .pipeline import StreamPipeline
+from .services import SessionService
+from .transcriber import Transcriber
+from .vad import UtteranceSegmenter
+from .writer import MessageWriter
+
+try:  # pragma: no cover - optional dependency, also required by FastAPI forms
+    import multipart
+    from multipart.multipart import parse_options_header
+except ImportError:  # pragma: no cover
+    multipart = None  # type: ignore[assignment]
+    parse_options_header = None  # type: ignore[assignment]
+
+logger = logging.getLogger(__name__)
+
+_DISCONNECT: Dict[str, Any] = {"type": "websocket.disconnect"}
+
+
+class UploadTooLarge(ValueError):
+    """Raised when an uploaded chunk exceeds the configured size limit."""
+
+
+async def read_chunk_upload(
+    content_type: str, body: AsyncIterator[bytes], max_bytes: int
+) -> Tuple[int, bytes]:
+    """Parse a ``multipart/form-data`` upload with ``chunk`` and ``sequence`` fields.
+
+    The body is fed to the parser as it arrives; only the two fields are kept,
+    and the upload is rejected as soon as the chunk grows past ``max_bytes``.
+    Raises ``ValueError`` for malformed uploads.
+    """
+
+    if multipart is None:
+        raise RuntimeError("python-multipart is required for chunk uploads")
+    media_type, options = parse_options_header(content_type)
+    boundary = options.get(b"boundary")
+    if media_type != b"multipart/form-data" or not boundary:
+        raise ValueError("Expected a multipart/form-data body")
+
+    fields: Dict[str, bytearray] = {}
+    header_field = bytearray()
+    header_value = bytearray()
+    current: Dict[str, Any] = {"name": None}
+
+    def on_header_field(data: bytes, start: int, end: int) -> None:
+        header_field.extend(data[start:end])
+
+    def on_header_value(data: bytes, start: int, end: int) -> None:
+        header_value.extend(data[start:end])
+
+    def on_header_end() -> None:
+        if header_field.lower() == b"content-disposition":
+            _, disposition = parse_options_header(bytes(header_value))
+            name = disposition.get(b"name", b"").decode("latin-1")
+            current["name"] = name if name in ("chunk", "sequence") else None
+        header_field.clear()
+        header_value.clear()
+
+    def on_part_begin() -> None:
+        current["name"] = None
+
+    def on_part_data(data: bytes, start: int, end: int) -> None:
+        name = current["name"]
+        if name is None:
+            return
+        value = fields.setdefault(name, bytearray())
+        limit = max_bytes if name == "chunk" else 32
+        if len(value) + end - start > limit:
+            raise UploadTooLarge(f"Field '{name}' is too large")
+        value.extend(data[start:end])
+
+    parser = multipart.MultipartParser(
+        boundary,
+        {
+            "on_part_begin": on_part_begin,
+            "on_part_data": on_part_data,
+            "on_header_field": on_header_field,
+            "on_header_value": on_header_value,
+            "on_header_end": on_header_end,
+        },
+    )
+    async for data in body:
+        if data:
+            parser.write(data)
+    parser.finalize()
+
+    if "chunk" not in fields or "sequence" not in fields:
+        raise ValueError("Both 'chunk' and 'sequence' are required")
+    try:
+        sequence = int(fields["sequence"].decode("ascii"))
+    except (UnicodeDecodeError, ValueError) as exc:
+        raise ValueError("'sequence' must be an integer") from exc
+    if sequence < 1:
+        raise ValueError("'sequence' must be positive")
+    return sequence, bytes(fields["chunk"])
+
+
+class ReorderBuffer:
+    """Release chunks in sequence order, dropping duplicates.
+
+    Chunks that arrive early wait for the missing ones. When a chunk arrives
+    ``window`` or more sequences ahead, or :meth:`skip_gap` is called after a
+    timeout, the missing sequences are given up on and delivery resumes with
+    the oldest waiting chunk.
+    """
+
+    def __init__(self, next_sequence: int = 1, window: int = 32) -> None:
+        self.next_sequence = next_sequence
+        self._window = max(1, window)
+        self._waiting: Dict[int, bytes] = {}
+        self.skipped = 0
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiting)
+
+    def offer(self, sequence: int, data: bytes) -> Optional[List[bytes]]:
+        """Return the chunks that became deliverable, or ``None`` for a duplicate."""
+
+        if sequence < self.next_sequence or sequence in self._waiting:
+            return None
+        self._waiting[sequence] = data
+        ready = self._drain()
+        while self._waiting and max(self._waiting) >= self.next_sequence + self._window:
+            ready.extend(self.skip_gap())
+        return ready
+
+    def skip_gap(self) -> List[bytes]:
+        if not self._waiting:
+            return []
+        oldest = min(self._waiting)
+        self.skipped += oldest - self.next_sequence
+        self.next_sequence = oldest
+        return self._drain()
+
+    def _drain(self) -> List[bytes]:
+        ready = []
+        while self.next_sequence in self._waiting:
+            ready.append(self._waiting.pop(self.next_sequence))
+            self.next_sequence += 1
+        return ready
+
+
+class UploadChannel:
+    """Socket-like adapter between uploaded chunks and a :class:`StreamPipeline`.
+
+    Chunks released by giving up on a gap can number up to the reorder
+    window, more than the bounded queue holds. They wait in a separate list
+    that :meth:`receive` drains first, and later uploads queue behind them.
+    """
+
+    def __init__(
+        self,
+        session_id: int,
+        bus: EventBus,
+        *,
+        next_sequence: int = 1,
+        window: int = 32,
+        gap_timeout: float = 2.0,
+        idle_timeout: float = 60.0,
+        queue_size: int = 8,
+    ) -> None:
+        self.session_id = session_id
+        self._bus = bus
+        self._buffer = ReorderBuffer(next_sequence, window)
+        self._ready: asyncio.Queue[Dict[str, Any]] = asyncio.Queue(maxsize=max(1, queue_size))
+        self._released: Deque[bytes] = deque()
+        self._lock = asyncio.Lock()
+        self._gap_timeout = gap_timeout
+        self._idle_timeout = idle_timeout
+        self.closed = False
+        # Set when the session ended; its numbering is then not kept.
+        self.ended = False
+
+    @property
+    def next_sequence(self) -> int:
+        return self._buffer.next_sequence
+
+    async def offer(self, sequence: int, data: bytes) -> bool:
+        """Queue an uploaded chunk; return ``False`` if it was a duplicate.
+
+        Waits while the pipeline is behind, so slow processing pushes back on
+        the uploading client.
+        """
+
+        async with self._lock:
+            ready = self._buffer.offer(sequence, data)
+            if ready is None:
+                return False
+            for chunk in ready:
+                if self._released:
+                    # Stay behind the chunks released past a gap.
+                    self._released.append(chunk)
+                else:
+                    await self._ready.put({"type": "websocket.receive", "bytes": chunk})
+            return True
+
+    async def receive(self) -> Dict[str, Any]:
+        waited = 0.0
+        while not self.closed:
+            # Anything queued was released before the chunks past a gap.
+            if self._ready.empty() and self._released:
+                return {"type": "websocket.receive", "bytes": self._released.popleft()}
+            timeout = self._gap_timeout if self._buffer.waiting else self._idle_timeout - waited
+            try:
+                return await asyncio.wait_for(self._ready.get(), timeout=max(timeout, 0))
+            except asyncio.TimeoutError:
+                pass
+            async with self._lock:
+                if self._buffer.waiting:
+                    self._released.extend(self._buffer.skip_gap())
+                    continue
+            waited += timeout
+            if waited >= self._idle_timeout:
+                break
+        return _DISCONNECT
+
+    async def send_json(self, data: Dict[str, Any]) -> None:
+        self._bus.publish(self.session_id, data)
+
+    async def send_bytes(self, data: bytes) -> None:
+        # Server-Sent Events carry text only; spoken audio is not forwarded.
+        return None
+
+    def close(self) -> None:
+        self.closed = True
+        self._released.clear()
+        while not self._ready.empty():
+            self._ready.get_nowait()
+
+
+class UploadManager:
+    """Own the upload channels and the pipelines draining them."""
+
+    def __init__(
+        self,
+        session_factory: Callable[[], AsyncSession],
+        orchestrator: LLMOrchestrator,
+        transcriber: Transcriber,
+        bus: EventBus,
+        writer: Optional[MessageWriter] = None,
+        audio_spool: Optional[AudioSpool] = None,
+        *,
+        window: int = 32,
+        gap_timeout: float = 2.0,
+        idle_timeout: float = 60.0,
+        chunk_queue_size: int = 8,
+        transcription_concurrency: int = 2,
+        segmenter_factory: Optional[Callable[[], UtteranceSegmenter]] = None,
+        segment_flush_timeout: float = 8.0,
+        admission: Optional[AdmissionController] = None,
+        max_bytes_per_second: float = 0,
+        burst_bytes: float = 0,
+    ) -> None:
+        self._session_factory = session_factory
+        self._orchestrator = orchestrator
+        self._transcriber = transcriber
+        self._bus = bus
+        self._writer = writer
+        self._audio_spool = audio_spool
+        self._window = window
+        self._gap_timeout = gap_timeout
+        self._idle_timeout = idle_timeout
+        self._chunk_queue_size = chunk_queue_size
+        self._transcription_concurrency = transcription_concurrency
+        self._segmenter_factory = segmenter_factory
+        self._segment_flush_timeout = segment_flush_timeout
+        self._admission = admission or AdmissionController()
+        self._max_bytes_per_second = max_bytes_per_second
+        self._burst_bytes = burst_bytes
+        self._channels: Dict[int, UploadChannel] = {}
+        self._tasks: Dict[int, asyncio.Task[None]] = {}
+        # Where each idle session's sequence numbering resumes.
+        self._next_sequence: Dict[int, int] = {}
+
+    async def offer(self, session_id: int, sequence: int, data: bytes) -> bool:
+        """Hand an uploaded chunk to the session's pipeline.
+
+        Returns ``False`` for a duplicate and raises ``LookupError`` when the
+        session does not exist or has ended, or
+        :class:`~backend.admission.AdmissionRejected` when there is no
+        capacity to run it.
+        """
+
+        channel = self._channels.get(session_id)
+        if channel is None or channel.closed:
+            channel = await self._open(session_id)
+        return await channel.offer(sequence, data)
+
+    def forget(self, session_ids: Iterable[int]) -> None:
+        """Drop what is kept about ended sessions between their uploads."""
+
+        for session_id in session_ids:
+            self._next_sequence.pop(session_id, None)
+            channel = self._channels.get(session_id)
+            if channel is not None:
+                channel.ended = True
+
+    async def close(self) -> None:
+        for channel in self._channels.values():
+            channel.close()
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _open(self, session_id: int) -> UploadChannel:
+        async with self._session_factory() as db_session:
+            service = SessionService(db_session, self._orchestrator, self._writer)
+            if not await service.load_conversation(session_id):
+                raise LookupError("Session not found or already ended")
+        channel = self._channels.get(session_id)
+        if channel is not None and not channel.closed:
+            return channel
+        if not self._admission.claim(session_id):
+            raise AdmissionRejected("Server is at capacity", self._admission.estimated_wait(1))
+        channel = UploadChannel(
+            session_id,
+            self._bus,
+            next_sequence=self._next_sequence.pop(session_id, 1),
+            window=self._window,
+            gap_timeout=self._gap_timeout,
+            idle_timeout=self._idle_timeout,
+            queue_size=self._chunk_queue_size,
+        )
+        pipeline = StreamPipeline(
+            channel,
+            session_id,
+            self._session_factory,
+            self._writer,
+            self._orchestrator,
+            self._transcriber,
+            chunk_queue_size=self._chunk_queue_size,
+            transcription_concurrency=self._transcription_concurrency,
+            audio_spool=self._audio_spool,
+            segmenter_factory=self._segmenter_factory,
+            segment_flush_timeout=self._segment_flush_timeout,
+            admission=self._admission,
+            max_bytes_per_second=self._max_bytes_per_second,
+            burst_bytes=self._burst_bytes,
+        )
+        self._channels[session_id] = channel
+        self._tasks[session_id] = asyncio.create_task(self._run(channel, pipeline))
+        return channel
+
+    async def _run(self, channel: UploadChannel, pipeline: StreamPipeline) -> None:
+        session_id = channel.session_id
+        try:
+            await pipeline.run()
+        except Exception:  # pragma: no cover - depends on transcriber and database
+            logger.exception("Upload pipeline for session %s failed", session_id)
+        finally:
+            channel.close()
+            self._admission.release_claim(session_id)
+            if self._channels.get(session_id) is channel:
+                del self._channels[session_id]
+                self._tasks.pop(session_id, None)
+                if not channel.ended:
+                    # A later upload reopens the channel where this one stopped.
+                    self._next_sequence[session_id] = channel.next_sequence
+
+
+__all__ = [
+    "read_chunk_upload",
+    "UploadTooLarge",
+    "ReorderBuffer",
+    "UploadChannel",
+    "UploadManager",
+]
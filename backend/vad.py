@@ -0,0 +1,292 @@
+"""Voice-activity detection and utterance segmentation ahead of transcription.
+
+Received chunks are decoded to 16-bit PCM and split into short frames.
+A frame is speech when its energy is above ``energy_threshold_db`` (dBFS)
+and its zero-crossing rate stays below ``max_zero_crossing_rate``, which
+rejects broadband hiss. Both measures are computed for every frame at once
+with NumPy. Speech frames are widened by ``padding`` on both sides and
+merged into utterances unless separated by at least ``min_silence``.
+
+Only finished utterances are handed on: audio after the last one is carried
+into the next chunk, so words spanning a chunk boundary are transcribed
+together and silent chunks never reach the transcriber. Utterances longer
+than ``max_segment`` are cut.
+
+Audio that cannot be decoded (compressed containers such as WebM/Opus) is
+passed through unchanged.
+"""
+from __future__ import annotations
+
+import io
+import wave
+from dataclasses import dataclass
+from typing import List, Literal, Optional, Tuple
+
+from .metrics import REGISTRY
+
+try:  # pragma: no cover - optional dependency
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None  # type: ignore[assignment]
+
+InputFormat = Literal["auto", "pcm16"]
+
+_VAD_SECONDS = REGISTRY.counter(
+    "mindful_vad_audio_seconds_total",
+    "Decoded audio seen by voice-activity detection, by what happened to it.",
+    ("outcome",),
+)
+_RECEIVED_SECONDS = _VAD_SECONDS.labels("received")
+_TRANSCRIBED_SECONDS = _VAD_SECONDS.labels("transcribed")
+_CHUNKS = REGISTRY.counter(
+    "mindful_vad_chunks_total",
+    "Audio chunks seen by voice-activity detection, by outcome.",
+    ("outcome",),
+)
+_SILENT_CHUNKS = _CHUNKS.labels("silent")
+_SPEECH_CHUNKS = _CHUNKS.labels("speech")
+_PASSTHROUGH_CHUNKS = _CHUNKS.labels("passthrough")
+_SEGMENTS = REGISTRY.counter("mindful_vad_segments_total", "Utterances sent to the transcriber.").labels()
+
+
+def vad_available() -> bool:
+    return np is not None
+
+
+@dataclass(frozen=True)
+class PCMFormat:
+    sample_rate: int
+    wav: bool
+
+
+@dataclass
+class SegmenterStats:
+    chunks: int = 0
+    silent_chunks: int = 0
+    passthrough_chunks: int = 0
+    segments: int = 0
+    received_seconds: float = 0.0
+    transcribed_seconds: float = 0.0
+
+    @property
+    def saved_fraction(self) -> float:
+        """Share of decoded audio that never reached the transcriber."""
+
+        if not self.received_seconds:
+            return 0.0
+        return 1 - self.transcribed_seconds / self.received_seconds
+
+
+def decode_pcm(data: bytes, input_format: InputFormat = "auto", sample_rate: int = 16000) -> Optional[Tuple["np.ndarray", PCMFormat]]:
+    """Decode a chunk to mono 16-bit samples, or return ``None`` if it is not PCM.
+
+    WAV chunks are always recognised; anything else is treated as raw
+    little-endian 16-bit mono at ``sample_rate`` when ``input_format`` is
+    ``"pcm16"``.
+    """
+
+    if data[:4] == b"RIFF" and data[8:12] == b"WAVE":
+        try:
+            with wave.open(io.BytesIO(data)) as reader:
+                if reader.getsampwidth() != 2:
+                    return None
+                channels = reader.getnchannels()
+                rate = reader.getframerate()
+                frames = reader.readframes(reader.getnframes())
+        except (wave.Error, EOFError):
+            return None
+        samples = np.frombuffer(frames, dtype="<i2")
+        if channels > 1:
+            samples = samples[: len(samples) - len(samples) % channels].reshape(-1, channels)
+            samples = samples.mean(axis=1).astype(np.int16)
+        return samples, PCMFormat(rate, wav=True)
+    if input_format == "pcm16":
+        return np.frombuffer(data[: len(data) - len(data) % 2], dtype="<i2"), PCMFormat(sample_rate, wav=False)
+    return None
+
+
+def encode_pcm(samples: "np.ndarray", pcm_format: PCMFormat) -> bytes:
+    if not pcm_format.wav:
+        return samples.astype("<i2").tobytes()
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as writer:
+        writer.setnchannels(1)
+        writer.setsampwidth(2)
+        writer.setframerate(pcm_format.sample_rate)
+        writer.writeframes(samples.astype("<i2").tobytes())
+    return buffer.getvalue()
+
+
+def frame_activity(
+    samples: "np.ndarray", frame_length: int, energy_threshold_db: float, max_zero_crossing_rate: float
+) -> "np.ndarray":
+    """Return one speech/non-speech flag per whole frame of ``samples``."""
+
+    count = len(samples) // frame_length
+    if count == 0:
+        return np.zeros(0, dtype=bool)
+    frames = samples[: count * frame_length].reshape(count, frame_length).astype(np.float32) / 32768.0
+    power = np.mean(frames * frames, axis=1)
+    energy_db = 10 * np.log10(np.maximum(power, 1e-12))
+    signs = np.signbit(frames)
+    zero_crossing_rate = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / (frame_length - 1)
+    return (energy_db > energy_threshold_db) & (zero_crossing_rate < max_zero_crossing_rate)
+
+
+def _runs(mask: "np.ndarray") -> List[Tuple[int, int]]:
+    """Return ``[start, end)`` index pairs of the ``True`` runs in ``mask``."""
+
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return list(zip(np.flatnonzero(edges == 1).tolist(), np.flatnonzero(edges == -1).tolist()))
+
+
+class UtteranceSegmenter:
+    """Turn one stream's chunks into utterances worth transcribing.
+
+    Keep one instance per stream; :meth:`feed` returns the utterances that
+    ended within the chunk and :meth:`flush` the rest when the stream ends or
+    goes quiet.
+    """
+
+    def __init__(
+        self,
+        *,
+        input_format: InputFormat = "auto",
+        sample_rate: int = 16000,
+        frame_ms: int = 30,
+        energy_threshold_db: float = -45.0,
+        max_zero_crossing_rate: float = 0.5,
+        padding_ms: int = 200,
+        min_silence_ms: int = 600,
+        min_speech_ms: int = 150,
+        max_segment_ms: int = 15000,
+    ) -> None:
+        if np is None:
+            raise RuntimeError("numpy is required for voice-activity detection")
+        self._input_format = input_format
+        self._sample_rate = sample_rate
+        self._frame_ms = frame_ms
+        self._energy_threshold_db = energy_threshold_db
+        self._max_zero_crossing_rate = max_zero_crossing_rate
+        self._padding_ms = padding_ms
+        self._min_silence_ms = min_silence_ms
+        self._min_speech_ms = min_speech_ms
+        self._max_segment_ms = max_segment_ms
+        self._carry: Optional["np.ndarray"] = None
+        self._format: Optional[PCMFormat] = None
+        self._open = False
+        self.stats = SegmenterStats()
+
+    @property
+    def pending(self) -> bool:
+        """Whether an utterance is being held back until it ends."""
+
+        return self._open
+
+    def feed(self, data: bytes) -> List[bytes]:
+        self.stats.chunks += 1
+        decoded = decode_pcm(data, self._input_format, self._sample_rate)
+        if decoded is None:
+            self.stats.passthrough_chunks += 1
+            _PASSTHROUGH_CHUNKS.inc()
+            return self.flush() + [data]
+        samples, pcm_format = decoded
+        segments: List[bytes] = []
+        if self._format is not None and pcm_format != self._format:
+            segments.extend(self.flush())
+        self._format = pcm_format
+        seconds = len(samples) / pcm_format.sample_rate
+        self.stats.received_seconds += seconds
+        _RECEIVED_SECONDS.inc(seconds)
+
+        if self._carry is not None and len(self._carry):
+            samples = np.concatenate((self._carry, samples))
+        emitted = self._segment(samples, final=False)
+        segments.extend(emitted)
+        if not emitted and not self._open:
+            self.stats.silent_chunks += 1
+            _SILENT_CHUNKS.inc()
+        else:
+            _SPEECH_CHUNKS.inc()
+        return segments
+
+    def flush(self) -> List[bytes]:
+        """Emit whatever speech is still held back."""
+
+        if self._carry is None or not len(self._carry):
+            return []
+        return self._segment(self._carry, final=True)
+
+    def _frames(self, ms: int) -> int:
+        return max(0, round(ms / self._frame_ms))
+
+    def _segment(self, samples: "np.ndarray", *, final: bool) -> List[bytes]:
+        assert self._format is not None
+        rate = self._format.sample_rate
+        frame_length = max(1, rate * self._frame_ms // 1000)
+        padding = self._frames(self._padding_ms)
+        min_silence = max(1, self._frames(self._min_silence_ms))
+        min_speech = self._frames(self._min_speech_ms)
+        max_segment = max(1, self._frames(self._max_segment_ms))
+
+        speech = frame_activity(samples, frame_length, self._energy_threshold_db, self._max_zero_crossing_rate)
+        total = len(speech)
+        # Drop blips too short to be words before padding widens them.
+        for start, end in _runs(speech):
+            if end - start < min_speech:
+                speech[start:end] = False
+        if padding:
+            speech = np.convolve(speech.astype(np.int8), np.ones(2 * padding + 1, dtype=np.int8), "same") > 0
+
+        utterances: List[List[int]] = []
+        for start, end in _runs(speech):
+            if utterances and start - utterances[-1][1] < min_silence:
+                utterances[-1][1] = end
+            else:
+                utterances.append([start, end])
+
+        segments = []
+        emitted_to = 0
+        self._open = False
+        for start, end in utterances:
+            while end - start > max_segment:
+                segments.append(self._emit(samples, start, start + max_segment, frame_length))
+                start += max_segment
+            if final or total - end >= min_silence:
+                segments.append(self._emit(samples, start, end, frame_length))
+                emitted_to = end
+            else:
+                # Still open: wait for the next chunk before deciding where it ends.
+                self._open = True
+                emitted_to = start
+                break
+        keep_from = emitted_to if self._open else max(emitted_to, total - padding)
+        if final:
+            self._carry = None
+        else:
+            # Hold any unfinished utterance plus a sub-frame remainder; a silent
+            # tail is kept only as pre-roll padding for the next utterance.
+            self._carry = samples[keep_from * frame_length :].copy()
+        return segments
+
+    def _emit(self, samples: "np.ndarray", start: int, end: int, frame_length: int) -> bytes:
+        assert self._format is not None
+        segment = samples[start * frame_length : end * frame_length]
+        seconds = len(segment) / self._format.sample_rate
+        self.stats.segments += 1
+        self.stats.transcribed_seconds += seconds
+        _SEGMENTS.inc()
+        _TRANSCRIBED_SECONDS.inc(seconds)
+        return encode_pcm(segment, self._format)
+
+
+__all__ = [
+    "InputFormat",
+    "PCMFormat",
+    "SegmenterStats",
+    "UtteranceSegmenter",
+    "decode_pcm",
+    "encode_pcm",
+    "frame_activity",
+    "vad_available",
+]
@@ -0,0 +1,249 @@
+"""Write-behind persistence for conversation messages."""
+from __future__ import annotations
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .metrics import REGISTRY, STAGE_SECONDS
+from .models import Message
+
+logger = logging.getLogger(__name__)
+
+WRITE_BEHIND = "write_behind"
+GROUP_COMMIT = "group_commit"
+
+_INSERT_SECONDS = STAGE_SECONDS.labels("insert_batch")
+_COMMIT_SECONDS = STAGE_SECONDS.labels("commit")
+_BATCH_SIZE = REGISTRY.histogram(
+    "mindful_message_batch_size",
+    "Messages written per message writer transaction.",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512),
+).labels()
+
+
+@dataclass
+class PendingMessage:
+    session_id: int
+    role: str
+    content: str
+    created_at: datetime
+
+
+class MessageWriter:
+    """Batch message inserts from many sessions into shared transactions.
+
+    Producers call :meth:`submit` which only appends to an in-memory buffer. A
+    single background task drains the buffer whenever ``batch_size`` messages
+    are waiting or ``flush_interval`` seconds have passed since the first
+    pending message, writing the whole batch with one ``executemany`` and one
+    commit.
+
+    ``durability`` controls what :meth:`submit` waits for. With
+    ``"write_behind"`` it returns immediately and a crash may lose the batch
+    that has not been committed yet. With ``"group_commit"`` it waits until the
+    batch containing the message is committed, still sharing the transaction
+    (and the fsync) with every other message in that batch.
+
+    A batch whose write fails goes back to the front of the buffer and is
+    retried with the next batch, up to ``max_attempts`` writes in total.
+    Only then are its messages dropped and group-commit and :meth:`flush`
+    callers failed.
+
+    :meth:`committed_through` tells how far a session's messages are known
+    to be written without forcing a partial batch out the way :meth:`flush`
+    does. Batches commit in submission order, so every earlier message of
+    the session is committed too, or was dropped.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], AsyncSession],
+        *,
+        batch_size: int = 128,
+        flush_interval: float = 0.05,
+        durability: str = WRITE_BEHIND,
+        max_attempts: int = 3,
+    ) -> None:
+        if durability not in (WRITE_BEHIND, GROUP_COMMIT):
+            raise ValueError(f"Unknown durability mode: {durability}")
+        self._session_factory = session_factory
+        self._batch_size = max(1, batch_size)
+        self._flush_interval = flush_interval
+        self._durability = durability
+        self._max_attempts = max(1, max_attempts)
+        self._pending: List[PendingMessage] = []
+        self._waiters: List[asyncio.Future[None]] = []
+        self._retry: List[PendingMessage] = []
+        self._retry_waiters: List[asyncio.Future[None]] = []
+        self._attempts = 0
+        # Newest ``created_at`` committed per session, until forgotten.
+        self._committed: Dict[int, datetime] = {}
+        self._has_pending = asyncio.Event()
+        self._batch_full = asyncio.Event()
+        self._inflight: Optional[asyncio.Future[None]] = None
+        self._task: Optional[asyncio.Task[None]] = None
+        self._closing = False
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._retry) + len(self._pending)
+
+    async def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._closing = False
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        """Write out everything still buffered and stop the background task."""
+
+        self._closing = True
+        self._has_pending.set()
+        self._batch_full.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+
+    async def submit(self, session_id: int, role: str, content: str, created_at: datetime) -> None:
+        if self._closing:
+            raise RuntimeError("MessageWriter is closed")
+        self._pending.append(PendingMessage(session_id, role, content, created_at))
+        self._has_pending.set()
+        if len(self._pending) >= self._batch_size:
+            self._batch_full.set()
+        if self._durability == GROUP_COMMIT:
+            await self._wait_for_current_batch()
+
+    def committed_through(self, session_id: int) -> Optional[datetime]:
+        """``created_at`` of the session's newest message committed by this writer."""
+
+        return self._committed.get(session_id)
+
+    def forget(self, session_ids: Iterable[int]) -> None:
+        """Stop tracking :meth:`committed_through` for sessions that ended."""
+
+        for session_id in session_ids:
+            self._committed.pop(session_id, None)
+
+    async def flush(self) -> None:
+        """Wait until every message submitted so far has been committed.
+
+        Without a running background task the buffer is written right here,
+        with the same backoff between attempts, so flushing never waits for a
+        task that is not there. Raises the write's exception if messages
+        were dropped after ``max_attempts`` failed writes.
+        """
+
+        if self._task is None or self._task.done():
+            while self._retry or self._pending:
+                if self._retry:
+                    await asyncio.sleep(self._flush_interval * self._attempts)
+                await self._write_next()
+            return
+        if self._inflight is not None:
+            # Fails only if the batch was dropped; one kept for retry is waited for below.
+            await asyncio.shield(self._inflight)
+        if self._retry or self._pending:
+            self._batch_full.set()
+            await self._wait_for_current_batch()
+
+    async def _wait_for_current_batch(self) -> None:
+        waiter: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        await waiter
+
+    async def _run(self) -> None:
+        while True:
+            await self._has_pending.wait()
+            if not self._retry and not self._pending and self._closing:
+                return
+            if self._retry:
+                await asyncio.sleep(self._flush_interval * self._attempts)
+            elif len(self._pending) < self._batch_size and not self._closing:
+                try:
+                    await asyncio.wait_for(self._batch_full.wait(), timeout=self._flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+            self._has_pending.clear()
+            self._batch_full.clear()
+            inflight = self._inflight = asyncio.get_running_loop().create_future()
+            try:
+                await self._write_next()
+            except Exception as exc:  # pragma: no cover - depends on the database
+                inflight.set_exception(exc)
+                # Already logged; flush() callers still get the exception.
+                inflight.exception()
+            else:
+                inflight.set_result(None)
+            finally:
+                if not inflight.done():
+                    inflight.cancel()
+                self._inflight = None
+                if self._retry or self._closing:
+                    self._has_pending.set()
+
+    async def _write_next(self) -> None:
+        """Write the failed batch being retried plus everything buffered.
+
+        A failed batch is kept for the next call until ``max_attempts``
+        writes have failed; then it is dropped and the exception raised.
+        """
+
+        batch, self._retry, self._pending = self._retry + self._pending, [], []
+        waiters, self._retry_waiters, self._waiters = self._retry_waiters + self._waiters, [], []
+        try:
+            if batch:
+                await self._write(batch)
+        except Exception as exc:  # pragma: no cover - depends on the database
+            self._attempts += 1
+            if self._attempts < self._max_attempts:
+                logger.warning(
+                    "Failed to persist %d buffered messages (attempt %d of %d), retrying",
+                    len(batch),
+                    self._attempts,
+                    self._max_attempts,
+                    exc_info=True,
+                )
+                self._retry, self._retry_waiters = batch, waiters
+                return
+            self._attempts = 0
+            logger.exception("Dropping %d buffered messages after %d failed writes", len(batch), self._max_attempts)
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_exception(exc)
+            raise
+        else:
+            self._attempts = 0
+            committed = self._committed
+            for item in batch:
+                if item.session_id not in committed or committed[item.session_id] < item.created_at:
+                    committed[item.session_id] = item.created_at
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_result(None)
+
+    async def _write(self, batch: List[PendingMessage]) -> None:
+        rows = [
+            {
+                "session_id": item.session_id,
+                "role": item.role,
+                "content": item.content,
+                "created_at": item.created_at,
+            }
+            for item in batch
+        ]
+        _BATCH_SIZE.observe(len(rows))
+        async with self._session_factory() as session:
+            with _INSERT_SECONDS.time():
+                await session.execute(insert(Message), rows)
+            with _COMMIT_SECONDS.time():
+                await session.commit()
+
+
+__all__ = ["MessageWriter", "PendingMessage", "WRITE_BEHIND", "GROUP_COMMIT"]